@@ -0,0 +1,6 @@
+"""
+Authentication dependencies for the route modules
+The token helpers live with the auth routes in api.routes.auth.
+"""
+
+from api.routes.auth import create_access_token, get_current_user, verify_token  # noqa: F401
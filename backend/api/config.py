@@ -15,12 +15,22 @@ class Settings(BaseSettings):
     API_PORT: int = 8000
     DEBUG: bool = False
     
+    # Logging
+    LOG_LEVEL: str = "INFO"  # DEBUG also logs raw payloads
+    LOG_FORMAT: str = "text"  # text or json
+    LOG_QUEUE_SIZE: int = 10000  # Records beyond this are dropped, never blocking the caller
+    LOG_SAMPLE_RATES: str = ""  # Fraction of sub-WARNING records kept, e.g. "mqtt.client=0.1"
+    LOG_RATE_LIMITS: str = "mqtt=200,cron=200"  # Max records/second per category
+    
     # Database
     DB_HOST: str = "localhost"
     DB_PORT: int = 3306
     DB_USER: str = "IOT_master"
     DB_PASSWORD: str
     DB_NAME: str = "iot_data"
+    DB_REPLICA_HOSTS: str = ""  # Read replicas, "host[:port],..."; empty reads from the primary
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0  # Replicas further behind are skipped
+    DB_REPLICA_LAG_CHECK_SECONDS: float = 5.0
     
     # Redis
     REDIS_HOST: str = "localhost"
@@ -34,12 +44,27 @@ class Settings(BaseSettings):
             return f"redis://:{self.REDIS_PASSWORD}@{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
     
+    # Event feed from the MQTT client to processors
+    EVENT_FEED: str = "pubsub"  # pubsub (one processor) or stream (consumer group shared by replicas)
+    EVENT_STREAM_MAXLEN: int = 1000000  # Approximate entries kept in the stream
+    EVENT_STREAM_BATCH: int = 100
+    EVENT_STREAM_CLAIM_IDLE_SECONDS: float = 60.0  # Events read by a dead processor go to another after this
+    
     # MQTT
     MQTT_BROKER: str = "localhost"
     MQTT_PORT: int = 1883
     MQTT_USERNAME: str = ""
     MQTT_PASSWORD: str = ""
     MQTT_TOPIC_PREFIX: str = "zias"
+    MQTT_QOS: int = 1
+    MQTT_SHARED_GROUP: str = ""  # Set to share ingest across replicas ($share/<group>/..., MQTT v5)
+    API_MQTT_ENABLED: bool = True  # Disable when a dedicated ingest service (mqtt.ingest) runs
+    
+    # Fleet commands
+    FLEET_PUBLISH_RATE: float = 50.0  # Commands/second per ingest replica
+    FLEET_PUBLISH_BURST: int = 100
+    FLEET_ACK_TIMEOUT_SECONDS: int = 120  # Unacked targets after this count as timed out
+    FLEET_JOB_TTL_SECONDS: int = 7 * 24 * 3600
     
     # JWT
     JWT_SECRET_KEY: str
@@ -50,12 +75,107 @@ class Settings(BaseSettings):
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8080"]
     
     # BLE Beacon Configuration
-    BLE_TIMEOUT_SECONDS: int = 300  # 5 minutes
-    BLE_GEOFENCE_RADIUS_METERS: int = 50
+    BLE_TIMEOUT_SECONDS: int = 300  # 5 minutes, repeat reports per (student, beacon) are dropped
+    BLE_GEOFENCE_RADIUS_METERS: int = 50  # Default fence per beacon, see beacons table
+    BLE_GEOFENCE_REQUIRE_LOCATION: bool = False  # Reject entry/exit reports without a position
+    BLE_RSSI_EMA_ALPHA: float = 0.3  # Smoothing factor for raw RSSI samples
+    BLE_RSSI_NEAR_DBM: int = -80
+    BLE_RSSI_PRESENT_DBM: int = -65
+    BLE_RSSI_HYSTERESIS_DB: int = 4
+    BLE_STATE_DEBOUNCE_SAMPLES: int = 3  # Consecutive samples before a state change
+    BLE_SUMMARY_INTERVAL_SECONDS: int = 300  # Persist a summary row per pair at most this often
+    BLE_FILTER_SWEEP_SECONDS: int = 30
+    BLE_RAW_SAMPLE_POLICY: str = "none"  # none, sampled, all
+    BLE_RAW_SAMPLE_EVERY: int = 20  # Keep every Nth raw sample when policy is "sampled"
     
     # Attendance Logic
     ATTENDANCE_WINDOW_SECONDS: int = 10
-    ANTI_TAILGATING_DELAY_SECONDS: int = 3
+    ANTI_TAILGATING_DELAY_SECONDS: int = 3  # Repeat taps of a card on one reader are dropped
+    MATCHER_BACKEND: str = "memory"  # memory (single processor) or redis (replicas; needs EVENT_FEED=stream)
+    STATS_REPORT_INTERVAL_SECONDS: int = 60
+    
+    # Device liveness (devices heartbeat every 60s)
+    DEVICE_LIVENESS_TIMEOUTS: str = "rfid=180,pir=180,universal=180,ble_beacon=900"  # Seconds per device type
+    DEVICE_LIVENESS_DEFAULT_SECONDS: int = 180
+    DEVICE_LIVENESS_FLUSH_SECONDS: float = 5.0  # Batch last_seen/status writes this often
+    
+    # Edge gateway (python -m mqtt.edge): local SQLite store synced with the central API
+    EDGE_MODE: bool = False
+    EDGE_DB_PATH: str = "edge.db"
+    EDGE_SITE_ID: str = ""  # Defaults to the hostname
+    EDGE_UPSTREAM_URL: str = ""  # Central API base, e.g. https://zias.example.edu/api/v1
+    EDGE_UPSTREAM_TOKEN: str = ""  # Bearer token for the central API
+    EDGE_PUSH_INTERVAL_SECONDS: float = 10.0
+    EDGE_PUSH_BATCH_SIZE: int = 5000  # Rows per compressed upload
+    EDGE_PULL_INTERVAL_SECONDS: float = 300.0  # Students, devices and beacons
+    EDGE_PULL_BATCH_SIZE: int = 1000
+    EDGE_RETENTION_DAYS: int = 7  # Uploaded rows older than this are pruned locally
+    
+    # Event dedup (redeliveries within the horizon are dropped)
+    DEDUP_HORIZON_SECONDS: int = 3600
+    DEDUP_BUCKET_SECONDS: int = 60
+    DEDUP_FLUSH_SECONDS: float = 1.0  # Persist new identities to Redis this often
+    
+    # Presence bitmaps (population-wide presence queries, kept in Redis)
+    PRESENCE_SYNC_SECONDS: float = 5.0  # Processor catches up with entry_log this often
+    PRESENCE_SLOT_MINUTES: int = 60
+    PRESENCE_RETENTION_DAYS: int = 400  # Day, slot and room sets expire this long after their day
+    PRESENCE_BATCH_SIZE: int = 10000  # entry_log rows per catch-up query
+    PRESENCE_RESCAN_ROWS: int = 1000  # Rows behind the position re-read, for out-of-order commits
+    
+    # Roster reconciliation (each timetable session is reconciled once it closes)
+    ROSTER_RECONCILE_SECONDS: float = 5.0
+    ROSTER_SETTLE_SECONDS: float = 10.0  # Wait after the bell for in-flight events
+    ROSTER_CATCH_UP_DAYS: int = 1  # Also reconcile sessions missed this many days back
+    ROSTER_EARLY_MINUTES: int = 15  # Entries this long before the start count
+    CAMPUS_TIMEZONE: str = "UTC"  # IANA zone of timetable times, e.g. Europe/Berlin (entry_log is UTC)
+    
+    # Time-range partitions (MySQL; convert once with python -m api.partitions --convert)
+    PARTITION_GRANULARITY: str = "sensor_data=day,ble_events=day,entry_log=month"
+    PARTITION_RETENTION_DAYS: str = "sensor_data=90,ble_events=30,entry_log=0"  # 0 = keep everything
+    PARTITION_AHEAD_DAYS: int = 14  # Partitions exist at least this far ahead
+    PARTITION_ARCHIVE: bool = False  # Swap expired partitions into archive tables instead of dropping
+    PARTITION_MAINTENANCE_SECONDS: float = 3600.0
+    
+    # Occupancy snapshots (point-in-time room occupancy)
+    OCCUPANCY_SNAPSHOT_MINUTES: int = 15  # Rounds on this grid; queries replay at most this much entry_log
+    OCCUPANCY_SETTLE_SECONDS: float = 60.0  # Rounds trail now by this much, for in-flight events
+    OCCUPANCY_MAX_STAY_HOURS: float = 12.0  # Entries without an exit lapse after this long
+    OCCUPANCY_RETENTION_DAYS: int = 400
+    OCCUPANCY_CHECK_SECONDS: float = 30.0
+    OCCUPANCY_SERIES_MINUTES: int = 2880  # Per-minute counts kept per room (Redis ring)
+    OCCUPANCY_SERIES_HOURS: int = 2160  # Hourly mean/peak kept per room
+    OCCUPANCY_SERIES_SETTLE_SECONDS: float = 30.0  # Minutes are written this long after they start
+    OCCUPANCY_SERIES_MIN_COVERAGE_MINUTES: int = 45  # Hours with fewer minutes written stay missing
+    
+    # Student/device search index (per API worker)
+    SEARCH_REFRESH_SECONDS: float = 300.0  # Pick up rows changed outside the API this often
+    
+    # Ingest lanes (sensor > BLE > status); full sensor/BLE lanes spill to the spool, status drops
+    INGEST_SENSOR_CAPACITY: int = 10000
+    INGEST_SENSOR_BATCH: int = 200
+    INGEST_BLE_CAPACITY: int = 20000
+    INGEST_BLE_BATCH: int = 500
+    INGEST_STATUS_CAPACITY: int = 5000
+    INGEST_STATUS_BATCH: int = 500
+    INGEST_STARVATION_ROUNDS: int = 8  # Serve a waiting lower lane after this many rounds
+    INGEST_LANE_STATS_INTERVAL_SECONDS: float = 60.0
+    
+    # Local spool (used when MySQL or Redis is unreachable or slow)
+    SPOOL_DIR: str = "spool"
+    SPOOL_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    SPOOL_FSYNC_EVERY: int = 100  # Records between fsyncs (0 = interval only)
+    SPOOL_FSYNC_INTERVAL_MS: int = 200
+    SPOOL_DOWNSTREAM_TIMEOUT_MS: int = 500  # Slower writes count as "too slow"
+    SPOOL_SLOW_BACKOFF_SECONDS: int = 30  # Keep spooling this long after a failure or slow write
+    SPOOL_REPLAY_BATCH_SIZE: int = 5000
+    SPOOL_REPLAY_MAX_EVENTS_PER_SECOND: int = 20000
+    SPOOL_REPLAY_INTERVAL_SECONDS: float = 5.0
+    
+    # Reports
+    REPORT_FETCH_BATCH_SIZE: int = 50000  # Rows per streaming fetch
+    REPORT_MAX_SESSION_HOURS: int = 12  # Longer entry->exit pairs are ignored
+    REPLAY_BATCH_SIZE: int = 10000  # Rows per fetch/insert when replaying history
     
     class Config:
         env_file = ".env"
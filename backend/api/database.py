@@ -1,51 +1,334 @@
 """
 Database connection and session management
+Writes go to the primary. Reads that can tolerate a little staleness go
+to a read replica (round-robin over those within DB_REPLICA_MAX_LAG_SECONDS
+of the primary), falling back to the primary when none qualifies.
+In EDGE_MODE the primary is an embedded SQLite file in WAL mode.
 """
 
-from sqlalchemy import create_engine
+import hashlib
+import math
+import threading
+import time
+from sqlalchemy import create_engine, event, inspect, select, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
 from contextlib import contextmanager
+from datetime import datetime
+from fastapi import Request
+from typing import Dict, List, Optional
 from api.config import settings
-from api.db_models import Base
+from api.db_models import Base, SchemaFingerprint
+from api.log import get_logger
+
+log = get_logger("api.database")
+
+# MySQL named lock serializing schema changes between workers starting together
+SCHEMA_LOCK_NAME = "zias:schema"
+SCHEMA_LOCK_TIMEOUT_SECONDS = 600  # Adding an index to a large table can take minutes
+
+# Header a client sends to read from the primary, e.g. right after a write:
+# "1"/"true" always, or the Unix time of its write to only do so while a
+# replica could still be behind it
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes"
+
+
+def database_url(host: str, port: int) -> str:
+    return f"mysql+mysqlconnector://{settings.DB_USER}:{settings.DB_PASSWORD}@{host}:{port}/{settings.DB_NAME}"
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # Readers don't block the ingest writer
+    cursor.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; only the last commits can be lost on power loss
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def make_engine(url: str):
+    """Create engine with connection pooling"""
+    if url.startswith("sqlite"):
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            echo=settings.DEBUG
+        )
+        event.listen(sqlite_engine, "connect", _sqlite_pragmas)
+        return sqlite_engine
+    
+    return create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=10,
+        max_overflow=20,
+        pool_pre_ping=True,  # Verify connections before using
+        echo=settings.DEBUG  # Log SQL queries in debug mode
+    )
+
 
 # Database URL
-DATABASE_URL = f"mysql+mysqlconnector://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
-
-# Create engine with connection pooling
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,  # Verify connections before using
-    echo=settings.DEBUG  # Log SQL queries in debug mode
-)
+if settings.EDGE_MODE:
+    DATABASE_URL = f"sqlite:///{settings.EDGE_DB_PATH}"
+else:
+    DATABASE_URL = database_url(settings.DB_HOST, settings.DB_PORT)
+
+engine = make_engine(DATABASE_URL)
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+class Replica:
+    """One read replica engine and its last measured lag"""
+
+    def __init__(self, host: str, port: int):
+        self.name = f"{host}:{port}"
+        self.engine = make_engine(database_url(host, port))
+        self.sessions = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.lag = math.inf  # Seconds behind the primary; inf until measured or when broken
+        self.checked_at = -math.inf
+
+    def measure_lag(self) -> float:
+        """Ask the replica how far behind it is (0 if it is not replicating from anything)"""
+        try:
+            with self.engine.connect() as conn:
+                try:
+                    row = conn.exec_driver_sql("SHOW REPLICA STATUS").mappings().first()
+                except DBAPIError:
+                    # MySQL before 8.0.22
+                    row = conn.exec_driver_sql("SHOW SLAVE STATUS").mappings().first()
+        except Exception as e:
+            log.warning("Replica %s unreachable: %s", self.name, e)
+            return math.inf
+        if row is None:
+            return 0.0
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        return math.inf if lag is None else float(lag)  # None: replication stopped
+
+
+class ReadRouter:
+    """Picks a replica within the lag limit for each read session"""
+
+    def __init__(self, replicas: List[Replica], max_lag_seconds: float, check_interval_seconds: float):
+        self.replicas = replicas
+        self.max_lag = max_lag_seconds
+        self.check_interval = check_interval_seconds
+        self._lock = threading.Lock()
+        self._turn = 0
+
+    def refresh(self):
+        """Re-measure replica lag if the last check is older than the interval"""
+        now = time.monotonic()
+        stale = [r for r in self.replicas if now - r.checked_at >= self.check_interval]
+        if not stale or not self._lock.acquire(blocking=False):
+            return  # Another request is already measuring
+        try:
+            for replica in stale:
+                was_healthy = replica.lag <= self.max_lag
+                replica.lag = replica.measure_lag()
+                replica.checked_at = time.monotonic()
+                if was_healthy != (replica.lag <= self.max_lag):
+                    log.warning("Replica %s %s (lag %ss)", replica.name,
+                                "joined rotation" if not was_healthy else "left rotation", replica.lag)
+        finally:
+            self._lock.release()
+
+    def pick(self) -> Optional[Replica]:
+        """A replica to read from, or None to use the primary"""
+        if not self.replicas:
+            return None
+        self.refresh()
+        healthy = [r for r in self.replicas if r.lag <= self.max_lag]
+        if not healthy:
+            return None
+        self._turn += 1
+        return healthy[self._turn % len(healthy)]
+
+
+def parse_hosts(spec: str) -> List[tuple]:
+    """Parse "db-r1,db-r2:3307" into [("db-r1", DB_PORT), ("db-r2", 3307)]"""
+    hosts = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        host, _, port = item.partition(":")
+        hosts.append((host, int(port) if port else settings.DB_PORT))
+    return hosts
+
+
+read_router = ReadRouter(
+    [] if settings.EDGE_MODE else [Replica(host, port) for host, port in parse_hosts(settings.DB_REPLICA_HOSTS)],
+    max_lag_seconds=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    check_interval_seconds=settings.DB_REPLICA_LAG_CHECK_SECONDS
+)
+
+
+def wants_primary(header: Optional[str]) -> bool:
+    """Whether a read-your-writes header value asks for the primary"""
+    if not header:
+        return False
+    if header.lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return time.time() - float(header) < settings.DB_REPLICA_MAX_LAG_SECONDS
+    except ValueError:
+        return False
+
+
+def read_session(primary: bool = False) -> Session:
+    """New session on a replica, or on the primary if asked for or no replica qualifies"""
+    replica = None if primary else read_router.pick()
+    return replica.sessions() if replica else SessionLocal()
+
+
+def schema_fingerprint(db_engine) -> str:
+    """Hash of the DDL the models compile to on the engine's dialect"""
+    ddl = []
+    for table in Base.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=db_engine.dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            ddl.append(str(CreateIndex(index).compile(dialect=db_engine.dialect)))
+    return hashlib.sha256("\n".join(ddl).encode()).hexdigest()
+
+
+# Columns and indexes added to tables that already existed; create_all only creates
+# missing tables, so migrate() adds these to existing ones
+ADDED_COLUMNS = (
+    ("user_devices", "direction"),
+    ("user_devices", "updated_at"),
+)
+ADDED_INDEXES = (
+    ("user_devices", "ix_user_devices_updated_at"),
+    ("entry_log", "idx_entry_log_room_time"),
+)
+
+
+def migrate(db_engine) -> List[str]:
+    """
+    Add ADDED_COLUMNS and ADDED_INDEXES where an existing table lacks them
+
+    An index counts as present if one on the same columns exists under
+    any name (docs/database_schema.sql names some differently).
+
+    Returns:
+        What was added, as "table.column" / "table.index"
+    """
+    inspector = inspect(db_engine)
+    tables = set(inspector.get_table_names())
+    applied = []
+    with db_engine.begin() as conn:
+        for table_name, column_name in ADDED_COLUMNS:
+            if table_name not in tables:
+                continue
+            if column_name in {column["name"] for column in inspector.get_columns(table_name)}:
+                continue
+            column = Base.metadata.tables[table_name].c[column_name]
+            ddl = CreateColumn(column).compile(dialect=db_engine.dialect)
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {ddl}"))
+            applied.append(f"{table_name}.{column_name}")
+
+        for table_name, index_name in ADDED_INDEXES:
+            if table_name not in tables:
+                continue
+            index = next(i for i in Base.metadata.tables[table_name].indexes if i.name == index_name)
+            wanted = [column.name for column in index.columns]
+            if any(existing["column_names"] == wanted for existing in inspector.get_indexes(table_name)):
+                continue
+            index.create(bind=conn)
+            applied.append(f"{table_name}.{index_name}")
+    return applied
+
+
+def stored_fingerprint(conn: Connection) -> Optional[str]:
+    """Fingerprint stored by the last schema update, or None; ends the transaction so a re-read sees new commits"""
+    try:
+        return conn.execute(select(SchemaFingerprint.fingerprint).where(SchemaFingerprint.id == 1)).scalar()
+    except DBAPIError:
+        return None  # First start: no fingerprint table yet
+    finally:
+        conn.rollback()
+
+
+def store_fingerprint(conn: Connection, fingerprint: str):
+    """Insert or update the single fingerprint row in one statement"""
+    values = {"id": 1, "fingerprint": fingerprint, "applied_at": datetime.utcnow()}
+    if conn.dialect.name == "mysql":
+        stmt = mysql_insert(SchemaFingerprint).values(**values)
+        stmt = stmt.on_duplicate_key_update(fingerprint=stmt.inserted.fingerprint, applied_at=stmt.inserted.applied_at)
+    else:
+        stmt = sqlite_insert(SchemaFingerprint).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"fingerprint": stmt.excluded.fingerprint, "applied_at": stmt.excluded.applied_at}
+        )
+    conn.execute(stmt)
+    conn.commit()
+
+
+@contextmanager
+def schema_lock(conn: Connection):
+    """Hold the schema lock for the block (MySQL; other databases have one writer process)"""
+    if conn.dialect.name != "mysql":
+        yield
+        return
+    locked = conn.execute(
+        text("SELECT GET_LOCK(:name, :timeout)"),
+        {"name": SCHEMA_LOCK_NAME, "timeout": SCHEMA_LOCK_TIMEOUT_SECONDS}
+    ).scalar()
+    conn.rollback()  # The lock outlives the transaction; reads after it start a fresh snapshot
+    if not locked:
+        raise RuntimeError(f"Timed out waiting for schema lock {SCHEMA_LOCK_NAME}")
+    try:
+        yield
+    finally:
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": SCHEMA_LOCK_NAME})
+
+
 def init_db():
-    """Initialize database connection and create tables"""
+    """
+    Initialize database connection and create tables
+    
+    create_all checks every table, so it (and migrate) only runs when
+    the models' fingerprint differs from the one stored by the last run;
+    a worker starting against an up-to-date schema costs one query.
+    Workers that start together against a changed schema take turns
+    under a lock: the first updates it, the rest find the new
+    fingerprint once they get the lock.
+    """
+    fingerprint = schema_fingerprint(engine)
     try:
-        # Test connection
         with engine.connect() as conn:
-            print(f"Connected to database: {settings.DB_NAME}")
-        
-        # Create tables if they don't exist
-        Base.metadata.create_all(bind=engine)
-        print("Database tables initialized")
+            log.info("Connected to database: %s", settings.EDGE_DB_PATH if settings.EDGE_MODE else settings.DB_NAME)
+            if stored_fingerprint(conn) == fingerprint:
+                log.info("Schema fingerprint matches, skipping table creation")
+                return
+            
+            with schema_lock(conn):
+                if stored_fingerprint(conn) == fingerprint:
+                    log.info("Schema updated by another worker, skipping table creation")
+                    return
+                
+                # Create tables if they don't exist, then add new columns/indexes to existing ones
+                Base.metadata.create_all(bind=engine)
+                for change in migrate(engine):
+                    log.info("Schema migrated: added %s", change)
+                store_fingerprint(conn, fingerprint)
+        log.info("Database tables initialized (schema fingerprint %s)", fingerprint[:12])
         
     except Exception as e:
-        print(f"Database initialization error: {e}")
+        log.error("Database initialization error: %s", e)
         raise
 
 
 def close_db():
     """Close database connection"""
     engine.dispose()
-    print("Database connection closed")
+    for replica in read_router.replicas:
+        replica.engine.dispose()
+    log.info("Database connection closed")
 
 
 @contextmanager
@@ -64,6 +347,22 @@ def get_db_session() -> Session:
         db.close()
 
 
+@contextmanager
+def get_read_db_session(primary: bool = False) -> Session:
+    """
+    Get a read-only session with context manager, on a replica when one is fit
+    
+    Usage:
+        with get_read_db_session() as db:
+            build_report(db, date_from, date_to)
+    """
+    db = read_session(primary)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def get_db():
     """
     Dependency for FastAPI routes
@@ -78,3 +377,43 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db(request: Request):
+    """
+    Dependency for read-only FastAPI routes
+    
+    Uses a replica unless the request carries the read-your-writes header.
+    
+    Usage:
+        @router.get("/")
+        def route(db: Session = Depends(get_read_db)):
+            ...
+    """
+    db = read_session(wants_primary(request.headers.get(READ_YOUR_WRITES_HEADER)))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Connection pool usage per engine, with replica lag"""
+    stats = {"primary": _pool_stats(engine)}
+    for replica in read_router.replicas:
+        stats[replica.name] = dict(
+            _pool_stats(replica.engine),
+            lag_seconds=None if math.isinf(replica.lag) else replica.lag,
+            in_rotation=replica.lag <= read_router.max_lag
+        )
+    return stats
+
+
+def _pool_stats(db_engine) -> dict:
+    pool = db_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow()
+    }
@@ -2,7 +2,10 @@
 SQLAlchemy database models for ZIAS
 """
 
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, Text, Enum, ForeignKey
+from sqlalchemy import (
+    Column, String, Integer, Float, Date, DateTime, Time, Boolean, Text, Enum, ForeignKey, Index, LargeBinary,
+    PrimaryKeyConstraint
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -18,12 +21,23 @@ class DeviceTypeEnum(enum.Enum):
     UNIVERSAL = "universal"
 
 
+class DeviceDirectionEnum(enum.Enum):
+    ENTRY = "entry"
+    EXIT = "exit"
+
+
 class DeviceStatusEnum(enum.Enum):
     ACTIVE = "active"
     INACTIVE = "inactive"
     MAINTENANCE = "maintenance"
 
 
+class SessionAttendanceEnum(enum.Enum):
+    PRESENT = "present"
+    LATE = "late"
+    ABSENT = "absent"
+
+
 class Student(Base):
     __tablename__ = "student"
     
@@ -46,6 +60,7 @@ class UserDevice(Base):
     cluster_ID = Column(Integer, nullable=False, index=True)
     device_type = Column(Enum(DeviceTypeEnum), nullable=False)
     room_value = Column(String(50), nullable=False, index=True)
+    direction = Column(Enum(DeviceDirectionEnum))  # NULL = legacy device ID parity
     location_description = Column(String(200))
     has_rfid = Column(Boolean, default=False)
     has_pir = Column(Boolean, default=False)
@@ -54,6 +69,7 @@ class UserDevice(Base):
     last_seen = Column(DateTime)
     status = Column(Enum(DeviceStatusEnum), default=DeviceStatusEnum.ACTIVE)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)  # Registration changes only, not heartbeats
     
     # Relationships
     sensor_data = relationship("SensorData", back_populates="device")
@@ -88,6 +104,10 @@ class EntryLog(Base):
     
     # Relationships
     student = relationship("Student", back_populates="attendance_logs")
+    
+    __table_args__ = (
+        Index("idx_entry_log_room_time", "room_value", "timestamp"),  # Per-room windows (roster reconciliation)
+    )
 
 
 class AttendanceSummary(Base):
@@ -120,3 +140,124 @@ class BLEEvent(Base):
     app_version = Column(String(20))
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     processed = Column(Boolean, default=False, index=True)
+
+
+class Beacon(Base):
+    __tablename__ = "beacons"
+    
+    beacon_uuid = Column(String(100), primary_key=True)
+    room_value = Column(String(50), nullable=False, index=True)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    radius_meters = Column(Float)  # Geofence radius, defaults to BLE_GEOFENCE_RADIUS_METERS
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class EdgeCheckpoint(Base):
+    __tablename__ = "edge_checkpoints"
+    
+    site_id = Column(String(50), nullable=False)
+    store_id = Column(String(32), nullable=False)  # One per edge database, so a rebuilt store starts afresh
+    table_name = Column(String(50), nullable=False)  # Uploaded table, or "pull:<table>"
+    position = Column(String(64), nullable=False)  # Last uploaded row ID, or pull cursor
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        PrimaryKeyConstraint("site_id", "store_id", "table_name"),
+    )
+
+
+class SchemaFingerprint(Base):
+    __tablename__ = "schema_fingerprint"
+    
+    id = Column(Integer, primary_key=True)  # Single row, id 1
+    fingerprint = Column(String(64), nullable=False)  # SHA-256 of the models' DDL at the last create_all
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
+class TimetableSession(Base):
+    __tablename__ = "timetable_sessions"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    course_code = Column(String(50), nullable=False, index=True)
+    room_value = Column(String(50), nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)  # 0=Monday
+    starts_at = Column(Time, nullable=False)  # Campus wall time (CAMPUS_TIMEZONE)
+    ends_at = Column(Time, nullable=False)
+    late_after_minutes = Column(Integer, nullable=False, default=10)
+    valid_from = Column(Date)  # NULL = open-ended
+    valid_to = Column(Date)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("idx_timetable_weekday_end", "weekday", "ends_at"),
+    )
+
+
+class RosterEntry(Base):
+    __tablename__ = "roster"
+    
+    session_id = Column(Integer, ForeignKey("timetable_sessions.id", ondelete="CASCADE"), nullable=False)
+    student_id = Column(String(20), ForeignKey("student.student_id", ondelete="CASCADE"), nullable=False, index=True)
+    
+    __table_args__ = (
+        PrimaryKeyConstraint("session_id", "student_id"),
+    )
+
+
+class SessionOccurrence(Base):
+    __tablename__ = "session_occurrences"
+    
+    session_id = Column(Integer, ForeignKey("timetable_sessions.id", ondelete="CASCADE"), nullable=False)
+    session_date = Column(Date, nullable=False)
+    room_value = Column(String(50), nullable=False)
+    window_start = Column(DateTime, nullable=False)  # UTC like entry_log; entries from here count (early arrivals)
+    starts_at = Column(DateTime, nullable=False)
+    late_at = Column(DateTime, nullable=False)  # First entries after this are late
+    ends_at = Column(DateTime, nullable=False)
+    reconciled_at = Column(DateTime, index=True)  # NULL while claimed but not yet reconciled
+    present = Column(Integer, default=0)
+    late = Column(Integer, default=0)
+    absent = Column(Integer, default=0)
+    
+    __table_args__ = (
+        PrimaryKeyConstraint("session_id", "session_date"),
+    )
+
+
+class SessionAttendance(Base):
+    __tablename__ = "session_attendance"
+    
+    session_id = Column(Integer, nullable=False)
+    session_date = Column(Date, nullable=False)
+    student_id = Column(String(20), ForeignKey("student.student_id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(Enum(SessionAttendanceEnum), nullable=False)
+    first_entry = Column(DateTime)  # NULL when absent, or already in the room at the start
+    
+    __table_args__ = (
+        PrimaryKeyConstraint("session_id", "session_date", "student_id"),
+    )
+
+
+class OccupancyRound(Base):
+    __tablename__ = "occupancy_rounds"
+    
+    taken_at = Column(DateTime, primary_key=True)
+    last_log_id = Column(Integer, nullable=False)  # entry_log rows above this arrived after the round
+    rooms = Column(Integer, default=0)  # Occupied rooms (empty rooms get no snapshot row)
+    occupants = Column(Integer, default=0)
+
+
+class OccupancySnapshot(Base):
+    __tablename__ = "occupancy_snapshots"
+    
+    taken_at = Column(DateTime, nullable=False)
+    room_value = Column(String(50), nullable=False)
+    occupants = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)  # zlib of sorted "RFID<TAB>microseconds inside" lines
+    
+    __table_args__ = (
+        PrimaryKeyConstraint("taken_at", "room_value"),
+    )
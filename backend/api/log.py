@@ -0,0 +1,225 @@
+"""
+Structured logging
+Non-blocking, queue-based logging shared by the API, ingest, event
+processor and cron. Callers only pay for a level check and, for records
+that pass, a queue put; formatting and stdout I/O happen on a background
+thread. Per-category sampling and rate limits drop noise before it is
+queued.
+
+Usage:
+    from api.log import get_logger
+    log = get_logger("mqtt.client")
+    log.debug("Sensor event from %s: %s", device_id, payload)
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+ROOT_LOGGER = "zias"
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_traceback_formatter = logging.Formatter()
+_listener: Optional[QueueListener] = None
+
+
+def get_logger(category: str) -> logging.Logger:
+    """Logger for a category such as "mqtt.client"; the category drives sampling and rate limits"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{category}")
+
+
+def parse_category_values(spec: str) -> Dict[str, float]:
+    """Parse "mqtt.client=0.1,cron=5" into {"mqtt.client": 0.1, "cron": 5.0}"""
+    values = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        category, _, value = item.partition("=")
+        values[category.strip()] = float(value)
+    return values
+
+
+def _extras(record: logging.LogRecord) -> Dict:
+    return {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS}
+
+
+class CategoryFilter(logging.Filter):
+    """
+    Per-category sampling and rate limiting
+
+    Sampling keeps a fraction of records below WARNING. The rate limit is
+    a token bucket of N records/second (burst N) applied to every level.
+    The number of records dropped is attached to the next record of that
+    category that gets through, as "suppressed".
+    """
+
+    def __init__(self, sample_rates: Dict[str, float], rate_limits: Dict[str, float]):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.rate_limits = rate_limits
+        self._policies: Dict[str, Tuple[float, float]] = {}
+        self._buckets: Dict[str, list] = {}
+        self._dropped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _lookup(values: Dict[str, float], category: str, default: float) -> float:
+        # Longest configured prefix wins: "mqtt" covers "mqtt.client"
+        while category:
+            if category in values:
+                return values[category]
+            category = category.rpartition(".")[0]
+        return default
+
+    def _policy(self, category: str) -> Tuple[float, float]:
+        policy = self._policies.get(category)
+        if policy is None:
+            policy = (
+                self._lookup(self.sample_rates, category, 1.0),
+                self._lookup(self.rate_limits, category, 0.0)
+            )
+            self._policies[category] = policy
+        return policy
+
+    def _drop(self, category: str) -> bool:
+        self._dropped[category] = self._dropped.get(category, 0) + 1
+        return False
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        category = record.name[len(ROOT_LOGGER) + 1:] if record.name.startswith(ROOT_LOGGER + ".") else record.name
+        sample, limit = self._policy(category)
+
+        with self._lock:
+            if sample < 1.0 and record.levelno < logging.WARNING and random.random() >= sample:
+                return self._drop(category)
+
+            if limit > 0:
+                now = time.monotonic()
+                bucket = self._buckets.get(category)
+                if bucket is None:
+                    bucket = self._buckets[category] = [limit, now]
+                bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit)
+                bucket[1] = now
+                if bucket[0] < 1.0:
+                    return self._drop(category)
+                bucket[0] -= 1.0
+
+            dropped = self._dropped.pop(category, 0)
+
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated after the call) but keep the
+        # traceback separate so JSON output can put it in its own field
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines; extra fields are appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = _extras(record)
+        if extras:
+            line += " " + " ".join(f"{k}={v}" for k, v in extras.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for log shipping"""
+
+    def __init__(self, service: Optional[str] = None):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        if self.service:
+            doc["service"] = self.service
+        doc.update(_extras(record))
+        if record.exc_text:
+            doc["exc"] = record.exc_text
+        return json.dumps(doc, default=str)
+
+
+def setup_logging(service: Optional[str] = None, config=None):
+    """
+    Install the queue handler on the "zias" logger and start the writer thread
+
+    Safe to call more than once; only the first call has an effect.
+
+    Args:
+        service: Name added to JSON records, e.g. "ingest"
+        config: Object with the LOG_* settings; api.config.settings if omitted
+    """
+    global _listener
+    if _listener is not None:
+        return
+    settings = config
+    if settings is None:
+        from api.config import settings
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter(service) if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(CategoryFilter(
+        parse_category_values(settings.LOG_SAMPLE_RATES),
+        parse_category_values(settings.LOG_RATE_LIMITS)
+    ))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    root.handlers = [handler]
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -3,7 +3,7 @@ Pydantic models for API requests/responses
 """
 
 from pydantic import BaseModel, Field
-from datetime import datetime
+from datetime import date, datetime, time
 from typing import Optional, List
 from enum import Enum
 
@@ -14,6 +14,18 @@ class DeviceType(str, Enum):
     BLE_BEACON = "ble_beacon"
 
 
+class DeviceDirection(str, Enum):
+    ENTRY = "entry"
+    EXIT = "exit"
+
+
+class FleetCommand(str, Enum):
+    REBOOT = "reboot"
+    CONFIG = "config"
+    MODE = "mode"
+    PING = "ping"
+
+
 class EventType(str, Enum):
     ENTRY = "entry"
     EXIT = "exit"
@@ -29,6 +41,7 @@ class AttendanceEvent(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     confidence: float = Field(ge=0.0, le=1.0, default=1.0)
     metadata: Optional[dict] = None
+    event_id: Optional[str] = Field(default=None, max_length=128)  # Client-chosen; retries with the same ID are recorded once
 
 
 class BeaconEvent(BaseModel):
@@ -73,9 +86,42 @@ class DeviceRegister(BaseModel):
     device_type: DeviceType
     cluster_id: int
     room_value: str
+    direction: Optional[DeviceDirection] = None  # Omit for legacy device ID parity
     location_description: Optional[str] = None
 
 
+class BeaconRegister(BaseModel):
+    """Register or move a BLE beacon"""
+    beacon_uuid: str
+    room_value: str
+    latitude: Optional[float] = Field(default=None, ge=-90.0, le=90.0)
+    longitude: Optional[float] = Field(default=None, ge=-180.0, le=180.0)
+    radius_meters: Optional[float] = Field(default=None, gt=0.0)
+
+
+class TimetableSessionCreate(BaseModel):
+    """Weekly timetable slot of a course in a room, with its roster"""
+    course_code: str
+    room_value: str
+    weekday: int = Field(ge=0, le=6)  # 0=Monday
+    starts_at: time
+    ends_at: time
+    late_after_minutes: int = Field(default=10, ge=0)
+    valid_from: Optional[date] = None
+    valid_to: Optional[date] = None
+    student_ids: List[str] = Field(default_factory=list)
+
+
+class FleetCommandRequest(BaseModel):
+    """Send a command to every device matching the target filters"""
+    command: FleetCommand
+    params: dict = Field(default_factory=dict)  # e.g. {"mode": "maintenance"}, {"debounce_ms": 3000}
+    cluster_id: Optional[int] = None
+    room_value: Optional[str] = None
+    device_type: Optional[DeviceType] = None
+    device_ids: Optional[List[str]] = None
+
+
 class Token(BaseModel):
     """JWT token response"""
     access_token: str
@@ -0,0 +1,213 @@
+"""
+Point-in-time room occupancy
+Who was in a room at any past instant, answered from the nearest earlier
+snapshot plus the entry_log rows between it and that instant.
+
+Occupancy follows the real-time view: a student is in a room if their
+latest row there is an entry and it is less than max_stay old (entries
+without an exit lapse). So the state at T depends only on rows in
+(T - max_stay, T], and every query is bounded: with no snapshot it
+replays that window, with one it replays at most one interval.
+
+Snapshots are taken in rounds on a fixed grid (every interval minutes,
+settle_seconds behind now), each round built from the previous one. A
+round stores a row per occupied room with its occupants and entry
+times, zlib-compressed; empty rooms get no row. Each round records the
+highest entry_log ID it saw, so rows that arrive late for an
+already-snapshotted time (edge uploads, spool replays) invalidate the
+rounds from that time on, and they are rebuilt.
+"""
+
+import asyncio
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.db_models import EntryLog, OccupancyRound, OccupancySnapshot
+from api.log import get_logger
+
+log = get_logger("api.occupancy")
+
+# room -> RFID -> time of the entry that put them there
+Occupancy = Dict[str, Dict[str, datetime]]
+
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode(occupants: Dict[str, datetime], taken_at: datetime) -> bytes:
+    lines = (f"{rfid}\t{(taken_at - entered) // MICROSECOND}" for rfid, entered in sorted(occupants.items()))
+    return zlib.compress("\n".join(lines).encode())
+
+
+def decode(data: bytes, taken_at: datetime) -> Dict[str, datetime]:
+    occupants = {}
+    for line in zlib.decompress(data).decode().splitlines():
+        rfid, inside = line.rsplit("\t", 1)
+        occupants[rfid] = taken_at - int(inside) * MICROSECOND
+    return occupants
+
+
+def occupancy_at(db: Session, at: datetime, max_stay: timedelta,
+                 room: Optional[str] = None) -> Tuple[Occupancy, Optional[datetime], int]:
+    """
+    Occupants of every room (or one room) at an instant
+
+    Returns:
+        (occupancy, snapshot round used or None, entry_log rows replayed)
+    """
+    base = db.scalar(select(func.max(OccupancyRound.taken_at)).where(
+        OccupancyRound.taken_at <= at,
+        OccupancyRound.taken_at >= at - max_stay
+    ))
+
+    state: Occupancy = {}
+    if base is not None:
+        query = select(OccupancySnapshot.room_value, OccupancySnapshot.data).where(OccupancySnapshot.taken_at == base)
+        if room is not None:
+            query = query.where(OccupancySnapshot.room_value == room)
+        for room_value, data in db.execute(query):
+            state[room_value] = decode(data, base)
+        since = EntryLog.timestamp > base
+    else:
+        since = EntryLog.timestamp >= at - max_stay
+
+    query = (
+        select(EntryLog.room_value, EntryLog.RFID, EntryLog.status, EntryLog.timestamp)
+        .where(since, EntryLog.timestamp <= at, EntryLog.room_value.isnot(None))
+        .order_by(EntryLog.timestamp, EntryLog.id)
+    )
+    if room is not None:
+        query = query.where(EntryLog.room_value == room)
+
+    replayed = 0
+    for room_value, rfid, status, timestamp in db.execute(query):
+        replayed += 1
+        if status == 1:
+            state.setdefault(room_value, {})[rfid] = timestamp
+        else:
+            state.get(room_value, {}).pop(rfid, None)
+
+    cutoff = at - max_stay
+    occupancy = {}
+    for room_value, occupants in state.items():
+        occupants = {rfid: entered for rfid, entered in occupants.items() if entered >= cutoff}
+        if occupants:
+            occupancy[room_value] = occupants
+    return occupancy, base, replayed
+
+
+class OccupancySnapshotter:
+    """Takes occupancy snapshot rounds on an interval grid and keeps them consistent with entry_log"""
+
+    def __init__(self, interval_minutes: int = 15, settle_seconds: float = 60.0, max_stay_hours: float = 12.0,
+                 retention_days: int = 400, check_seconds: float = 30.0):
+        self.interval = timedelta(minutes=interval_minutes)
+        self.settle = timedelta(seconds=settle_seconds)
+        self.max_stay = timedelta(hours=max_stay_hours)
+        self.retention = timedelta(days=retention_days)
+        self.check_seconds = check_seconds
+        self._running = False
+
+    def grid_floor(self, when: datetime) -> datetime:
+        return datetime.min + (when - datetime.min) // self.interval * self.interval
+
+    def invalidate_late(self, db: Session) -> Optional[datetime]:
+        """Drop rounds at or after the earliest row that arrived after them; returns that time, if any"""
+        earliest = None
+        while True:
+            latest = db.execute(
+                select(OccupancyRound.taken_at, OccupancyRound.last_log_id)
+                .order_by(OccupancyRound.taken_at.desc()).limit(1)
+            ).first()
+            if latest is None:
+                return earliest
+            late = db.scalar(select(func.min(EntryLog.timestamp)).where(
+                EntryLog.id > latest.last_log_id,
+                EntryLog.timestamp <= latest.taken_at
+            ))
+            if late is None:
+                return earliest
+            db.execute(delete(OccupancySnapshot).where(OccupancySnapshot.taken_at >= late))
+            db.execute(delete(OccupancyRound).where(OccupancyRound.taken_at >= late))
+            earliest = late if earliest is None else min(earliest, late)
+
+    def take(self, db: Session, taken_at: datetime, last_log_id: int) -> int:
+        """Write one round (the previous round must already be in place); returns occupied rooms"""
+        occupancy, _, _ = occupancy_at(db, taken_at, self.max_stay)
+        if occupancy:
+            db.execute(insert(OccupancySnapshot), [
+                {"taken_at": taken_at, "room_value": room, "occupants": len(occupants),
+                 "data": encode(occupants, taken_at)}
+                for room, occupants in occupancy.items()
+            ])
+        db.add(OccupancyRound(
+            taken_at=taken_at,
+            last_log_id=last_log_id,
+            rooms=len(occupancy),
+            occupants=sum(len(o) for o in occupancy.values())
+        ))
+        db.flush()
+        return len(occupancy)
+
+    def snapshot(self, db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Take every round due by now, in one transaction
+
+        Missed rounds are filled in from the latest one, unless that is
+        more than max_stay old; then only the current round is taken and
+        queries in the gap replay entry_log.
+
+        Returns:
+            Rounds taken
+        """
+        now = now or datetime.utcnow()
+        target = self.grid_floor(now - self.settle)
+        try:
+            late = self.invalidate_late(db)
+            if late is not None:
+                log.info("Late entry_log rows from %s, rebuilding occupancy snapshots", late)
+
+            last_log_id = db.scalar(select(func.max(EntryLog.id))) or 0
+            last = db.scalar(select(func.max(OccupancyRound.taken_at)))
+            taken_at = last + self.interval if last and last >= target - self.max_stay else target
+
+            rounds = 0
+            while taken_at <= target:
+                self.take(db, taken_at, last_log_id)
+                taken_at += self.interval
+                rounds += 1
+
+            expired = now - self.retention
+            db.execute(delete(OccupancySnapshot).where(OccupancySnapshot.taken_at < expired))
+            db.execute(delete(OccupancyRound).where(OccupancyRound.taken_at < expired))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            log.info("Occupancy round taken by another snapshotter, skipping")
+            return 0
+
+        if rounds:
+            log.debug("Took %d occupancy rounds up to %s", rounds, target)
+        return rounds
+
+    def run_once(self) -> int:
+        from api.database import get_db_session
+
+        with get_db_session() as db:
+            return self.snapshot(db)
+
+    async def run(self):
+        self._running = True
+        while self._running:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                log.warning("Occupancy snapshot failed, will retry: %s", e)
+            await asyncio.sleep(self.check_seconds)
+
+    def stop(self):
+        self._running = False
@@ -0,0 +1,262 @@
+"""
+Rolling per-room occupancy series
+Dashboards chart occupancy over time from two fixed-size rings per room
+kept in Redis, so a campus-wide chart is one request and no SQL.
+
+Minute ring: one big-endian uint16 count per minute, at slot
+minute % minute_slots (two days by default). Hour ring: mean (in tenths)
+and peak per hour as two uint16, rolled up from the minute ring when the
+hour completes (90 days by default). 0xFFFF marks a slot never written;
+hours with fewer than min_coverage minutes written are left that way
+rather than charted from a fraction of the hour.
+Slots are overwritten in place, so memory per room is fixed.
+
+The event processor writes each minute's counts (occupancy at the start
+of the minute, from api.occupancy) and backfills minutes it missed, up
+to a ring's length. Values are derived from entry_log, so several
+processors writing the same minute agree.
+"""
+
+import asyncio
+import struct
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from api.db_models import UserDevice
+from api.log import get_logger
+from api.occupancy import occupancy_at
+
+log = get_logger("api.occupancy_series")
+
+KEY_PREFIX = "zias:occupancy"
+ROOMS_KEY = f"{KEY_PREFIX}:rooms"    # Rooms that have rings
+MINUTE_KEY = f"{KEY_PREFIX}:minute"  # Latest minute written (minutes since the epoch)
+HOUR_KEY = f"{KEY_PREFIX}:hour"      # Latest hour rolled up (hours since the epoch)
+
+RESOLUTIONS = ("minute", "hour")
+MISSING = 0xFFFF
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes=1)
+HOUR = timedelta(hours=1)
+
+
+def minutes_key(room: str) -> str:
+    return f"{KEY_PREFIX}:minutes:{room}"
+
+
+def hours_key(room: str) -> str:
+    return f"{KEY_PREFIX}:hours:{room}"
+
+
+def to_minute(when: datetime) -> int:
+    return (when - EPOCH) // MINUTE
+
+
+def to_hour(when: datetime) -> int:
+    return (when - EPOCH) // HOUR
+
+
+def ring_ranges(first: int, count: int, slots: int) -> List[Tuple[int, int]]:
+    """(first slot, slot count) runs covering count consecutive points from first; at most two when wrapping"""
+    start = first % slots
+    head = min(count, slots - start)
+    return [(start, head)] + ([(0, count - head)] if count > head else [])
+
+
+class OccupancySeries:
+    """Per-room minute and hour occupancy rings in Redis"""
+
+    def __init__(self, client: redis.Redis, minute_slots: int = 2880, hour_slots: int = 2160,
+                 max_stay_hours: float = 12.0, settle_seconds: float = 60.0, min_coverage: int = 45):
+        """
+        Args:
+            client: Redis client without decode_responses (values are binary)
+            minute_slots: Minutes of per-minute counts kept
+            hour_slots: Hours of hourly mean/peak kept
+            min_coverage: Minutes of an hour that must be written to roll it up
+        """
+        self.client = client
+        self.minute_slots = minute_slots
+        self.hour_slots = hour_slots
+        self.max_stay = timedelta(hours=max_stay_hours)
+        self.settle = timedelta(seconds=settle_seconds)
+        self.min_coverage = max(1, min(min_coverage, 60))
+        self._rooms = set()  # Rooms whose rings this process has seen exist
+
+    def counts(self, minutes: Iterable[int]) -> Tuple[List[str], List[Dict[str, int]]]:
+        """Rooms (with devices or occupants) and their counts at the start of each minute; blocking"""
+        from api.database import get_read_db_session
+
+        with get_read_db_session() as db:
+            rooms = {room for (room,) in db.execute(select(UserDevice.room_value).distinct()) if room}
+            counts = []
+            for minute in minutes:
+                occupancy, _, _ = occupancy_at(db, EPOCH + minute * MINUTE, self.max_stay)
+                counts.append({room: len(occupants) for room, occupants in occupancy.items()})
+                rooms.update(occupancy)
+        return sorted(rooms), counts
+
+    async def _ensure_rings(self, rooms: List[str]):
+        """Create missing rings filled with MISSING, so unwritten slots never read as zero"""
+        new = [room for room in rooms if room not in self._rooms]
+        if not new:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for room in new:
+            pipe.set(minutes_key(room), b"\xff\xff" * self.minute_slots, nx=True)
+            pipe.set(hours_key(room), b"\xff\xff\xff\xff" * self.hour_slots, nx=True)
+        pipe.sadd(ROOMS_KEY, *new)
+        await pipe.execute()
+        self._rooms.update(new)
+
+    async def update(self, now: Optional[datetime] = None) -> int:
+        """
+        Write minutes due since the last update, then roll up completed hours
+
+        Returns:
+            Minutes written
+        """
+        now = now or datetime.utcnow()
+        current = to_minute(now - self.settle)
+        latest = await self.client.get(MINUTE_KEY)
+        first = max(int(latest) + 1, current - self.minute_slots + 1) if latest else current
+        if first > current:
+            return 0
+
+        minutes = range(first, current + 1)
+        rooms, counts = await asyncio.to_thread(self.counts, minutes)
+        await self._ensure_rings(rooms)
+
+        pipe = self.client.pipeline(transaction=False)
+        for room in rooms:
+            values = [min(c.get(room, 0), MISSING - 1) for c in counts]
+            written = 0
+            for start, count in ring_ranges(first, len(values), self.minute_slots):
+                chunk = values[written:written + count]
+                pipe.setrange(minutes_key(room), start * 2, struct.pack(f">{count}H", *chunk))
+                written += count
+        pipe.set(MINUTE_KEY, current)
+        await pipe.execute()
+
+        await self.roll_up(rooms, current)
+        return len(minutes)
+
+    async def roll_up(self, rooms: List[str], current_minute: int) -> int:
+        """Hourly mean and peak for every hour completed by current_minute; returns hours rolled up"""
+        done = (current_minute + 1) // 60 - 1  # Last hour whose 60 minutes are all written
+        latest = await self.client.get(HOUR_KEY)
+        first = max(int(latest) + 1 if latest else done, done - self.hour_slots + 1)
+        if first > done:
+            return 0
+
+        # Hours that fell out of the minute ring before they were rolled up are marked missing
+        hours = range(first, done + 1)
+        oldest = max(first, (current_minute - self.minute_slots + 60) // 60)
+        minutes = await self._read(minutes_key, rooms, oldest * 60, (done + 1 - oldest) * 60, self.minute_slots, 2)
+
+        pipe = self.client.pipeline(transaction=False)
+        for room in rooms:
+            packed = []
+            for hour in hours:
+                i = hour - oldest
+                values = [v for v in minutes[room][i * 60:(i + 1) * 60] if v != MISSING] if i >= 0 else []
+                if len(values) >= self.min_coverage:
+                    packed += [min(round(sum(values) * 10 / len(values)), MISSING - 1), max(values)]
+                else:
+                    packed += [MISSING, MISSING]
+            written = 0
+            for start, count in ring_ranges(first, len(hours), self.hour_slots):
+                chunk = packed[written * 2:(written + count) * 2]
+                pipe.setrange(hours_key(room), start * 4, struct.pack(f">{count * 2}H", *chunk))
+                written += count
+        pipe.set(HOUR_KEY, done)
+        await pipe.execute()
+        return len(hours)
+
+    async def _read(self, key, rooms: List[str], first: int, count: int, slots: int,
+                    width: int) -> Dict[str, List[int]]:
+        """count consecutive points from first of each room's ring, as flat uint16 lists"""
+        if count <= 0:
+            return {room: [] for room in rooms}
+        runs = ring_ranges(first, count, slots)
+        pipe = self.client.pipeline(transaction=False)
+        for room in rooms:
+            for start, n in runs:
+                pipe.getrange(key(room), start * width, (start + n) * width - 1)
+        raw = await pipe.execute()
+
+        values = {}
+        for i, room in enumerate(rooms):
+            data = b"".join(raw[i * len(runs):(i + 1) * len(runs)])
+            if len(data) < count * width:  # Ring missing (room added since)
+                data = b"\xff" * (count * width)
+            values[room] = list(struct.unpack(f">{len(data) // 2}H", data))
+        return values
+
+    async def rooms(self) -> List[str]:
+        return sorted(room.decode() for room in await self.client.smembers(ROOMS_KEY))
+
+    async def series(self, rooms: List[str], resolution: str = "minute", points: int = 120,
+                     end: Optional[datetime] = None) -> dict:
+        """
+        Series of points consecutive minutes or hours per room, ending at end (default: latest)
+
+        Points outside what the rings hold are None. Hourly series
+        carry the mean count ("rooms") and the peak ("peak").
+        """
+        latest = await self.client.get(MINUTE_KEY if resolution == "minute" else HOUR_KEY)
+        slots = self.minute_slots if resolution == "minute" else self.hour_slots
+        step = MINUTE if resolution == "minute" else HOUR
+        points = max(1, min(points, slots))
+
+        if end is not None:
+            last = to_minute(end) if resolution == "minute" else to_hour(end)
+        elif latest is not None:
+            last = int(latest)
+        else:
+            last = to_minute(datetime.utcnow()) if resolution == "minute" else to_hour(datetime.utcnow())
+        first = last - points + 1
+
+        # The rings hold the last `slots` points up to the latest one written
+        held_to = int(latest) if latest is not None else first - 1
+        held_from = held_to - slots + 1
+
+        width = 2 if resolution == "minute" else 4
+        key = minutes_key if resolution == "minute" else hours_key
+        raw = await self._read(key, rooms, first, points, slots, width) if rooms else {}
+
+        def points_of(values: List[int], tenths: bool = False) -> List[Optional[float]]:
+            return [
+                None if v == MISSING or not held_from <= first + n <= held_to else (v / 10 if tenths else v)
+                for n, v in enumerate(values)
+            ]
+
+        response = {
+            "resolution": resolution,
+            "start": EPOCH + first * step,
+            "step_seconds": int(step.total_seconds()),
+            "points": points
+        }
+        if resolution == "minute":
+            response["rooms"] = {room: points_of(raw[room]) for room in rooms}
+        else:
+            response["rooms"] = {room: points_of(raw[room][0::2], tenths=True) for room in rooms}
+            response["peak"] = {room: points_of(raw[room][1::2]) for room in rooms}
+        return response
+
+
+def occupancy_series(client: redis.Redis) -> OccupancySeries:
+    """An OccupancySeries with the configured settings"""
+    from api.config import settings
+
+    return OccupancySeries(
+        client,
+        minute_slots=settings.OCCUPANCY_SERIES_MINUTES,
+        hour_slots=settings.OCCUPANCY_SERIES_HOURS,
+        max_stay_hours=settings.OCCUPANCY_MAX_STAY_HOURS,
+        settle_seconds=settings.OCCUPANCY_SERIES_SETTLE_SECONDS,
+        min_coverage=settings.OCCUPANCY_SERIES_MIN_COVERAGE_MINUTES
+    )
@@ -0,0 +1,335 @@
+"""
+Time-range partition manager (MySQL)
+sensor_data, ble_events and entry_log are partitioned by
+RANGE (TO_DAYS(<time column>)), by day or by month. Partitions are
+created ahead of time by splitting the empty catch-all partition, and
+history past a table's retention is dropped, or first swapped out into
+an archive table, one partition at a time: both are metadata operations,
+not row deletes. Queries bounded on the time column only touch the
+partitions in range.
+
+Partitioning needs the time column in the primary key and no foreign
+keys, so an existing table is converted once, explicitly (it rebuilds
+the table). The scheduled maintenance only ever adds and purges.
+
+Other dialects (the edge gateway's SQLite store) are left alone.
+
+CLI usage:
+    python -m api.partitions --convert   # Once per table; rebuilds it
+    python -m api.partitions             # Add ahead, purge past retention
+"""
+
+import argparse
+import asyncio
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from api.log import get_logger
+
+log = get_logger("api.partitions")
+
+# Partitioned table -> time column
+PARTITIONED_TABLES = {
+    "sensor_data": "time_stamp",
+    "ble_events": "timestamp",
+    "entry_log": "timestamp",
+}
+GRANULARITIES = ("day", "month")
+HISTORY_PARTITION = "p_history"
+FUTURE_PARTITION = "p_future"
+LOCK_NAME = "zias:partitions"
+
+
+def to_days(day: date) -> int:
+    """MySQL TO_DAYS() of a date"""
+    return day.toordinal() + 365
+
+
+def from_days(days: int) -> date:
+    return date.fromordinal(days - 365)
+
+
+def period_start(day: date, granularity: str) -> date:
+    return day.replace(day=1) if granularity == "month" else day
+
+
+def next_period(day: date, granularity: str) -> date:
+    if granularity == "month":
+        return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def partition_name(start: date, granularity: str) -> str:
+    return f"p{start:%Y%m}" if granularity == "month" else f"p{start:%Y%m%d}"
+
+
+def parse_spec(spec: str) -> Dict[str, str]:
+    """Parse "sensor_data=day,entry_log=month" into {"sensor_data": "day", "entry_log": "month"}"""
+    result = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        result[name.strip()] = value.strip()
+    return result
+
+
+@dataclass
+class Partition:
+    name: str
+    upper: Optional[int]  # TO_DAYS bound (exclusive); None for MAXVALUE
+    rows: int
+
+
+def list_partitions(conn: Connection, table: str) -> List[Partition]:
+    """A table's partitions in bound order (empty if it is not partitioned)"""
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"table": table}).all()
+    return [
+        Partition(name, None if description == "MAXVALUE" else int(description), int(table_rows or 0))
+        for name, description, table_rows in rows
+    ]
+
+
+def partition_clause(name: str, upper: Optional[int]) -> str:
+    return f"PARTITION {name} VALUES LESS THAN ({'MAXVALUE' if upper is None else upper})"
+
+
+def periods(first: date, last: date, granularity: str) -> List[Tuple[str, int]]:
+    """(name, upper bound) of each period from the one holding first through the one holding last"""
+    result = []
+    start = period_start(first, granularity)
+    while start <= last:
+        end = next_period(start, granularity)
+        result.append((partition_name(start, granularity), to_days(end)))
+        start = end
+    return result
+
+
+def convert(conn: Connection, table: str, column: str, granularity: str, today: date,
+            ahead_days: int, retention_days: int):
+    """
+    Partition an unpartitioned table (rebuilds it; run once, off-peak)
+
+    Drops its foreign keys, makes (id, time column) the primary key and
+    the time column a NOT NULL DATETIME, then partitions from its oldest
+    retained period through today + ahead_days. Older rows go to a
+    history partition that the next purge drops.
+    """
+    if list_partitions(conn, table):
+        log.info("%s is already partitioned", table)
+        return
+
+    for (constraint,) in conn.execute(text(
+        "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND CONSTRAINT_TYPE = 'FOREIGN KEY'"
+    ), {"table": table}).all():
+        conn.execute(text(f"ALTER TABLE {table} DROP FOREIGN KEY {constraint}"))
+
+    conn.execute(text(f"UPDATE {table} SET {column} = CURRENT_TIMESTAMP WHERE {column} IS NULL"))
+    conn.execute(text(
+        f"ALTER TABLE {table} MODIFY {column} DATETIME NOT NULL, "
+        f"DROP PRIMARY KEY, ADD PRIMARY KEY (id, {column})"
+    ))
+
+    oldest = conn.execute(text(f"SELECT MIN({column}) FROM {table}")).scalar()
+    first = oldest.date() if oldest else today
+    if retention_days:
+        first = max(first, today - timedelta(days=retention_days))
+    first = min(first, today)
+
+    clauses = [partition_clause(HISTORY_PARTITION, to_days(period_start(first, granularity)))]
+    clauses += [partition_clause(name, upper)
+                for name, upper in periods(first, today + timedelta(days=ahead_days), granularity)]
+    clauses.append(partition_clause(FUTURE_PARTITION, None))
+    conn.execute(text(
+        f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS({column})) ({', '.join(clauses)})"
+    ))
+    log.info("Partitioned %s by %s (%d partitions)", table, granularity, len(clauses))
+
+
+def add_ahead(conn: Connection, table: str, partitions: List[Partition], granularity: str,
+              until: date) -> List[str]:
+    """
+    Create partitions through until by splitting the catch-all partition
+
+    The catch-all is empty while partitions are made far enough ahead,
+    so the split moves no rows.
+
+    Returns:
+        Names of the partitions created
+    """
+    bounded = [p.upper for p in partitions if p.upper is not None]
+    if not bounded or partitions[-1].upper is not None:
+        return []
+    start = from_days(max(bounded))
+    new = [(name, upper) for name, upper in periods(start, until, granularity) if upper > max(bounded)]
+    if not new:
+        return []
+
+    clauses = [partition_clause(name, upper) for name, upper in new]
+    clauses.append(partition_clause(partitions[-1].name, None))
+    conn.execute(text(
+        f"ALTER TABLE {table} REORGANIZE PARTITION {partitions[-1].name} INTO ({', '.join(clauses)})"
+    ))
+    return [name for name, _ in new]
+
+
+def purge(conn: Connection, table: str, partitions: List[Partition], cutoff: date,
+          archive: bool = False) -> List[str]:
+    """
+    Remove partitions holding only rows older than cutoff
+
+    With archive, each partition is first exchanged into its own
+    {table}_archive_{partition} table, which keeps its rows; the
+    exchange swaps table files rather than copying rows.
+
+    Returns:
+        Names of the partitions removed
+    """
+    bound = to_days(cutoff)
+    expired = [p for p in partitions if p.upper is not None and p.upper <= bound]
+    if len(expired) == len([p for p in partitions if p.upper is not None]):
+        expired = expired[:-1]  # A RANGE table needs at least one bounded partition left
+    if not expired:
+        return []
+
+    for partition in expired if archive else []:
+        archive_table = f"{table}_archive_{partition.name}"
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {archive_table} LIKE {table}"))
+        conn.execute(text(f"ALTER TABLE {archive_table} REMOVE PARTITIONING"))
+        conn.execute(text(f"ALTER TABLE {table} EXCHANGE PARTITION {partition.name} WITH TABLE {archive_table}"))
+    conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {', '.join(p.name for p in expired)}"))
+    return [p.name for p in expired]
+
+
+class PartitionManager:
+    """Adds partitions ahead and purges expired ones on a schedule"""
+
+    def __init__(self, engine: Engine, granularity: Dict[str, str], retention_days: Dict[str, int],
+                 ahead_days: int = 14, archive: bool = False, interval: float = 3600.0):
+        """
+        Args:
+            granularity: Table -> "day" or "month"; tables not listed are not managed
+            retention_days: Table -> days kept (missing or 0 keeps everything)
+            ahead_days: Partitions exist at least this far past today
+            archive: Exchange expired partitions into archive tables before dropping
+        """
+        for table, value in granularity.items():
+            if table not in PARTITIONED_TABLES or value not in GRANULARITIES:
+                raise ValueError(f"Invalid partition granularity: {table}={value}")
+        self.engine = engine
+        self.granularity = granularity
+        self.retention_days = retention_days
+        self.ahead_days = ahead_days
+        self.archive = archive
+        self.interval = interval
+        self._running = False
+
+    @property
+    def supported(self) -> bool:
+        return self.engine.dialect.name == "mysql"
+
+    def _locked(self, conn: Connection) -> bool:
+        """Serialize DDL across processes (one maintenance pass at a time)"""
+        return bool(conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": LOCK_NAME}).scalar())
+
+    def convert_all(self, today: Optional[date] = None):
+        today = today or datetime.now().date()
+        with self.engine.connect() as conn:
+            for table, granularity in self.granularity.items():
+                convert(conn, table, PARTITIONED_TABLES[table], granularity, today,
+                        self.ahead_days, self.retention_days.get(table, 0))
+                conn.commit()
+
+    def maintain(self, today: Optional[date] = None) -> Dict[str, dict]:
+        """
+        One maintenance pass over every managed table
+
+        Returns:
+            Table -> partitions added and removed
+        """
+        if not self.supported:
+            return {}
+        today = today or datetime.now().date()
+        result = {}
+        with self.engine.connect() as conn:
+            if not self._locked(conn):
+                log.info("Partition maintenance running elsewhere, skipping")
+                return {}
+            try:
+                for table, granularity in self.granularity.items():
+                    partitions = list_partitions(conn, table)
+                    if not partitions:
+                        log.warning("%s is not partitioned; run python -m api.partitions --convert", table)
+                        continue
+                    added = add_ahead(conn, table, partitions, granularity, today + timedelta(days=self.ahead_days))
+                    removed = []
+                    retention = self.retention_days.get(table, 0)
+                    if retention:
+                        removed = purge(conn, table, list_partitions(conn, table),
+                                        today - timedelta(days=retention), self.archive)
+                    if added or removed:
+                        log.info("Partitions of %s: added %s, removed %s", table, added, removed)
+                    result[table] = {"added": added, "removed": removed}
+            finally:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+        return result
+
+    async def run(self):
+        """Maintain every interval seconds"""
+        if not self.supported:
+            log.info("Partition manager idle on %s", self.engine.dialect.name)
+            return
+        self._running = True
+        while self._running:
+            try:
+                await asyncio.to_thread(self.maintain)
+            except Exception as e:
+                log.warning("Partition maintenance failed, will retry: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def stop(self):
+        self._running = False
+
+
+def partition_manager(engine: Engine) -> PartitionManager:
+    """A PartitionManager with the configured settings"""
+    from api.config import settings
+
+    return PartitionManager(
+        engine,
+        parse_spec(settings.PARTITION_GRANULARITY),
+        {table: int(days) for table, days in parse_spec(settings.PARTITION_RETENTION_DAYS).items()},
+        ahead_days=settings.PARTITION_AHEAD_DAYS,
+        archive=settings.PARTITION_ARCHIVE,
+        interval=settings.PARTITION_MAINTENANCE_SECONDS
+    )
+
+
+def main():
+    """CLI maintenance entry point"""
+    from api.database import engine
+
+    parser = argparse.ArgumentParser(description="Manage ZIAS time-range partitions")
+    parser.add_argument("--convert", action="store_true", help="Partition unpartitioned tables (rebuilds them)")
+    args = parser.parse_args()
+
+    manager = partition_manager(engine)
+    if not manager.supported:
+        print(f"Partitioning is MySQL only (database is {engine.dialect.name})", file=sys.stderr)
+        return
+    if args.convert:
+        manager.convert_all()
+    for table, changes in manager.maintain().items():
+        print(f"{table}: added {len(changes['added'])}, removed {len(changes['removed'])}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Daily presence bitmaps
+Population-wide questions ("absent on each of the last 5 days", "rate
+of this cohort this month", "who was in room X on date Y") are answered
+from presence sets kept in Redis instead of scanning entry_log.
+
+Students get dense ordinals. Dense sets are bitmaps indexed by ordinal:
+campus-wide per day, per day and time slot, and the students ever seen.
+Room sets are small, so they are Redis integer sets, which Redis keeps
+as compact sorted arrays. Each student also has a bitmap of the days
+they were present. Set algebra runs on the fetched bitmaps with NumPy.
+
+The index follows entry_log by row ID (the processor catches up every
+PRESENCE_SYNC_SECONDS) and can be rebuilt from history.
+
+CLI usage:
+    python -m api.presence --rebuild
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import redis.asyncio as redis
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from api.db_models import EntryLog, Student
+from api.log import get_logger
+
+log = get_logger("api.presence")
+
+KEY_PREFIX = "zias:presence"
+ORDINALS_KEY = f"{KEY_PREFIX}:ordinals"        # student_id -> ordinal
+STUDENT_IDS_KEY = f"{KEY_PREFIX}:student_ids"  # ordinal -> student_id
+NEXT_ORDINAL_KEY = f"{KEY_PREFIX}:next"
+ENROLLED_KEY = f"{KEY_PREFIX}:enrolled"        # Bitmap of every assigned ordinal
+POSITION_KEY = f"{KEY_PREFIX}:position"        # Last entry_log ID applied
+
+EPOCH = date(2020, 1, 1)  # Bit 0 of the per-student day bitmaps
+PRESENCE_MODES = ("any", "all", "none")
+
+# KEYS[1] ordinals hash, KEYS[2] student IDs hash, KEYS[3] counter, KEYS[4] enrolled bitmap
+# ARGV    student IDs
+# Returns the ordinal of each student ID, assigning the next free one to new students
+ORDINAL_SCRIPT = """
+local ordinals = {}
+for i, student_id in ipairs(ARGV) do
+    local ordinal = redis.call('HGET', KEYS[1], student_id)
+    if not ordinal then
+        ordinal = redis.call('INCR', KEYS[3]) - 1
+        redis.call('HSET', KEYS[1], student_id, ordinal)
+        redis.call('HSET', KEYS[2], ordinal, student_id)
+        redis.call('SETBIT', KEYS[4], ordinal, 1)
+    end
+    ordinals[i] = tonumber(ordinal)
+end
+return ordinals
+"""
+
+
+def day_key(day: date) -> str:
+    return f"{KEY_PREFIX}:day:{day:%Y%m%d}"
+
+
+def slot_key(day: date, slot: int) -> str:
+    return f"{KEY_PREFIX}:slot:{day:%Y%m%d}:{slot}"
+
+
+def room_key(room: str, day: date) -> str:
+    return f"{KEY_PREFIX}:room:{room}:{day:%Y%m%d}"
+
+
+def student_key(ordinal: int) -> str:
+    return f"{KEY_PREFIX}:student:{ordinal}"
+
+
+def day_index(day: date) -> int:
+    return day.toordinal() - EPOCH.toordinal()
+
+
+def date_range(date_from: date, date_to: date, school_days_only: bool = False) -> List[date]:
+    days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    return [day for day in days if not school_days_only or day.weekday() < 5]
+
+
+class PresenceIndex:
+    """Presence sets in Redis, maintained from entry_log and queried with NumPy"""
+
+    def __init__(self, client: redis.Redis, slot_minutes: int = 60, retention_days: int = 400,
+                 batch_size: int = 10000, rescan_rows: int = 1000):
+        """
+        Args:
+            client: Redis client returning bytes (not decoded)
+            slot_minutes: Length of a day slot
+            retention_days: Day, slot and room sets expire this long after their day
+            batch_size: entry_log rows per catch-up query
+            rescan_rows: Rows behind the position read again on each catch-up,
+                so rows committed out of ID order are still seen
+        """
+        self.client = client
+        self.slot_minutes = slot_minutes
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.rescan_rows = rescan_rows
+        self._assign = client.register_script(ORDINAL_SCRIPT)
+        self._ordinals: Dict[str, int] = {}  # Ordinals never change, so they are cached for good
+
+    async def ordinals(self, student_ids: Iterable[str]) -> Dict[str, int]:
+        """Ordinal of each student ID, assigned on first sight"""
+        missing = sorted({s for s in student_ids if s not in self._ordinals})
+        if missing:
+            assigned = await self._assign(
+                keys=[ORDINALS_KEY, STUDENT_IDS_KEY, NEXT_ORDINAL_KEY, ENROLLED_KEY],
+                args=missing
+            )
+            self._ordinals.update(zip(missing, assigned))
+        return self._ordinals
+
+    async def mark(self, rows: Sequence[tuple]):
+        """
+        Record presence for (student_id, room, timestamp) rows
+
+        Every write is idempotent, so rows may be applied more than once.
+        """
+        if not rows:
+            return
+        ordinals = await self.ordinals(row[0] for row in rows)
+
+        pipe = self.client.pipeline(transaction=False)
+        expiring = set()
+        for student_id, room, timestamp in rows:
+            ordinal = ordinals[student_id]
+            day = timestamp.date()
+            slot = (timestamp.hour * 60 + timestamp.minute) // self.slot_minutes
+            pipe.setbit(day_key(day), ordinal, 1)
+            pipe.setbit(slot_key(day, slot), ordinal, 1)
+            pipe.setbit(student_key(ordinal), day_index(day), 1)
+            if room:
+                pipe.sadd(room_key(room, day), ordinal)
+                expiring.add((room_key(room, day), day))
+            expiring.add((day_key(day), day))
+            expiring.add((slot_key(day, slot), day))
+
+        for key, day in expiring:
+            expires = datetime.combine(day + timedelta(days=self.retention_days), datetime.min.time())
+            pipe.expireat(key, expires)
+        await pipe.execute()
+
+    def _fetch(self, db: Session, after: int) -> list:
+        """Next batch of (id, student_id, room, timestamp) rows after an entry_log ID; blocking"""
+        return db.execute(
+            select(EntryLog.id, Student.student_id, EntryLog.room_value, EntryLog.timestamp)
+            .join(Student, EntryLog.RFID == Student.RFID)
+            .where(EntryLog.id > after)
+            .order_by(EntryLog.id)
+            .limit(self.batch_size)
+        ).all()
+
+    async def catch_up(self, db: Session) -> int:
+        """
+        Apply entry_log rows added since the last catch-up
+
+        Returns:
+            Rows applied, rescanned rows included
+        """
+        position = int(await self.client.get(POSITION_KEY) or 0)
+        after = max(0, position - self.rescan_rows)
+        applied = 0
+        while True:
+            # Queries run in a thread so the caller's event loop keeps serving events
+            rows = await asyncio.to_thread(self._fetch, db, after)
+            if not rows:
+                break
+            await self.mark([(student_id, room, timestamp) for _, student_id, room, timestamp in rows
+                             if timestamp is not None])
+            after = rows[-1].id
+            applied += len(rows)
+            if after > position:
+                position = after
+                await self.client.set(POSITION_KEY, position)
+            if len(rows) < self.batch_size:
+                break
+        return applied
+
+    async def rebuild(self, db: Session) -> int:
+        """Drop every presence set and apply all of entry_log again (ordinals are kept)"""
+        keep = {ORDINALS_KEY, STUDENT_IDS_KEY, NEXT_ORDINAL_KEY, ENROLLED_KEY}
+        batch = []
+        async for key in self.client.scan_iter(match=f"{KEY_PREFIX}:*", count=1000):
+            if key.decode() not in keep:
+                batch.append(key)
+            if len(batch) >= 1000:
+                await self.client.delete(*batch)
+                batch = []
+        if batch:
+            await self.client.delete(*batch)
+        return await self.catch_up(db)
+
+    async def _width(self) -> int:
+        """Bytes a bitmap needs to hold every assigned ordinal"""
+        return (int(await self.client.get(NEXT_ORDINAL_KEY) or 0) + 7) // 8
+
+    async def _bitmaps(self, keys: List[str], width: int) -> np.ndarray:
+        """Bitmaps of keys as a (len(keys), width) uint8 array; missing keys are empty"""
+        result = np.zeros((len(keys), width), dtype=np.uint8)
+        if keys:
+            for i, value in enumerate(await self.client.mget(keys)):
+                if value:
+                    row = np.frombuffer(value, dtype=np.uint8)[:width]
+                    result[i, :len(row)] = row
+        return result
+
+    async def _room_bitmaps(self, room: str, days: List[date], width: int) -> np.ndarray:
+        """Room sets of days, expanded to bitmaps"""
+        pipe = self.client.pipeline(transaction=False)
+        for day in days:
+            pipe.smembers(room_key(room, day))
+        bits = np.zeros((len(days), width * 8), dtype=np.uint8)
+        for i, members in enumerate(await pipe.execute()):
+            if members:
+                bits[i, np.fromiter((int(m) for m in members), dtype=np.int64)] = 1
+        return np.packbits(bits, axis=1)
+
+    async def day_bitmaps(self, days: List[date], room: Optional[str] = None,
+                          slot: Optional[int] = None, width: Optional[int] = None) -> np.ndarray:
+        """Presence bitmap per day, campus-wide, for one slot or for one room"""
+        width = width if width is not None else await self._width()
+        if room:
+            return await self._room_bitmaps(room, days, width)
+        if slot is not None:
+            return await self._bitmaps([slot_key(day, slot) for day in days], width)
+        return await self._bitmaps([day_key(day) for day in days], width)
+
+    async def enrolled(self, width: Optional[int] = None) -> np.ndarray:
+        width = width if width is not None else await self._width()
+        return (await self._bitmaps([ENROLLED_KEY], width))[0]
+
+    async def cohort(self, student_ids: Sequence[str]) -> np.ndarray:
+        """Bitmap of the given students (only those ever seen)"""
+        width = await self._width()
+        ordinals = await self.client.hmget(ORDINALS_KEY, list(student_ids)) if student_ids else []
+        bits = np.zeros(width * 8, dtype=np.uint8)
+        known = [int(o) for o in ordinals if o is not None]
+        bits[known] = 1
+        return np.packbits(bits)
+
+    async def student_ids(self, bitmap: np.ndarray) -> List[str]:
+        """Student IDs of the set bits of a bitmap"""
+        ordinals = np.flatnonzero(np.unpackbits(bitmap)).tolist()
+        if not ordinals:
+            return []
+        ids = await self.client.hmget(STUDENT_IDS_KEY, ordinals)
+        return sorted(i.decode() for i in ids if i is not None)
+
+    async def students(self, days: List[date], mode: str = "any", room: Optional[str] = None,
+                       slot: Optional[int] = None) -> np.ndarray:
+        """
+        Students present on any or all of days, or on none of them
+
+        "none" is relative to every student ever seen, so students who
+        never tapped in are not reported absent.
+        """
+        width = await self._width()
+        bitmaps = await self.day_bitmaps(days, room=room, slot=slot, width=width)
+        if not days:
+            return np.zeros(width, dtype=np.uint8)
+        if mode == "all":
+            return np.bitwise_and.reduce(bitmaps, axis=0)
+        present = np.bitwise_or.reduce(bitmaps, axis=0)
+        if mode == "none":
+            return await self.enrolled(width) & ~present
+        return present
+
+    async def rate(self, days: List[date], cohort: np.ndarray, room: Optional[str] = None) -> dict:
+        """Present count and rate per day for a cohort bitmap"""
+        size = int(np.unpackbits(cohort).sum())
+        bitmaps = await self.day_bitmaps(days, room=room, width=len(cohort))
+        present = np.unpackbits(bitmaps & cohort, axis=1).sum(axis=1)
+        per_day = [
+            {"date": day, "present": int(count), "rate": round(int(count) / size, 4) if size else 0.0}
+            for day, count in zip(days, present)
+        ]
+        total = int(present.sum())
+        return {
+            "cohort_size": size,
+            "rate": round(total / (size * len(days)), 4) if size and days else 0.0,
+            "days": per_day
+        }
+
+    async def student_days(self, student_id: str, date_from: date, date_to: date) -> List[date]:
+        """Days in [date_from, date_to] a student was present"""
+        ordinal = await self.client.hget(ORDINALS_KEY, student_id)
+        if ordinal is None:
+            return []
+        first, last = day_index(date_from), day_index(date_to)
+        if last < 0:
+            return []
+        first = max(first, 0)
+        value = await self.client.getrange(student_key(int(ordinal)), first // 8, last // 8)
+        bits = np.unpackbits(np.frombuffer(value, dtype=np.uint8))
+        indexes = np.flatnonzero(bits) + (first // 8) * 8
+        indexes = indexes[(indexes >= first) & (indexes <= last)]
+        return [EPOCH + timedelta(days=int(i)) for i in indexes]
+
+
+def presence_index(client: redis.Redis) -> PresenceIndex:
+    """A PresenceIndex with the configured settings"""
+    from api.config import settings
+
+    return PresenceIndex(
+        client,
+        slot_minutes=settings.PRESENCE_SLOT_MINUTES,
+        retention_days=settings.PRESENCE_RETENTION_DAYS,
+        batch_size=settings.PRESENCE_BATCH_SIZE,
+        rescan_rows=settings.PRESENCE_RESCAN_ROWS
+    )
+
+
+async def _run(rebuild: bool):
+    from api.config import settings
+    from api.database import get_read_db_session
+
+    client = redis.from_url(settings.REDIS_URL)
+    index = presence_index(client)
+    try:
+        with get_read_db_session(primary=True) as db:
+            applied = await (index.rebuild(db) if rebuild else index.catch_up(db))
+    finally:
+        await client.close()
+    print(f"Applied {applied} entry_log rows", file=sys.stderr)
+
+
+def main():
+    """CLI rebuild entry point"""
+    parser = argparse.ArgumentParser(description="Maintain ZIAS presence bitmaps")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the presence sets and rebuild from entry_log")
+    args = parser.parse_args()
+    asyncio.run(_run(args.rebuild))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Shared Redis client for API workers
+Also carries reload notifications for in-memory indexes held by the
+event processor
+"""
+
+import json
+import redis.asyncio as redis
+
+from api.config import settings
+from api.log import get_logger
+
+RELOAD_CHANNEL = "zias:reload"
+
+log = get_logger("api.redis")
+
+_client = None
+_binary_client = None
+
+
+def get_redis() -> redis.Redis:
+    """Get the process-wide Redis client, created on first use"""
+    global _client
+    if _client is None:
+        _client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def get_binary_redis() -> redis.Redis:
+    """Get the process-wide Redis client for binary values (bitmaps), created on first use"""
+    global _binary_client
+    if _binary_client is None:
+        _binary_client = redis.from_url(settings.REDIS_URL)
+    return _binary_client
+
+
+async def publish_reload(target: str):
+    """
+    Ask listeners to rebuild an in-memory index
+
+    Args:
+        target: Index name, e.g. "geofence"
+    """
+    try:
+        await get_redis().publish(RELOAD_CHANNEL, json.dumps({"target": target}))
+    except Exception as e:
+        log.warning("Failed to publish reload for %s: %s", target, e)
+
+
+async def close_redis():
+    """Close the process-wide clients that were ever created"""
+    global _client, _binary_client
+    if _client is not None:
+        await _client.close()
+        _client = None
+    if _binary_client is not None:
+        await _binary_client.close()
+        _binary_client = None
@@ -0,0 +1,267 @@
+"""
+Bulk attendance report engine
+Streams entry_log for a date range into columnar NumPy arrays and
+computes per-student, per-room and per-day aggregates with vectorized
+group operations instead of per-student queries.
+
+CLI usage:
+    python -m api.reports --from 2026-01-05 --to 2026-04-30 --section students -o term.csv
+"""
+
+import argparse
+import csv
+import json
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from api.config import settings
+from api.db_models import EntryLog, Student
+
+REPORT_SECTIONS = ("students", "rooms", "days")
+
+
+@dataclass
+class EntryLogColumns:
+    """Columnar view of entry_log rows for a date range"""
+    student: np.ndarray    # int32 codes into rfids
+    room: np.ndarray       # int32 codes into rooms
+    status: np.ndarray     # int8, 1=entry, -1=exit
+    timestamp: np.ndarray  # int64 epoch seconds (UTC)
+    rfids: List[str]
+    rooms: List[str]
+    start: datetime
+    end: datetime
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+
+def _epoch_seconds(values) -> np.ndarray:
+    return np.array(values, dtype="datetime64[us]").astype("datetime64[s]").astype(np.int64)
+
+
+def fetch_entry_log_columns(db: Session, date_from: date, date_to: date) -> EntryLogColumns:
+    """
+    Fetch entry_log rows for [date_from, date_to] with one streaming query
+
+    Rows are pulled in batches from a server-side cursor and appended as
+    NumPy chunks; RFIDs and rooms are dictionary-encoded to int32 codes.
+    """
+    start = datetime.combine(date_from, datetime.min.time())
+    end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+
+    query = select(
+        EntryLog.RFID,
+        EntryLog.room_value,
+        EntryLog.status,
+        EntryLog.timestamp
+    ).where(
+        EntryLog.timestamp >= start,
+        EntryLog.timestamp < end
+    ).execution_options(yield_per=settings.REPORT_FETCH_BATCH_SIZE)
+
+    rfid_codes: Dict[str, int] = {}
+    room_codes: Dict[str, int] = {}
+    students, rooms, statuses, timestamps = [], [], [], []
+
+    for chunk in db.execute(query).partitions():
+        chunk_rfids, chunk_rooms, chunk_status, chunk_ts = zip(*chunk)
+        students.append(np.fromiter(
+            (rfid_codes.setdefault(r, len(rfid_codes)) for r in chunk_rfids),
+            dtype=np.int32, count=len(chunk)
+        ))
+        rooms.append(np.fromiter(
+            (room_codes.setdefault(r or "unknown", len(room_codes)) for r in chunk_rooms),
+            dtype=np.int32, count=len(chunk)
+        ))
+        statuses.append(np.array(chunk_status, dtype=np.int8))
+        timestamps.append(_epoch_seconds(chunk_ts))
+
+    def concat(parts, dtype):
+        return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    return EntryLogColumns(
+        student=concat(students, np.int32),
+        room=concat(rooms, np.int32),
+        status=concat(statuses, np.int8),
+        timestamp=concat(timestamps, np.int64),
+        rfids=list(rfid_codes),
+        rooms=list(room_codes),
+        start=start,
+        end=end
+    )
+
+
+def compute_report(cols: EntryLogColumns, students: Dict[str, tuple]) -> Dict[str, Any]:
+    """
+    Compute presence, hours and counts per student, room and day
+
+    Hours are the sum of entry -> exit pairs by the same student in the
+    same room, capped at REPORT_MAX_SESSION_HOURS. Pair hours count
+    towards the day and room of the entry.
+
+    Args:
+        cols: Columnar entry_log data
+        students: RFID -> (student_id, stud_name)
+    """
+    n_students = len(cols.rfids)
+    n_rooms = len(cols.rooms)
+    n_days = (cols.end - cols.start).days
+    start_epoch = int(_epoch_seconds([cols.start])[0])
+
+    # Sort by student, then time, so pairs are adjacent rows
+    order = np.lexsort((cols.timestamp, cols.student))
+    stud = cols.student[order]
+    room = cols.room[order]
+    status = cols.status[order]
+    ts = cols.timestamp[order]
+    day = ((ts - start_epoch) // 86400).astype(np.int64)
+
+    is_entry = status == 1
+    is_exit = status == -1
+
+    duration = np.diff(ts)
+    paired = (
+        (stud[:-1] == stud[1:])
+        & (room[:-1] == room[1:])
+        & is_entry[:-1]
+        & is_exit[1:]
+        & (duration <= settings.REPORT_MAX_SESSION_HOURS * 3600)
+    )
+    pair_idx = np.flatnonzero(paired)
+    pair_hours = duration[pair_idx] / 3600.0
+
+    entry_stud = stud[is_entry].astype(np.int64)
+    entry_room = room[is_entry].astype(np.int64)
+    entry_day = day[is_entry]
+
+    # Distinct (student, day) and (room, student) presence pairs
+    student_days = np.unique(entry_stud * n_days + entry_day)
+    room_students = np.unique(entry_room * max(n_students, 1) + entry_stud)
+
+    student_entries = np.bincount(entry_stud, minlength=n_students)
+    student_exits = np.bincount(stud[is_exit], minlength=n_students)
+    student_hours = np.bincount(stud[pair_idx], weights=pair_hours, minlength=n_students)
+    student_days_present = np.bincount(student_days // n_days, minlength=n_students)
+
+    room_entries = np.bincount(entry_room, minlength=n_rooms)
+    room_exits = np.bincount(room[is_exit], minlength=n_rooms)
+    room_hours = np.bincount(room[pair_idx], weights=pair_hours, minlength=n_rooms)
+    room_unique = np.bincount(room_students // max(n_students, 1), minlength=n_rooms)
+
+    day_entries = np.bincount(entry_day, minlength=n_days)
+    day_exits = np.bincount(day[is_exit], minlength=n_days)
+    day_hours = np.bincount(day[pair_idx], weights=pair_hours, minlength=n_days)
+    day_present = np.bincount(student_days % n_days, minlength=n_days)
+
+    student_rows = []
+    for code, rfid in enumerate(cols.rfids):
+        student_id, name = students.get(rfid, ("", "Unknown"))
+        days_present = int(student_days_present[code])
+        hours = float(student_hours[code])
+        student_rows.append({
+            "student_id": student_id,
+            "student_name": name,
+            "rfid": rfid,
+            "days_present": days_present,
+            "total_entries": int(student_entries[code]),
+            "total_exits": int(student_exits[code]),
+            "total_hours": round(hours, 2),
+            "average_hours_per_day": round(hours / days_present, 2) if days_present else 0
+        })
+
+    room_rows = [
+        {
+            "room": name,
+            "unique_students": int(room_unique[code]),
+            "total_entries": int(room_entries[code]),
+            "total_exits": int(room_exits[code]),
+            "total_hours": round(float(room_hours[code]), 2)
+        }
+        for code, name in enumerate(cols.rooms)
+    ]
+
+    day_rows = [
+        {
+            "date": (cols.start.date() + timedelta(days=i)).isoformat(),
+            "students_present": int(day_present[i]),
+            "total_entries": int(day_entries[i]),
+            "total_exits": int(day_exits[i]),
+            "total_hours": round(float(day_hours[i]), 2)
+        }
+        for i in range(n_days)
+    ]
+
+    return {
+        "date_from": cols.start.date().isoformat(),
+        "date_to": (cols.end.date() - timedelta(days=1)).isoformat(),
+        "total_events": len(cols),
+        "students": student_rows,
+        "rooms": room_rows,
+        "days": day_rows
+    }
+
+
+def build_report(db: Session, date_from: date, date_to: date) -> Dict[str, Any]:
+    """Fetch entry_log for the range and compute the full report"""
+    cols = fetch_entry_log_columns(db, date_from, date_to)
+    students = {
+        rfid: (student_id, name)
+        for rfid, student_id, name in db.execute(
+            select(Student.RFID, Student.student_id, Student.stud_name)
+            .where(Student.RFID.isnot(None))
+        )
+    }
+    return compute_report(cols, students)
+
+
+def write_report(report: Dict[str, Any], section: str, fmt: str, out):
+    """Write one report section as CSV, or the full report as JSON"""
+    if fmt == "json":
+        json.dump(report, out, indent=2)
+        out.write("\n")
+        return
+
+    rows = report[section]
+    if not rows:
+        return
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def main():
+    """CLI export entry point"""
+    from api.database import get_read_db_session
+
+    parser = argparse.ArgumentParser(description="Export ZIAS attendance report")
+    parser.add_argument("--from", dest="date_from", required=True, type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", required=True, type=date.fromisoformat)
+    parser.add_argument("--section", choices=REPORT_SECTIONS, default="students")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    if args.date_to < args.date_from:
+        parser.error("--to must not be before --from")
+
+    with get_read_db_session() as db:
+        report = build_report(db, args.date_from, args.date_to)
+
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            write_report(report, args.section, args.format, out)
+        print(f"Wrote {args.section} report ({report['total_events']} events) to {args.output}",
+              file=sys.stderr)
+    else:
+        write_report(report, args.section, args.format, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
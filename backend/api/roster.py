@@ -0,0 +1,256 @@
+"""
+Timetable roster reconciliation
+Each timetable session is reconciled once per occurrence, as soon as it
+closes. Due occurrences are first claimed as session_occurrences rows
+holding their time windows; then one INSERT ... SELECT joins the rosters
+of every claimed occurrence against the entry_log rows of its room and
+window and writes a present, late or absent row per rostered student.
+However many sessions end at the same bell, that is a fixed handful of
+statements.
+
+Timetable times are campus wall time (CAMPUS_TIMEZONE). Occurrence
+windows are converted to naive UTC, like entry_log timestamps, before
+they are claimed; session dates stay campus dates.
+
+A student counts as present if they entered by the late mark, or were
+already in the room when the session started (their first row in the
+window is an exit at or after the start). They are late if their first
+entry came after the late mark, and absent if they left no rows.
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import and_, case, func, insert, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.db_models import (
+    EntryLog, RosterEntry, SessionAttendance, SessionAttendanceEnum, SessionOccurrence, Student, TimetableSession
+)
+from api.log import get_logger
+
+log = get_logger("api.roster")
+
+
+def to_utc(local: datetime, campus: tzinfo) -> datetime:
+    """Naive campus wall time to naive UTC"""
+    return local.replace(tzinfo=campus).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_campus(utc: datetime, campus: tzinfo) -> datetime:
+    """Naive UTC to naive campus wall time"""
+    return utc.replace(tzinfo=timezone.utc).astimezone(campus).replace(tzinfo=None)
+
+
+def due_occurrences(db: Session, now: datetime, settle_seconds: float, catch_up_days: int,
+                    early_minutes: int, campus: tzinfo = timezone.utc) -> List[dict]:
+    """
+    session_occurrences rows for sessions that closed by now - settle_seconds and are not yet claimed
+
+    now is naive UTC; weekdays and the "closed yet" test use campus
+    wall time, and the returned windows are naive UTC. Days back to
+    now - catch_up_days are included, so sessions missed while the
+    scheduler was down are reconciled when it returns.
+    """
+    cutoff = to_campus(now - timedelta(seconds=settle_seconds), campus)
+    due = []
+    for offset in range(catch_up_days, -1, -1):
+        day = cutoff.date() - timedelta(days=offset)
+        query = select(TimetableSession).where(
+            TimetableSession.weekday == day.weekday(),
+            or_(TimetableSession.valid_from.is_(None), TimetableSession.valid_from <= day),
+            or_(TimetableSession.valid_to.is_(None), TimetableSession.valid_to >= day),
+            ~select(SessionOccurrence.session_id).where(
+                SessionOccurrence.session_id == TimetableSession.id,
+                SessionOccurrence.session_date == day
+            ).exists()
+        )
+        if day == cutoff.date():
+            query = query.where(TimetableSession.ends_at <= cutoff.time())
+
+        for session in db.scalars(query):
+            starts_at = datetime.combine(day, session.starts_at)
+            due.append({
+                "session_id": session.id,
+                "session_date": day,
+                "room_value": session.room_value,
+                "window_start": to_utc(starts_at - timedelta(minutes=early_minutes), campus),
+                "starts_at": to_utc(starts_at, campus),
+                "late_at": to_utc(starts_at + timedelta(minutes=session.late_after_minutes), campus),
+                "ends_at": to_utc(datetime.combine(day, session.ends_at), campus)
+            })
+    return due
+
+
+def reconcile_claimed(db: Session) -> int:
+    """
+    Write session_attendance for every claimed, unreconciled occurrence in one statement
+
+    Returns:
+        Rows written
+    """
+    pending = select(SessionOccurrence).where(SessionOccurrence.reconciled_at.is_(None)).subquery("pending")
+
+    # First entry and first exit per (occurrence, student) in the room during the window
+    seen = (
+        select(
+            pending.c.session_id,
+            pending.c.session_date,
+            Student.student_id,
+            func.min(case((EntryLog.status == 1, EntryLog.timestamp))).label("first_entry"),
+            func.min(case((EntryLog.status == -1, EntryLog.timestamp))).label("first_exit")
+        )
+        .select_from(pending)
+        .join(EntryLog, and_(
+            EntryLog.room_value == pending.c.room_value,
+            EntryLog.timestamp >= pending.c.window_start,
+            EntryLog.timestamp < pending.c.ends_at
+        ))
+        .join(Student, Student.RFID == EntryLog.RFID)
+        .group_by(pending.c.session_id, pending.c.session_date, Student.student_id)
+        .subquery("seen")
+    )
+
+    already_in = and_(
+        seen.c.first_exit >= pending.c.starts_at,
+        or_(seen.c.first_entry.is_(None), seen.c.first_exit < seen.c.first_entry)
+    )
+    status = case(
+        (or_(seen.c.first_entry <= pending.c.late_at, already_in), literal(SessionAttendanceEnum.PRESENT.name)),
+        (seen.c.first_entry.isnot(None), literal(SessionAttendanceEnum.LATE.name)),
+        else_=literal(SessionAttendanceEnum.ABSENT.name)
+    )
+
+    rows = (
+        select(pending.c.session_id, pending.c.session_date, RosterEntry.student_id, status, seen.c.first_entry)
+        .select_from(pending)
+        .join(RosterEntry, RosterEntry.session_id == pending.c.session_id)
+        .outerjoin(seen, and_(
+            seen.c.session_id == pending.c.session_id,
+            seen.c.session_date == pending.c.session_date,
+            seen.c.student_id == RosterEntry.student_id
+        ))
+    )
+    result = db.execute(insert(SessionAttendance).from_select(
+        ["session_id", "session_date", "student_id", "status", "first_entry"], rows
+    ))
+    return result.rowcount
+
+
+def close_claimed(db: Session, now: datetime) -> List[dict]:
+    """Mark claimed occurrences reconciled, with their present/late/absent counts"""
+    claimed = db.execute(
+        select(SessionOccurrence.session_id, SessionOccurrence.session_date)
+        .where(SessionOccurrence.reconciled_at.is_(None))
+    ).all()
+    if not claimed:
+        return []
+
+    pending = select(SessionOccurrence.session_id, SessionOccurrence.session_date).where(
+        SessionOccurrence.reconciled_at.is_(None)
+    ).subquery()
+    counts: Dict[tuple, Dict[str, int]] = {}
+    for session_id, session_date, status, count in db.execute(
+        select(SessionAttendance.session_id, SessionAttendance.session_date, SessionAttendance.status, func.count())
+        .join(pending, and_(
+            pending.c.session_id == SessionAttendance.session_id,
+            pending.c.session_date == SessionAttendance.session_date
+        ))
+        .group_by(SessionAttendance.session_id, SessionAttendance.session_date, SessionAttendance.status)
+    ):
+        counts.setdefault((session_id, session_date), {})[status.value] = count
+
+    closed = []
+    for session_id, session_date in claimed:
+        tally = counts.get((session_id, session_date), {})
+        closed.append({
+            "session_id": session_id,
+            "session_date": session_date,
+            "reconciled_at": now,
+            "present": tally.get("present", 0),
+            "late": tally.get("late", 0),
+            "absent": tally.get("absent", 0)
+        })
+    db.execute(update(SessionOccurrence), closed)
+    return closed
+
+
+def reconcile_due(db: Session, now: Optional[datetime] = None, settle_seconds: float = 10.0,
+                  catch_up_days: int = 1, early_minutes: int = 15, campus: tzinfo = timezone.utc) -> int:
+    """
+    Claim and reconcile every occurrence that has closed (by now, naive UTC), in one transaction
+
+    A claim that collides with another scheduler's rolls back; the
+    other scheduler reconciles those occurrences.
+
+    Returns:
+        Occurrences reconciled
+    """
+    now = now or datetime.utcnow()
+    due = due_occurrences(db, now, settle_seconds, catch_up_days, early_minutes, campus)
+    try:
+        if due:
+            db.execute(insert(SessionOccurrence), due)
+        written = reconcile_claimed(db)
+        closed = close_claimed(db, now)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        log.info("Occurrences claimed by another scheduler, skipping this round")
+        return 0
+
+    if closed:
+        log.info("Reconciled %d sessions (%d roster rows)", len(closed), written, extra={
+            "present": sum(c["present"] for c in closed),
+            "late": sum(c["late"] for c in closed),
+            "absent": sum(c["absent"] for c in closed)
+        })
+    return len(closed)
+
+
+def reopen(db: Session, session_id: int, session_date: date):
+    """Drop an occurrence's results; it stays claimed, so the next round reconciles it again (after a roster fix)"""
+    db.query(SessionAttendance).filter(
+        SessionAttendance.session_id == session_id,
+        SessionAttendance.session_date == session_date
+    ).delete(synchronize_session=False)
+    db.query(SessionOccurrence).filter(
+        SessionOccurrence.session_id == session_id,
+        SessionOccurrence.session_date == session_date
+    ).update({"reconciled_at": None, "present": 0, "late": 0, "absent": 0}, synchronize_session=False)
+    db.commit()
+
+
+class RosterScheduler:
+    """Reconciles closed sessions every interval seconds"""
+
+    def __init__(self, interval: float = 5.0, settle_seconds: float = 10.0, catch_up_days: int = 1,
+                 early_minutes: int = 15, campus_timezone: str = "UTC"):
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.catch_up_days = catch_up_days
+        self.early_minutes = early_minutes
+        self.campus = ZoneInfo(campus_timezone)
+        self._running = False
+
+    def reconcile(self) -> int:
+        from api.database import get_db_session
+
+        with get_db_session() as db:
+            return reconcile_due(db, settle_seconds=self.settle_seconds, catch_up_days=self.catch_up_days,
+                                 early_minutes=self.early_minutes, campus=self.campus)
+
+    async def run(self):
+        self._running = True
+        while self._running:
+            try:
+                await asyncio.to_thread(self.reconcile)
+            except Exception as e:
+                log.warning("Roster reconciliation failed, will retry: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def stop(self):
+        self._running = False
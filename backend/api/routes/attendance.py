@@ -1,29 +1,64 @@
 """Complete attendance API routes"""
-from fastapi import APIRouter, Depends, HTTPException, Query
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
 
+from api.config import settings
+from api.log import get_logger
 from api.models import AttendanceRecord, AttendanceEvent
 from api.auth import get_current_user
-from api.database import get_db
+from api.database import get_db, get_read_db
 from api.db_models import EntryLog, Student, AttendanceSummary
+from api.occupancy import occupancy_at
+from api.occupancy_series import RESOLUTIONS, occupancy_series
+from api.redis_client import get_binary_redis, get_redis
+from api.serialization import rows_response
+from mqtt.dedup import claim_event, release_claim, settle_claim
 
 router = APIRouter()
+log = get_logger("api.attendance")
+
+ATTENDANCE_RECORD_FIELDS = tuple(AttendanceRecord.model_fields)
+
+# Without a date_from, newest records are looked for in these trailing windows
+# (ending now, or at date_to) first, so the query only touches the latest
+# partitions of entry_log it can return rows from
+RECENT_WINDOWS_DAYS = (1, 7, 31)
 
 
 @router.post("/event", status_code=201)
 async def log_attendance_event(
     event: AttendanceEvent,
+    response: Response,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Log attendance event (used by mobile app)"""
+    """Log attendance event (used by mobile app); retries carrying the same event_id are recorded once"""
     student = db.query(Student).filter(Student.student_id == event.student_id).first()
     
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
+    # Without Redis the event is recorded unchecked rather than refused
+    claim = None
+    if event.event_id:
+        identity = f"api:{event.event_id}"
+        try:
+            claimed, previous = await claim_event(get_redis(), identity, settings.DEDUP_HORIZON_SECONDS)
+            if not claimed:
+                response.status_code = 200
+                return {
+                    "status": "duplicate",
+                    "event_id": int(previous) if previous else None,
+                    "student_id": event.student_id,
+                    "timestamp": None
+                }
+            claim = identity
+        except Exception as e:
+            log.warning("Dedup check unavailable, recording event %s unchecked: %s", event.event_id, e)
+    
     status = 1 if event.event_type.value == "entry" else -1
     
     entry_log = EntryLog(
@@ -34,8 +69,19 @@ async def log_attendance_event(
         confidence=event.confidence,
         source=event.source.value
     )
-    db.add(entry_log)
-    db.commit()
+    try:
+        db.add(entry_log)
+        db.commit()
+    except Exception:
+        if claim:
+            await release_claim(get_redis(), claim)
+        raise
+    
+    if claim:
+        try:
+            await settle_claim(get_redis(), claim, str(entry_log.id))
+        except Exception as e:
+            log.warning("Could not settle dedup claim %s: %s", claim, e)
     
     return {
         "status": "recorded",
@@ -53,10 +99,18 @@ async def get_attendance_records(
     date_to: Optional[date] = None,
     limit: int = Query(100, le=1000),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get attendance records with filters"""
-    query = db.query(EntryLog).join(Student, EntryLog.RFID == Student.RFID)
+    query = db.query(
+        EntryLog.id,
+        Student.student_id,
+        EntryLog.student_name,
+        EntryLog.room_value,
+        EntryLog.status,
+        EntryLog.timestamp,
+        EntryLog.confidence
+    ).join(Student, EntryLog.RFID == Student.RFID)
     
     if student_id:
         query = query.filter(Student.student_id == student_id)
@@ -67,23 +121,36 @@ async def get_attendance_records(
     if date_to:
         query = query.filter(EntryLog.timestamp <= date_to + timedelta(days=1))
     
-    records = query.order_by(EntryLog.timestamp.desc()).limit(limit).all()
-    
-    result = []
-    for record in records:
-        student = db.query(Student).filter(Student.RFID == record.RFID).first()
-        result.append(AttendanceRecord(
-            id=record.id,
-            student_id=student.student_id if student else "",
-            student_name=record.student_name,
-            room=record.room_value,
-            entry_time=record.timestamp if record.status == 1 else None,
-            exit_time=record.timestamp if record.status == -1 else None,
-            duration_minutes=None,
-            confidence=record.confidence
-        ))
+    if date_from or student_id:
+        records = query.order_by(EntryLog.timestamp.desc()).limit(limit).all()
+    else:
+        # Widen the window back from the newest row the filters allow until
+        # the page is full; the last try is unbounded
+        newest = datetime.utcnow()
+        if date_to:
+            newest = min(newest, datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+        for days in RECENT_WINDOWS_DAYS + (None,):
+            windowed = query
+            if days is not None:
+                windowed = query.filter(EntryLog.timestamp >= newest - timedelta(days=days))
+            records = windowed.order_by(EntryLog.timestamp.desc()).limit(limit).all()
+            if len(records) >= limit:
+                break
     
-    return result
+    # Serialized straight from the projected rows, in AttendanceRecord field order
+    return rows_response(ATTENDANCE_RECORD_FIELDS, (
+        (
+            record_id,
+            stud_id,
+            student_name,
+            room_value,
+            timestamp if status == 1 else None,
+            timestamp if status == -1 else None,
+            None,
+            confidence
+        )
+        for record_id, stud_id, student_name, room_value, status, timestamp, confidence in records
+    ))
 
 
 @router.get("/summary/{student_id}")
@@ -92,7 +159,7 @@ async def get_student_summary(
     month: Optional[int] = None,
     year: Optional[int] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get attendance summary for a student"""
     student = db.query(Student).filter(Student.student_id == student_id).first()
@@ -134,7 +201,7 @@ async def get_student_summary(
 async def get_realtime_occupancy(
     room: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get real-time room occupancy"""
     # Get latest status for each student in this room
@@ -168,3 +235,66 @@ async def get_realtime_occupancy(
         "students": students_list,
         "timestamp": datetime.utcnow()
     }
+
+
+@router.get("/series")
+async def get_occupancy_series(
+    rooms: Optional[List[str]] = Query(None),
+    resolution: str = "minute",
+    points: int = Query(120, ge=1),
+    end: Optional[datetime] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Occupancy over time for many rooms (default: all) in one response, from the Redis rings
+
+    Minute points are counts at the start of each minute; hour points
+    are the mean count ("rooms") and the peak ("peak"). Points the
+    rings do not hold are null.
+    """
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    if end is not None and end.tzinfo is not None:
+        end = end.astimezone(timezone.utc).replace(tzinfo=None)
+
+    series = occupancy_series(get_binary_redis())
+    result = await series.series(rooms or await series.rooms(), resolution=resolution, points=points, end=end)
+    return Response(content=orjson.dumps(result), media_type="application/json")
+
+
+@router.get("/occupancy/{room}")
+async def get_occupancy_at(
+    room: str,
+    at: datetime,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Who was in a room at a past instant (nearest snapshot plus the entry_log rows after it)"""
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    occupancy, snapshot, replayed = occupancy_at(
+        db, at, timedelta(hours=settings.OCCUPANCY_MAX_STAY_HOURS), room=room
+    )
+    occupants = occupancy.get(room, {})
+
+    students = {}
+    if occupants:
+        students = {
+            rfid: (student_id, name)
+            for student_id, name, rfid in db.query(Student.student_id, Student.stud_name, Student.RFID)
+            .filter(Student.RFID.in_(list(occupants)))
+        }
+
+    return {
+        "room": room,
+        "at": at,
+        "occupancy": len(occupants),
+        "students": [
+            {"student_id": students[rfid][0], "name": students[rfid][1], "entered_at": entered}
+            for rfid, entered in sorted(occupants.items(), key=lambda item: item[1])
+            if rfid in students
+        ],
+        "snapshot": snapshot,
+        "replayed_rows": replayed
+    }
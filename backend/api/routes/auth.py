@@ -5,15 +5,21 @@ Authentication routes and utilities
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from functools import lru_cache
 
 from api.models import Token, TokenData
 from api.config import settings
 
 router = APIRouter()
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """bcrypt hashing context, built on first use to keep passlib off the startup path"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def create_access_token(data: dict):
@@ -76,5 +82,5 @@ async def register(username: str, password: str, email: str):
     Register new user
     """
     # TODO: Create user in database
-    hashed_password = pwd_context.hash(password)
+    hashed_password = get_pwd_context().hash(password)
     return {"message": "User created successfully"}
@@ -4,45 +4,48 @@ from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 
-from api.models import DeviceRegister
+from api.models import DeviceRegister, BeaconRegister
 from api.auth import get_current_user
-from api.database import get_db
-from api.db_models import UserDevice, DeviceTypeEnum, DeviceStatusEnum
+from api.database import get_db, get_read_db
+from api.db_models import UserDevice, DeviceTypeEnum, DeviceStatusEnum, DeviceDirectionEnum, Beacon
+from api.redis_client import publish_reload
+from api.search import publish_entity
+from api.serialization import rows_response
 
 router = APIRouter()
 
+DEVICE_FIELDS = (
+    "device_id", "cluster_id", "device_type", "room", "direction",
+    "has_rfid", "has_pir", "has_ble", "status", "last_seen", "ip"
+)
+
 
 @router.get("/")
 async def list_devices(
     cluster_id: int = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List all devices"""
-    query = db.query(UserDevice)
+    # Columns in DEVICE_FIELDS order; enums serialize as their values
+    query = db.query(
+        UserDevice.device_id,
+        UserDevice.cluster_ID,
+        UserDevice.device_type,
+        UserDevice.room_value,
+        UserDevice.direction,
+        UserDevice.has_rfid,
+        UserDevice.has_pir,
+        UserDevice.has_ble,
+        UserDevice.status,
+        UserDevice.last_seen,
+        UserDevice.ip_address
+    )
     
     if cluster_id is not None:
         query = query.filter(UserDevice.cluster_ID == cluster_id)
     
-    devices = query.all()
-    
-    return {
-        "devices": [
-            {
-                "device_id": d.device_id,
-                "cluster_id": d.cluster_ID,
-                "device_type": d.device_type.value,
-                "room": d.room_value,
-                "has_rfid": d.has_rfid,
-                "has_pir": d.has_pir,
-                "has_ble": d.has_ble,
-                "status": d.status.value,
-                "last_seen": d.last_seen,
-                "ip": d.ip_address
-            }
-            for d in devices
-        ]
-    }
+    return rows_response(DEVICE_FIELDS, query.all(), envelope="devices")
 
 
 @router.post("/register", status_code=201)
@@ -53,15 +56,20 @@ async def register_device(
 ):
     """Register new device"""
     existing = db.query(UserDevice).filter(UserDevice.device_id == device.device_id).first()
+    direction = DeviceDirectionEnum(device.direction.value) if device.direction else None
     
     if existing:
         # Update existing device
         existing.cluster_ID = device.cluster_id
         existing.device_type = device.device_type
         existing.room_value = device.room_value
+        existing.direction = direction
         existing.location_description = device.location_description
         existing.last_seen = datetime.utcnow()
+        existing.updated_at = datetime.utcnow()
         db.commit()
+        await publish_reload("topology")
+        await publish_entity({"type": "device", "id": device.device_id, "room": device.room_value})
         
         return {"message": "Device updated", "device_id": device.device_id}
     
@@ -71,15 +79,88 @@ async def register_device(
         cluster_ID=device.cluster_id,
         device_type=device.device_type,
         room_value=device.room_value,
+        direction=direction,
         location_description=device.location_description,
         status=DeviceStatusEnum.ACTIVE
     )
     db.add(db_device)
     db.commit()
+    await publish_reload("topology")
+    await publish_entity({"type": "device", "id": device.device_id, "room": device.room_value})
     
     return {"message": "Device registered", "device_id": device.device_id}
 
 
+@router.get("/beacons")
+async def list_beacons(
+    room: str = None,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """List registered BLE beacons"""
+    query = db.query(Beacon)
+    
+    if room is not None:
+        query = query.filter(Beacon.room_value == room)
+    
+    return {
+        "beacons": [
+            {
+                "beacon_uuid": b.beacon_uuid,
+                "room": b.room_value,
+                "latitude": b.latitude,
+                "longitude": b.longitude,
+                "radius_meters": b.radius_meters
+            }
+            for b in query.all()
+        ]
+    }
+
+
+@router.post("/beacons", status_code=201)
+async def register_beacon(
+    beacon: BeaconRegister,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Register or move a BLE beacon and reload the processor's geofence index"""
+    existing = db.query(Beacon).filter(Beacon.beacon_uuid == beacon.beacon_uuid).first()
+    
+    if existing:
+        existing.room_value = beacon.room_value
+        existing.latitude = beacon.latitude
+        existing.longitude = beacon.longitude
+        existing.radius_meters = beacon.radius_meters
+        message = "Beacon updated"
+    else:
+        db.add(Beacon(**beacon.model_dump()))
+        message = "Beacon registered"
+    
+    db.commit()
+    await publish_reload("geofence")
+    
+    return {"message": message, "beacon_uuid": beacon.beacon_uuid}
+
+
+@router.delete("/beacons/{beacon_uuid}")
+async def delete_beacon(
+    beacon_uuid: str,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Remove a BLE beacon"""
+    beacon = db.query(Beacon).filter(Beacon.beacon_uuid == beacon_uuid).first()
+    
+    if not beacon:
+        raise HTTPException(status_code=404, detail="Beacon not found")
+    
+    db.delete(beacon)
+    db.commit()
+    await publish_reload("geofence")
+    
+    return {"message": "Beacon removed", "beacon_uuid": beacon_uuid}
+
+
 @router.post("/{device_id}/heartbeat")
 async def device_heartbeat(
     device_id: str,
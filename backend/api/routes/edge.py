@@ -0,0 +1,82 @@
+"""Edge gateway sync API routes"""
+import gzip
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from api.auth import get_current_user
+from api.database import get_db, get_read_db
+from api.db_models import EdgeCheckpoint
+from mqtt.edge_sync import PULL_TABLES, UPLOAD_TABLES, apply_upload, changes_since
+
+router = APIRouter()
+
+BATCH_FIELDS = ("site_id", "store_id", "table", "columns", "rows", "last_id")
+
+
+@router.post("/batches")
+async def upload_batch(
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Apply a (gzip'd) batch of rows uploaded by an edge gateway; resent batches are skipped"""
+    body = await request.body()
+    try:
+        if request.headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        batch = json.loads(body)
+    except (OSError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid batch encoding")
+
+    if any(field not in batch for field in BATCH_FIELDS):
+        raise HTTPException(status_code=400, detail="Incomplete batch")
+    if batch["table"] not in UPLOAD_TABLES:
+        raise HTTPException(status_code=400, detail=f"Unknown table: {batch['table']}")
+
+    inserted = apply_upload(db, batch)
+    return {"table": batch["table"], "position": batch["last_id"], "inserted": inserted}
+
+
+@router.get("/checkpoints")
+async def get_checkpoints(
+    site_id: str,
+    store_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Upload positions recorded for a site's edge stores"""
+    query = db.query(EdgeCheckpoint).filter(EdgeCheckpoint.site_id == site_id)
+    if store_id:
+        query = query.filter(EdgeCheckpoint.store_id == store_id)
+
+    return [
+        {
+            "store_id": checkpoint.store_id,
+            "table": checkpoint.table_name,
+            "position": checkpoint.position,
+            "updated_at": checkpoint.updated_at
+        }
+        for checkpoint in query.all()
+    ]
+
+
+@router.get("/changes/{table}")
+async def get_changes(
+    table: str,
+    after: Optional[str] = None,
+    limit: int = Query(1000, le=10000),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Students, devices or beacons changed after a cursor, for edge gateways to pull"""
+    if table not in PULL_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+
+    try:
+        rows, cursor = changes_since(db, table, after, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"rows": rows, "cursor": cursor}
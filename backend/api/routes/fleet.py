@@ -0,0 +1,75 @@
+"""Fleet command API routes"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from api.models import FleetCommandRequest
+from api.auth import get_current_user
+from api.config import settings
+from api.database import get_db
+from api.db_models import UserDevice, DeviceTypeEnum
+from api.redis_client import get_redis
+from mqtt.fleet import create_job, job_status
+
+router = APIRouter()
+
+
+@router.post("/commands", status_code=202)
+async def send_fleet_command(
+    request: FleetCommandRequest,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue a command for every device matching the filters"""
+    if (
+        request.cluster_id is None and request.room_value is None
+        and request.device_type is None and not request.device_ids
+    ):
+        raise HTTPException(status_code=400, detail="At least one target filter is required")
+    
+    query = db.query(UserDevice.device_id)
+    if request.cluster_id is not None:
+        query = query.filter(UserDevice.cluster_ID == request.cluster_id)
+    if request.room_value is not None:
+        query = query.filter(UserDevice.room_value == request.room_value)
+    if request.device_type is not None:
+        query = query.filter(UserDevice.device_type == DeviceTypeEnum(request.device_type.value))
+    if request.device_ids:
+        query = query.filter(UserDevice.device_id.in_(request.device_ids))
+    
+    device_ids = [device_id for (device_id,) in query.order_by(UserDevice.device_id).all()]
+    if not device_ids:
+        raise HTTPException(status_code=404, detail="No devices match the target filters")
+    
+    job_id = await create_job(
+        get_redis(),
+        request.command.value,
+        request.params,
+        device_ids,
+        settings.FLEET_JOB_TTL_SECONDS
+    )
+    
+    return {
+        "job_id": job_id,
+        "command": request.command.value,
+        "targets": len(device_ids)
+    }
+
+
+@router.get("/commands/{job_id}")
+async def get_fleet_command(
+    job_id: str,
+    include_devices: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Progress of a fleet command job"""
+    status = await job_status(
+        get_redis(),
+        job_id,
+        settings.FLEET_ACK_TIMEOUT_SECONDS,
+        include_devices=include_devices
+    )
+    
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return status
@@ -0,0 +1,77 @@
+"""Presence bitmap query API routes"""
+from datetime import date, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from api.auth import get_current_user
+from api.config import settings
+from api.presence import PRESENCE_MODES, date_range, presence_index
+from api.redis_client import get_binary_redis
+
+router = APIRouter()
+
+
+def presence_days(date_from: date, date_to: date, school_days_only: bool) -> List[date]:
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+    if date_to - date_from > timedelta(days=settings.PRESENCE_RETENTION_DAYS):
+        raise HTTPException(status_code=400, detail="Date range exceeds presence retention")
+    return date_range(date_from, date_to, school_days_only)
+
+
+@router.get("/students")
+async def get_students(
+    date_from: date,
+    date_to: date,
+    mode: str = "any",
+    room: Optional[str] = None,
+    slot: Optional[int] = None,
+    school_days_only: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Students present on any or all days of a range, or absent on all of them (mode "none")
+
+    Optionally restricted to a room or to one time slot of each day
+    (slot n covers minutes [n, n + 1) * PRESENCE_SLOT_MINUTES).
+    """
+    if mode not in PRESENCE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(PRESENCE_MODES)}")
+    if room and slot is not None:
+        raise HTTPException(status_code=400, detail="Filter by room or by slot, not both")
+
+    index = presence_index(get_binary_redis())
+    days = presence_days(date_from, date_to, school_days_only)
+    student_ids = await index.student_ids(await index.students(days, mode=mode, room=room, slot=slot))
+    return {"mode": mode, "days": len(days), "count": len(student_ids), "student_ids": student_ids}
+
+
+@router.get("/rate")
+async def get_attendance_rate(
+    date_from: date,
+    date_to: date,
+    student_id: Optional[List[str]] = Query(None),
+    room: Optional[str] = None,
+    school_days_only: bool = True,
+    current_user: dict = Depends(get_current_user)
+):
+    """Attendance rate per day of a cohort (given student IDs, or every student), campus-wide or in a room"""
+    index = presence_index(get_binary_redis())
+    days = presence_days(date_from, date_to, school_days_only)
+    cohort = await index.cohort(student_id) if student_id else await index.enrolled()
+    return await index.rate(days, cohort, room=room)
+
+
+@router.get("/student/{student_id}")
+async def get_student_presence(
+    student_id: str,
+    date_from: date,
+    date_to: date,
+    current_user: dict = Depends(get_current_user)
+):
+    """Days a student was present"""
+    index = presence_index(get_binary_redis())
+    presence_days(date_from, date_to, False)
+    dates = await index.student_days(student_id, date_from, date_to)
+    return {"student_id": student_id, "days_present": len(dates), "dates": dates}
@@ -0,0 +1,29 @@
+"""Attendance report API routes"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from datetime import date
+
+from api.auth import get_current_user
+from api.database import get_read_db
+from api.reports import build_report
+
+router = APIRouter()
+
+
+@router.get("/attendance")
+def get_attendance_report(
+    date_from: date,
+    date_to: date,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Campus-wide attendance report for a date range
+
+    Declared sync so the bulk fetch and NumPy aggregation run in the
+    threadpool instead of blocking the event loop.
+    """
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+    
+    return build_report(db, date_from, date_to)
@@ -0,0 +1,25 @@
+"""Student and device search API routes"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from api.auth import get_current_user
+from api.search import ENTITY_TYPES, search_index
+
+router = APIRouter()
+
+
+@router.get("/")
+async def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    type: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Ranked prefix search over student names, IDs and RFID tags, and device IDs and rooms"""
+    if type is not None and type not in ENTITY_TYPES:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(ENTITY_TYPES)}")
+    if not search_index.loaded:
+        raise HTTPException(status_code=503, detail="Search index loading")
+
+    return {"query": q, "results": search_index.search(q, limit=limit, entity_type=type)}
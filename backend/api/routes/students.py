@@ -5,21 +5,39 @@ from typing import List
 
 from api.models import Student as StudentModel, StudentCreate
 from api.auth import get_current_user
-from api.database import get_db
+from api.database import get_db, get_read_db
 from api.db_models import Student
+from api.search import publish_entity
+from api.serialization import rows_response
 
 router = APIRouter()
 
+STUDENT_FIELDS = tuple(StudentModel.model_fields)
+
+
+def student_response(student: Student) -> dict:
+    """Student row in the response model's field names"""
+    return dict(zip(STUDENT_FIELDS, (
+        student.student_id, student.stud_name, student.RFID, student.email, student.created_at
+    )))
+
 
 @router.get("/", response_model=List[StudentModel])
 async def list_students(
     limit: int = 100,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List all students"""
-    students = db.query(Student).limit(limit).all()
-    return students
+    # Columns in Student response model field order
+    students = db.query(
+        Student.student_id,
+        Student.stud_name,
+        Student.RFID,
+        Student.email,
+        Student.created_at
+    ).limit(limit).all()
+    return rows_response(STUDENT_FIELDS, students)
 
 
 @router.post("/", response_model=StudentModel, status_code=201)
@@ -34,19 +52,26 @@ async def create_student(
     if existing:
         raise HTTPException(status_code=400, detail="Student ID already exists")
     
-    db_student = Student(**student.dict())
+    db_student = Student(
+        student_id=student.student_id,
+        stud_name=student.name,
+        RFID=student.rfid_uid,
+        email=student.email
+    )
     db.add(db_student)
     db.commit()
     db.refresh(db_student)
+    await publish_entity({"type": "student", "id": db_student.student_id,
+                          "name": db_student.stud_name, "rfid": db_student.RFID})
     
-    return db_student
+    return student_response(db_student)
 
 
 @router.get("/{student_id}", response_model=StudentModel)
 async def get_student(
     student_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get student by ID"""
     student = db.query(Student).filter(Student.student_id == student_id).first()
@@ -54,4 +79,4 @@ async def get_student(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    return student
+    return student_response(student)
@@ -0,0 +1,141 @@
+"""Timetable, roster and session attendance API routes"""
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from api.auth import get_current_user
+from api.database import get_db, get_read_db
+from api.db_models import RosterEntry, SessionAttendance, SessionOccurrence, Student, TimetableSession
+from api.models import TimetableSessionCreate
+from api.roster import reopen
+
+router = APIRouter()
+
+
+def session_dict(session: TimetableSession) -> dict:
+    return {
+        "id": session.id,
+        "course_code": session.course_code,
+        "room": session.room_value,
+        "weekday": session.weekday,
+        "starts_at": session.starts_at,
+        "ends_at": session.ends_at,
+        "late_after_minutes": session.late_after_minutes,
+        "valid_from": session.valid_from,
+        "valid_to": session.valid_to
+    }
+
+
+def set_roster(db: Session, session_id: int, student_ids: List[str]):
+    """Replace a session's roster; unknown student IDs are rejected"""
+    student_ids = sorted(set(student_ids))
+    if student_ids:
+        known = {s for (s,) in db.query(Student.student_id).filter(Student.student_id.in_(student_ids))}
+        unknown = [s for s in student_ids if s not in known]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown students: {', '.join(unknown[:20])}")
+
+    db.query(RosterEntry).filter(RosterEntry.session_id == session_id).delete(synchronize_session=False)
+    db.add_all(RosterEntry(session_id=session_id, student_id=s) for s in student_ids)
+
+
+@router.post("/sessions", status_code=201)
+async def create_session(
+    session: TimetableSessionCreate,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Add a weekly timetable session with its roster"""
+    if session.ends_at <= session.starts_at:
+        raise HTTPException(status_code=400, detail="ends_at must be after starts_at")
+
+    db_session = TimetableSession(**session.model_dump(exclude={"student_ids"}))
+    db.add(db_session)
+    db.flush()
+    set_roster(db, db_session.id, session.student_ids)
+    db.commit()
+
+    return {"message": "Session created", "id": db_session.id, "roster_size": len(set(session.student_ids))}
+
+
+@router.get("/sessions")
+async def list_sessions(
+    room: Optional[str] = None,
+    weekday: Optional[int] = None,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """List timetable sessions"""
+    query = db.query(TimetableSession)
+
+    if room is not None:
+        query = query.filter(TimetableSession.room_value == room)
+    if weekday is not None:
+        query = query.filter(TimetableSession.weekday == weekday)
+
+    return {"sessions": [session_dict(s) for s in query.order_by(TimetableSession.weekday, TimetableSession.starts_at)]}
+
+
+@router.put("/sessions/{session_id}/roster")
+async def replace_roster(
+    session_id: int,
+    student_ids: List[str],
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Replace a session's roster (occurrences already reconciled keep their results)"""
+    if not db.get(TimetableSession, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    set_roster(db, session_id, student_ids)
+    db.commit()
+
+    return {"message": "Roster updated", "id": session_id, "roster_size": len(set(student_ids))}
+
+
+@router.get("/sessions/{session_id}/attendance")
+async def get_session_attendance(
+    session_id: int,
+    session_date: date,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Present/late/absent results of one occurrence of a session"""
+    occurrence = db.get(SessionOccurrence, (session_id, session_date))
+    if not occurrence or occurrence.reconciled_at is None:
+        raise HTTPException(status_code=404, detail="Session occurrence not reconciled")
+
+    rows = db.query(SessionAttendance.student_id, SessionAttendance.status, SessionAttendance.first_entry).filter(
+        SessionAttendance.session_id == session_id,
+        SessionAttendance.session_date == session_date
+    ).order_by(SessionAttendance.student_id)
+
+    return {
+        "session_id": session_id,
+        "session_date": session_date,
+        "reconciled_at": occurrence.reconciled_at,
+        "present": occurrence.present,
+        "late": occurrence.late,
+        "absent": occurrence.absent,
+        "students": [
+            {"student_id": student_id, "status": status.value, "first_entry": first_entry}
+            for student_id, status, first_entry in rows
+        ]
+    }
+
+
+@router.post("/sessions/{session_id}/reconcile", status_code=202)
+async def reconcile_again(
+    session_id: int,
+    session_date: date,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Discard an occurrence's results; the scheduler reconciles it again on its next round"""
+    if not db.get(SessionOccurrence, (session_id, session_date)):
+        raise HTTPException(status_code=404, detail="Session occurrence not reconciled")
+
+    reopen(db, session_id, session_date)
+    return {"message": "Occurrence reopened", "session_id": session_id, "session_date": session_date}
@@ -0,0 +1,313 @@
+"""
+Prefix search over students and devices
+Every searchable value (student names and their words, student IDs,
+RFID tags, device IDs, rooms) is normalized into terms, and the terms
+are kept in one sorted list of "term\\0ref" keys. A prefix lookup is a
+bisect to the first key at or after the prefix and a scan while keys
+still start with it, so typing-speed searches stay well under a
+millisecond at 100k+ entities.
+
+The index is loaded in the background at API startup. Writes through
+the API update it in place and are broadcast to the other API workers
+over Redis, and a periodic pass picks up rows changed elsewhere by
+updated_at.
+"""
+
+import asyncio
+import json
+import re
+import uuid
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from api.db_models import Student, UserDevice
+from api.log import get_logger
+
+log = get_logger("api.search")
+
+SEARCH_CHANNEL = "zias:search"
+ENTITY_TYPES = ("student", "device")
+WORKER_ID = uuid.uuid4().hex  # Broadcasts from this worker are already applied locally
+
+# Field weights, lower ranks first: identifiers, then names, then rooms
+ID_FIELD, NAME_FIELD, ROOM_FIELD = 0, 1, 2
+# Match classes, lower ranks first
+EXACT_ID, EXACT_TERM, PREFIX = 0, 1, 2
+
+SEPARATOR = "\x00"
+KEY_END = "\U0010ffff"  # Sorts after every key with a given prefix
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def compact(value: str) -> str:
+    """Identifier form: lowercase alphanumerics only, so "04 AB:CD" matches "04abcd" """
+    return _NON_ALNUM.sub("", value.lower())
+
+
+@dataclass
+class Entity:
+    type: str
+    id: str
+    label: str
+    detail: Optional[str]
+    terms: Tuple[Tuple[str, int], ...]  # (term, field weight)
+    text: str = field(init=False, repr=False)  # Terms each led by SEPARATOR, for a quick "some term starts with" test
+
+    def __post_init__(self):
+        self.text = "".join(SEPARATOR + term for term, _ in self.terms)
+
+    def as_dict(self) -> dict:
+        return {"type": self.type, "id": self.id, "label": self.label, "detail": self.detail}
+
+
+def student_entity(student_id: str, name: Optional[str], rfid: Optional[str]) -> Entity:
+    terms = {(compact(student_id), ID_FIELD)}
+    if rfid:
+        terms.add((compact(rfid), ID_FIELD))
+    if name:
+        terms.add((normalize(name), NAME_FIELD))
+        terms.update((word, NAME_FIELD) for word in normalize(name).split())
+    return Entity("student", student_id, name or student_id, rfid, tuple(t for t in terms if t[0]))
+
+
+def device_entity(device_id: str, room: Optional[str]) -> Entity:
+    terms = {(compact(device_id), ID_FIELD), (normalize(device_id), ID_FIELD)}
+    if room:
+        terms.update({(normalize(room), ROOM_FIELD), (compact(room), ROOM_FIELD)})
+    return Entity("device", device_id, device_id, room, tuple(t for t in terms if t[0]))
+
+
+def entity_from_message(message: dict) -> Optional[Entity]:
+    if message.get("type") == "student":
+        return student_entity(message["id"], message.get("name"), message.get("rfid"))
+    if message.get("type") == "device":
+        return device_entity(message["id"], message.get("room"))
+    return None
+
+
+class SearchIndex:
+    """Sorted term keys over students and devices, for ranked prefix search"""
+
+    def __init__(self, max_candidates: int = 256):
+        """
+        Args:
+            max_candidates: Matching entities ranked per lookup at most; very
+                short prefixes rank among the first this many matches
+        """
+        self.max_candidates = max_candidates
+        self._keys: List[str] = []
+        self._entities: Dict[str, Entity] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    @staticmethod
+    def ref(entity_type: str, entity_id: str) -> str:
+        return f"{entity_type}:{entity_id}"
+
+    def replace_all(self, entities: Iterable[Entity]):
+        """Swap in a freshly built index (one sort instead of an insort per term)"""
+        built = {self.ref(e.type, e.id): e for e in entities}
+        keys = sorted(f"{term}{SEPARATOR}{ref}" for ref, e in built.items() for term, _ in e.terms)
+        self._keys, self._entities = keys, built
+        self.loaded = True
+
+    def remove(self, entity_type: str, entity_id: str):
+        ref = self.ref(entity_type, entity_id)
+        entity = self._entities.pop(ref, None)
+        if entity is None:
+            return
+        for term, _ in entity.terms:
+            key = f"{term}{SEPARATOR}{ref}"
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def put(self, entity: Entity):
+        """Add or replace an entity"""
+        self.remove(entity.type, entity.id)
+        ref = self.ref(entity.type, entity.id)
+        self._entities[ref] = entity
+        for term, _ in entity.terms:
+            insort(self._keys, f"{term}{SEPARATOR}{ref}")
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        """Index range of the keys whose term starts with prefix"""
+        return bisect_left(self._keys, prefix), bisect_left(self._keys, prefix + KEY_END)
+
+    @staticmethod
+    def _rank(entity: Entity, tokens: List[str], whole: str) -> Optional[tuple]:
+        """Sort key of an entity for a query, or None if some token matches none of its terms"""
+        best = None
+        for token in tokens:
+            token_best = None
+            for term, weight in entity.terms:
+                if not term.startswith(token):
+                    continue
+                match = EXACT_TERM if term == token else PREFIX
+                if token_best is None or (match, weight) < token_best:
+                    token_best = (match, weight)
+            if token_best is None:
+                return None
+            best = token_best if best is None else max(best, token_best)
+        if whole and any(term == whole and weight == ID_FIELD for term, weight in entity.terms):
+            best = (EXACT_ID, ID_FIELD)
+        return best + (len(entity.label), entity.label)
+
+    def search(self, query: str, limit: int = 20, entity_type: Optional[str] = None) -> List[dict]:
+        """
+        Ranked matches for a query
+
+        Every word of the query must prefix some term of a result.
+        Exact identifier matches rank first, then exact words, then
+        prefixes; identifiers before names before rooms; then shorter
+        labels.
+        """
+        tokens = normalize(query).split()
+        whole = compact(query)
+        if not tokens and not whole:
+            return []
+
+        # Scan the narrowest word's keys (plus identifiers typed with separators, "04 AB CD")
+        # until max_candidates entities matching the whole query are found
+        ranges = []
+        if tokens:
+            ranges.append(min((self._range(token) for token in tokens), key=lambda r: r[1] - r[0]))
+        if whole and whole not in tokens:
+            ranges.append(self._range(whole))
+
+        ranked = {}
+        seen = set()
+        for start, end in ranges:
+            found = 0
+            for i in range(start, end):
+                if found >= self.max_candidates:
+                    break
+                ref = self._keys[i].rpartition(SEPARATOR)[2]
+                if ref in seen:
+                    continue
+                seen.add(ref)
+                entity = self._entities.get(ref)
+                if entity is None or (entity_type and entity.type != entity_type):
+                    continue
+                rank = None
+                if all(SEPARATOR + token in entity.text for token in tokens):
+                    rank = self._rank(entity, tokens, whole)
+                if rank is None and whole and any(t.startswith(whole) for t, w in entity.terms if w == ID_FIELD):
+                    rank = (PREFIX, ID_FIELD, len(entity.label), entity.label)
+                if rank is not None:
+                    ranked[ref] = (rank, entity)
+                    found += 1
+        return [entity.as_dict() for _, entity in sorted(ranked.values(), key=lambda item: item[0])[:limit]]
+
+search_index = SearchIndex()
+
+
+def load_entities(db: Session, since: Optional[datetime] = None) -> Tuple[List[Entity], Optional[datetime]]:
+    """
+    Students and devices (changed at or after since, if given) as entities
+
+    Returns:
+        (entities, latest updated_at seen)
+    """
+    latest = since
+    entities = []
+
+    query = select(Student.student_id, Student.stud_name, Student.RFID, Student.updated_at)
+    if since:
+        query = query.where(Student.updated_at >= since)
+    for student_id, name, rfid, updated_at in db.execute(query):
+        entities.append(student_entity(student_id, name, rfid))
+        if updated_at and (latest is None or updated_at > latest):
+            latest = updated_at
+
+    query = select(UserDevice.device_id, UserDevice.room_value, UserDevice.updated_at)
+    if since:
+        query = query.where(UserDevice.updated_at >= since)
+    for device_id, room, updated_at in db.execute(query):
+        entities.append(device_entity(device_id, room))
+        if updated_at and (latest is None or updated_at > latest):
+            latest = updated_at
+
+    return entities, latest
+
+
+async def publish_entity(message: dict, index: SearchIndex = search_index):
+    """
+    Apply a student/device write to this worker's index and broadcast it to the others
+
+    Args:
+        message: {"type": "student", "id", "name", "rfid"} or
+            {"type": "device", "id", "room"}
+    """
+    from api.redis_client import get_redis
+
+    entity = entity_from_message(message)
+    if entity:
+        index.put(entity)
+    try:
+        await get_redis().publish(SEARCH_CHANNEL, json.dumps({**message, "origin": WORKER_ID}))
+    except Exception as e:
+        log.warning("Failed to broadcast search update: %s", e)
+
+
+async def run_search_index(index: SearchIndex = search_index, refresh_seconds: float = 300.0):
+    """Load the index, then apply broadcasts from other workers and periodic updated_at deltas"""
+    from api.database import get_read_db_session
+    from api.redis_client import get_redis
+
+    def fetch(since):
+        with get_read_db_session() as db:
+            return load_entities(db, since)
+
+    started = asyncio.get_running_loop().time()
+    while True:
+        try:
+            entities, cursor = await asyncio.to_thread(fetch, None)
+            break
+        except Exception as e:
+            log.warning("Search index load failed, will retry: %s", e)
+            await asyncio.sleep(5)
+    index.replace_all(entities)
+    log.info("Search index loaded: %d entities in %.0f ms", len(index),
+             (asyncio.get_running_loop().time() - started) * 1000)
+
+    pubsub = None
+    last_refresh = asyncio.get_running_loop().time()
+    while True:
+        try:
+            if pubsub is None:
+                pubsub = get_redis().pubsub()
+                await pubsub.subscribe(SEARCH_CHANNEL)
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message:
+                data = json.loads(message["data"])
+                entity = entity_from_message(data)
+                if entity and data.get("origin") != WORKER_ID:
+                    index.put(entity)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Search update channel failed, will retry: %s", e)
+            pubsub = None
+            await asyncio.sleep(5)
+
+        now = asyncio.get_running_loop().time()
+        if now - last_refresh >= refresh_seconds:
+            last_refresh = now
+            try:
+                entities, cursor = await asyncio.to_thread(fetch, cursor)
+                for entity in entities:
+                    index.put(entity)
+            except Exception as e:
+                log.warning("Search index refresh failed: %s", e)
@@ -0,0 +1,41 @@
+"""
+Fast JSON responses for list endpoints
+Serializes projected row tuples straight to bytes with orjson, skipping
+per-row Pydantic validation. Callers project columns in the order of
+the response model's fields, so the wire format is unchanged.
+"""
+
+from typing import Iterable, Optional, Sequence
+
+import orjson
+from fastapi.responses import Response
+
+
+def dump_rows(fields: Sequence[str], rows: Iterable[Sequence], envelope: Optional[str] = None) -> bytes:
+    """
+    Encode rows as a JSON array of objects
+
+    Args:
+        fields: Output key for each tuple position
+        rows: Row tuples (SQLAlchemy Rows work as-is)
+        envelope: Wrap the array as {envelope: [...]} if given
+
+    Datetimes are written like Pydantic does (ISO 8601, no offset for
+    naive values) and enums as their values.
+    """
+    items = [dict(zip(fields, row)) for row in rows]
+    return orjson.dumps({envelope: items} if envelope else items)
+
+
+def rows_response(
+    fields: Sequence[str],
+    rows: Iterable[Sequence],
+    envelope: Optional[str] = None,
+    status_code: int = 200
+) -> Response:
+    """JSON response for projected rows; bypasses response_model validation"""
+    return Response(
+        content=dump_rows(fields, rows, envelope),
+        status_code=status_code,
+        media_type="application/json"
+    )
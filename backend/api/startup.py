@@ -0,0 +1,68 @@
+"""
+Startup timing
+Worker startup phases are timed and logged once the worker is ready,
+and the time to the first request served is logged when it happens, so
+cold-start regressions in rolling deploys and autoscaling show up in
+the logs and in /health.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from api.log import get_logger
+
+log = get_logger("api.startup")
+
+
+class StartupTimer:
+    """Phase durations (ms) measured from a start mark"""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases: Dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+        self.first_request_ms: Optional[float] = None
+
+    def _since(self, mark: float) -> float:
+        return round((time.perf_counter() - mark) * 1000, 1)
+
+    def record(self, name: str, started: float):
+        """Record a phase that began at the perf_counter mark started"""
+        self.phases[name] = self._since(started)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    def ready(self):
+        self.ready_ms = self._since(self.started)
+        log.info("Startup timings", extra={"ready_ms": self.ready_ms, "phases": self.phases})
+
+    def first_request(self):
+        self.first_request_ms = self._since(self.started)
+        log.info("First request served", extra={"time_to_first_request_ms": self.first_request_ms})
+
+    def as_dict(self) -> dict:
+        return {
+            "phases_ms": self.phases,
+            "ready_ms": self.ready_ms,
+            "first_request_ms": self.first_request_ms
+        }
+
+
+class FirstRequestTimer:
+    """ASGI middleware that notes when the first HTTP request completes, then just passes through"""
+
+    def __init__(self, app, timer: StartupTimer):
+        self.app = app
+        self.timer = timer
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        if self.timer.first_request_ms is None and scope["type"] == "http":
+            self.timer.first_request()
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the REST API on large seeded datasets
+benchmarks.seed fills a database with a realistic school-day pattern;
+benchmarks.run measures the read endpoints against it and compares the
+results to the saved baselines.
+"""
@@ -0,0 +1,279 @@
+"""
+REST API benchmark runner
+Drives the read endpoints in-process through the ASGI app against
+seeded databases of several sizes, and reports latency percentiles and
+SQL queries per request for each. Results can be saved as per-dialect,
+per-size JSON baselines and later runs checked against them, failing
+when latency or query count regresses past a threshold.
+
+Usage:
+    python -m benchmarks.run --sizes small,medium
+    python -m benchmarks.run --sizes small --save-baseline
+    python -m benchmarks.run --sizes small --check --threshold 0.25
+    python -m benchmarks.run --db-template mysql+mysqlconnector://u:p@localhost/zias_bench_{size} --sizes large
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+# Settings require these; the benchmark never uses the configured database
+os.environ.setdefault("DB_PASSWORD", "benchmark")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from api.database import get_db, get_read_db  # noqa: E402
+from api.db_models import EntryLog, Student, UserDevice  # noqa: E402
+from api.routes.auth import create_access_token  # noqa: E402
+from benchmarks.seed import SIZES, make_engine, seed  # noqa: E402
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+PERCENTILES = (50, 90, 95, 99)
+CHECKED_PERCENTILES = ("p50_ms", "p95_ms")
+NOISE_FLOOR_MS = 2.0  # Latency differences under this are never a regression
+
+
+class QueryCounter:
+    """Counts statements run on an engine"""
+
+    def __init__(self, engine: Engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+class ASGIClient:
+    """Bare-bones in-process HTTP GET over ASGI, so the full request path is measured without a server"""
+
+    def __init__(self, app, token: str):
+        self.app = app
+        self.headers = [(b"authorization", f"Bearer {token}".encode())]
+
+    async def get(self, path: str, query: str = "") -> int:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": self.headers,
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        status = 0
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await self.app(scope, receive, send)
+        return status
+
+
+def sample_targets(engine: Engine) -> dict:
+    """A busy room, an active student and a cluster to request, read from the seeded data"""
+    with engine.connect() as conn:
+        room = conn.execute(
+            select(EntryLog.room_value).group_by(EntryLog.room_value).order_by(func.count().desc()).limit(1)
+        ).scalar()
+        rfid = conn.execute(select(EntryLog.RFID).order_by(EntryLog.timestamp.desc()).limit(1)).scalar()
+        student_id = conn.execute(select(Student.student_id).where(Student.RFID == rfid)).scalar()
+        cluster = conn.execute(select(UserDevice.cluster_ID).where(UserDevice.room_value == room).limit(1)).scalar()
+        latest = conn.execute(select(func.max(EntryLog.timestamp))).scalar()
+    if isinstance(latest, str):
+        latest = latest[:10]
+    else:
+        latest = latest.date().isoformat()
+    return {"room": room, "student_id": student_id, "cluster": cluster, "latest_day": latest}
+
+
+def benchmark_cases(targets: dict) -> Dict[str, tuple]:
+    """Case name -> (path, query string)"""
+    return {
+        "attendance_records": ("/api/v1/attendance/records", "limit=100"),
+        "attendance_records_room_day": (
+            "/api/v1/attendance/records",
+            f"room={targets['room']}&date_from={targets['latest_day']}&date_to={targets['latest_day']}&limit=1000"
+        ),
+        "attendance_records_student": ("/api/v1/attendance/records", f"student_id={targets['student_id']}&limit=100"),
+        "realtime_occupancy": (f"/api/v1/attendance/realtime/{targets['room']}", ""),
+        "student_summary": (f"/api/v1/attendance/summary/{targets['student_id']}", ""),
+        "list_devices": ("/api/v1/devices/", ""),
+        "list_devices_cluster": ("/api/v1/devices/", f"cluster_id={targets['cluster']}"),
+    }
+
+
+def summarize(latencies: List[float], queries: List[int]) -> dict:
+    values = np.array(latencies) * 1000
+    result = {f"p{p}_ms": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    result.update({
+        "max_ms": round(float(values.max()), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "queries": round(float(np.mean(queries)), 2),
+        "iterations": len(latencies)
+    })
+    return result
+
+
+async def run_cases(app, engine: Engine, cases: Dict[str, tuple], iterations: int, warmup: int) -> dict:
+    counter = QueryCounter(engine)
+    client = ASGIClient(app, create_access_token({"sub": "benchmark"}))
+    results = {}
+    for name, (path, query) in cases.items():
+        for _ in range(warmup):
+            await client.get(path, query)
+
+        latencies, queries = [], []
+        for _ in range(iterations):
+            counter.count = 0
+            started = time.perf_counter()
+            status = await client.get(path, query)
+            latencies.append(time.perf_counter() - started)
+            queries.append(counter.count)
+            if status != 200:
+                raise RuntimeError(f"{name}: GET {path}?{query} returned {status}")
+        results[name] = summarize(latencies, queries)
+    return results
+
+
+def prepare(url: str, size: str, reseed: bool) -> Engine:
+    """Engine for a size's database, seeded first if empty (or reseed is set)"""
+    engine = make_engine(url)
+    if reseed:
+        from api.db_models import Base
+        Base.metadata.drop_all(engine)
+
+    try:
+        with engine.connect() as conn:
+            seeded = conn.execute(select(func.count()).select_from(Student)).scalar()
+    except Exception:
+        seeded = 0
+    if not seeded:
+        print(f"Seeding {size} ({url})", file=sys.stderr)
+        seed(engine, progress=True, **SIZES[size])
+    return engine
+
+
+def bind_app(engine: Engine):
+    """The API app with its database dependencies pointed at the benchmark engine"""
+    from main import app
+
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def bench_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = bench_db
+    app.dependency_overrides[get_read_db] = bench_db
+    return app
+
+
+def baseline_path(dialect: str, size: str) -> Path:
+    return BASELINE_DIR / f"{dialect}-{size}.json"
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Regressions of results against a baseline, as messages"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("cases", {}).get(name)
+        if previous is None:
+            continue
+        for metric in CHECKED_PERCENTILES:
+            limit = previous[metric] * (1 + threshold) + NOISE_FLOOR_MS
+            if current[metric] > limit:
+                regressions.append(
+                    f"{name} {metric}: {current[metric]:.2f}ms > {limit:.2f}ms (baseline {previous[metric]:.2f}ms)"
+                )
+        if current["queries"] > previous["queries"] * (1 + threshold):
+            regressions.append(f"{name} queries: {current['queries']:g} > baseline {previous['queries']:g}")
+    return regressions
+
+
+def print_table(size: str, dialect: str, results: dict, out: Callable = print):
+    out(f"\n{size} ({dialect})")
+    out(f"{'case':32} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'max':>9} {'queries':>8}")
+    for name, r in results.items():
+        out(f"{name:32} {r['p50_ms']:9.2f} {r['p90_ms']:9.2f} {r['p95_ms']:9.2f} "
+            f"{r['p99_ms']:9.2f} {r['max_ms']:9.2f} {r['queries']:8g}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ZIAS read endpoints on seeded datasets")
+    parser.add_argument("--sizes", default="small", help=f"Comma-separated sizes from {', '.join(SIZES)}")
+    parser.add_argument("--db-template", default="sqlite:///bench-{size}.db", help="Database URL, {size} substituted")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--reseed", action="store_true", help="Drop and reseed the databases first")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the baselines")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if results regress past the baselines")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed regression ratio for --check")
+    parser.add_argument("--output", help="Also write all results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    report, regressions = {}, []
+    for size in sizes:
+        engine = prepare(args.db_template.format(size=size), size, args.reseed)
+        dialect = engine.dialect.name
+        app = bind_app(engine)
+        targets = sample_targets(engine)
+        results = asyncio.run(run_cases(app, engine, benchmark_cases(targets), args.iterations, args.warmup))
+        print_table(size, dialect, results)
+
+        entry = {"size": size, "dialect": dialect, **SIZES[size], "targets": targets, "cases": results}
+        report[f"{dialect}-{size}"] = entry
+
+        path = baseline_path(dialect, size)
+        if args.save_baseline:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(entry, indent=2) + "\n")
+            print(f"Baseline written to {path}", file=sys.stderr)
+        elif args.check:
+            if not path.exists():
+                print(f"No baseline at {path}, skipping check for {size}", file=sys.stderr)
+                continue
+            regressions += [f"{dialect}-{size} {message}"
+                            for message in compare(results, json.loads(path.read_text()), args.threshold)]
+        engine.dispose()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+    if regressions:
+        print("\nRegressions:", file=sys.stderr)
+        for message in regressions:
+            print(f"  {message}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
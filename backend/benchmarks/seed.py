@@ -0,0 +1,236 @@
+"""
+Bulk seeder for benchmark databases
+Generates students, rooms with entry/exit readers, and entry_log rows
+that follow a school day: most students attend on weekdays and few at
+weekends, each attending one to four sessions that start near fixed
+slot times and last about a period, mostly in a few rooms of their
+own. Rows are generated a day at a time with NumPy and inserted with
+driver-level executemany in large batches.
+
+Usage:
+    python -m benchmarks.seed --db sqlite:///bench-small.db --size small
+    python -m benchmarks.seed --db mysql+mysqlconnector://u:p@localhost/zias_bench --students 50000 --entry-rows 100000000
+"""
+
+import argparse
+import math
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Sequence
+
+import numpy as np
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Connection, Engine
+
+from api.db_models import Base, DeviceDirectionEnum, DeviceStatusEnum, DeviceTypeEnum
+
+SIZES = {
+    "small": {"students": 1_000, "entry_rows": 100_000},
+    "medium": {"students": 10_000, "entry_rows": 1_000_000},
+    "large": {"students": 50_000, "entry_rows": 10_000_000},
+    "xl": {"students": 50_000, "entry_rows": 100_000_000},  # MySQL; days of seeding on SQLite
+}
+
+# Session start times (minutes after midnight) and attendance pattern
+SLOT_STARTS = np.array([8 * 60, 9 * 60 + 30, 11 * 60, 13 * 60, 14 * 60 + 30, 16 * 60])
+WEEKDAY_ATTENDANCE = 0.85
+WEEKEND_ATTENDANCE = 0.10
+MAX_SESSIONS = 4
+ROOMS_PER_STUDENT = 3
+STUDENTS_PER_ROOM = 50
+BLE_SHARE = 0.05
+LIVE_MINUTE = 10 * 60 + 15  # The seeded "now" falls on a weekday at this time, mid-session
+
+ENTRY_LOG_COLUMNS = ("student_name", "RFID", "room_value", "status", "timestamp", "confidence", "source")
+
+
+def student_ids(count: int) -> List[str]:
+    return [f"S{i:06d}" for i in range(count)]
+
+
+def student_rfids(count: int) -> np.ndarray:
+    return np.array([f"{i:08X}" for i in range(count)])
+
+
+def room_names(count: int) -> List[str]:
+    return [f"room_{i:04d}" for i in range(count)]
+
+
+def bulk_insert(conn: Connection, table: str, columns: Sequence[str], rows: List[tuple]):
+    """executemany straight through the driver, skipping per-row SQLAlchemy processing"""
+    mark = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([mark] * len(columns))})"
+    conn.exec_driver_sql(sql, rows)
+
+
+def day_rows(rng: np.random.Generator, day: date, rfids: np.ndarray, names: np.ndarray,
+             rooms: np.ndarray, home_rooms: np.ndarray, cutoff: datetime = None,
+             shift: timedelta = timedelta(0)) -> List[tuple]:
+    """entry_log rows of one day, in time order, moved by shift"""
+    attendance = WEEKDAY_ATTENDANCE if day.weekday() < 5 else WEEKEND_ATTENDANCE
+    present = np.flatnonzero(rng.random(len(rfids)) < attendance)
+    if present.size == 0:
+        return []
+
+    # Distinct slots per student: a random order of slots, first N taken
+    sessions = rng.integers(1, MAX_SESSIONS + 1, size=present.size)
+    slot_order = rng.random((present.size, len(SLOT_STARTS))).argsort(axis=1)
+    taken = np.arange(len(SLOT_STARTS)) < sessions[:, None]
+    student = np.repeat(present, sessions)
+    slot = slot_order[taken]
+
+    count = student.size
+    start = SLOT_STARTS[slot] + rng.normal(-5, 4, count)                # Minutes; most arrive a little early
+    duration = np.clip(rng.normal(80, 10, count), 20, 180)
+    room = home_rooms[student, rng.integers(0, ROOMS_PER_STUDENT, count)]
+    ble = rng.random(count) < BLE_SHARE
+    confidence = np.where(ble, rng.uniform(0.7, 0.95, count).round(2), 1.0)
+
+    midnight = np.datetime64(day, "s")
+    entered = midnight + (start * 60).astype("timedelta64[s]")
+    exited = entered + (duration * 60).astype("timedelta64[s]")
+
+    timestamps = np.concatenate([entered, exited])
+    order = np.argsort(timestamps, kind="stable")
+    if cutoff is not None:
+        order = order[timestamps[order] <= np.datetime64(cutoff, "s")]  # Nothing in the future; sessions in progress stay open
+    timestamps = timestamps + np.timedelta64(int(shift.total_seconds()), "s")
+    columns = (
+        np.concatenate([names[student], names[student]])[order],
+        np.concatenate([rfids[student], rfids[student]])[order],
+        np.concatenate([rooms[room], rooms[room]])[order],
+        np.concatenate([np.ones(count, int), -np.ones(count, int)])[order],
+        np.char.replace(np.datetime_as_string(timestamps[order], unit="s"), "T", " "),
+        np.concatenate([confidence, confidence])[order],
+        np.where(np.concatenate([ble, ble]), "ble", "rfid")[order],
+    )
+    return list(zip(*(column.tolist() for column in columns)))
+
+
+def entry_log_days(rng: np.random.Generator, students: int, rooms: int, entry_rows: int,
+                   end: datetime) -> Iterator[List[tuple]]:
+    """
+    Rows per day, going back from the end moment, until entry_rows are produced
+
+    Days are generated up to a weekday at LIVE_MINUTE and then shifted so
+    that moment is end, so the realtime endpoints always find rooms in
+    session, whenever the seeding and the benchmark run.
+    """
+    rfids = student_rfids(students)
+    names = np.array([f"Student {i}" for i in range(students)])
+    room_array = np.array(room_names(rooms))
+    home_rooms = rng.integers(0, rooms, size=(students, ROOMS_PER_STUDENT))
+
+    produced = 0
+    day = end.date()
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    live = datetime.combine(day, datetime.min.time()) + timedelta(minutes=LIVE_MINUTE)
+    shift = end - live
+    while produced < entry_rows:
+        rows = day_rows(rng, day, rfids, names, room_array, home_rooms, cutoff=live, shift=shift)[:entry_rows - produced]
+        produced += len(rows)
+        if rows:
+            yield rows
+        day -= timedelta(days=1)
+
+
+def _fast_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=OFF")  # Throwaway data; a crash just means reseeding
+    cursor.close()
+
+
+def seed(engine: Engine, students: int, entry_rows: int, end: datetime = None,
+         random_seed: int = 42, batch_size: int = 50_000, progress: bool = False) -> dict:
+    """
+    Create the schema and fill it
+
+    Returns:
+        Counts of what was inserted
+    """
+    end = end or datetime.utcnow().replace(microsecond=0)
+    rng = np.random.default_rng(random_seed)
+    rooms = max(10, math.ceil(students / STUDENTS_PER_ROOM))
+    started = time.perf_counter()
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        now = datetime.utcnow().isoformat(sep=" ")
+        bulk_insert(conn, "student", ("student_id", "stud_name", "RFID", "email", "created_at", "updated_at"), [
+            (student_id, f"Student {i}", rfid, f"{student_id.lower()}@example.edu", now, now)
+            for i, (student_id, rfid) in enumerate(zip(student_ids(students), student_rfids(students).tolist()))
+        ])
+
+        # Two readers per room, one per direction, one cluster per room
+        devices = []
+        for cluster, room in enumerate(room_names(rooms), start=1):
+            for direction in (DeviceDirectionEnum.ENTRY, DeviceDirectionEnum.EXIT):
+                devices.append((
+                    f"{room}_{direction.value}", cluster, DeviceTypeEnum.RFID.name, room, direction.name,
+                    True, False, False, DeviceStatusEnum.ACTIVE.name, now, now, now
+                ))
+        bulk_insert(conn, "user_devices", (
+            "device_id", "cluster_ID", "device_type", "room_value", "direction",
+            "has_rfid", "has_pir", "has_ble", "status", "last_seen", "created_at", "updated_at"
+        ), devices)
+
+    inserted = 0
+    pending: List[tuple] = []
+    for rows in entry_log_days(rng, students, rooms, entry_rows, end):
+        pending.extend(rows)
+        if len(pending) >= batch_size or inserted + len(pending) >= entry_rows:
+            with engine.begin() as conn:
+                bulk_insert(conn, "entry_log", ENTRY_LOG_COLUMNS, pending)
+            inserted += len(pending)
+            pending = []
+            if progress:
+                rate = inserted / (time.perf_counter() - started)
+                print(f"\r{inserted:,}/{entry_rows:,} entry_log rows ({rate:,.0f}/s)", end="", file=sys.stderr)
+    if progress:
+        print(file=sys.stderr)
+
+    return {
+        "students": students,
+        "rooms": rooms,
+        "devices": rooms * 2,
+        "entry_rows": inserted,
+        "seconds": round(time.perf_counter() - started, 1)
+    }
+
+
+def make_engine(url: str) -> Engine:
+    """Engine for a benchmark database; SQLite gets seeding-friendly pragmas"""
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        event.listen(engine, "connect", _fast_sqlite)
+        return engine
+    return create_engine(url, pool_size=5, max_overflow=0)
+
+
+def main():
+    """CLI seeding entry point"""
+    parser = argparse.ArgumentParser(description="Seed a ZIAS benchmark database")
+    parser.add_argument("--db", required=True, help="SQLAlchemy URL of an empty database")
+    parser.add_argument("--size", choices=SIZES, help="Preset student and entry_log counts")
+    parser.add_argument("--students", type=int)
+    parser.add_argument("--entry-rows", type=int)
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Last seeded moment (default: now, UTC)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+
+    preset = SIZES.get(args.size, {})
+    students = args.students or preset.get("students")
+    entry_rows = args.entry_rows or preset.get("entry_rows")
+    if not students or not entry_rows:
+        parser.error("give --size or both --students and --entry-rows")
+
+    result = seed(make_engine(args.db), students, entry_rows, end=args.end, random_seed=args.seed, progress=True)
+    print(f"Seeded {result['students']:,} students, {result['devices']} devices in {result['rooms']} rooms, "
+          f"{result['entry_rows']:,} entry_log rows in {result['seconds']}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,47 +3,74 @@ ZIAS FastAPI Application
 Main entry point for REST API server
 """
 
+import time
+
+# Start mark for startup timings, taken before the heavy imports below
+_started = time.perf_counter()
+
+import asyncio
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
 import uvicorn
 
-from api.routes import auth, devices, attendance, students
-from api.database import init_db, close_db
+from api.routes import auth, devices, attendance, students, reports, fleet, edge, presence, timetable, search
+from api.database import init_db, close_db, pool_stats
 from api.config import settings
-from mqtt.client import mqtt_client
-import redis.asyncio as redis
+from api.log import get_logger, setup_logging
+from api.redis_client import close_redis
+from api.search import run_search_index
+from api.startup import FirstRequestTimer, StartupTimer
 
 security = HTTPBearer()
 
-# Redis connection pool
-redis_pool = None
+log = get_logger("api")
+
+startup = StartupTimer(_started)
+startup.record("imports", _started)
+
+
+def start_mqtt(loop: asyncio.AbstractEventLoop):
+    """Import and connect the MQTT client (paho connect blocks, so this runs in a thread)"""
+    with startup.phase("mqtt"):
+        from mqtt.client import mqtt_client
+        mqtt_client.start(loop)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
-    global redis_pool
-    init_db()
-    redis_pool = redis.ConnectionPool.from_url(
-        settings.REDIS_URL,
-        decode_responses=True
-    )
+    with startup.phase("logging"):
+        setup_logging("api")
+    
+    # MQTT connects in the background, unless a dedicated ingest service owns it;
+    # the Redis client is created on first use
+    mqtt_started = None
+    if settings.API_MQTT_ENABLED:
+        mqtt_started = asyncio.create_task(asyncio.to_thread(start_mqtt, asyncio.get_running_loop()))
+    
+    with startup.phase("database"):
+        await asyncio.to_thread(init_db)
     
-    # Start MQTT client in background
-    mqtt_client.start()
+    # Loads in the background; search answers 503 until it is in
+    search_task = asyncio.create_task(run_search_index(refresh_seconds=settings.SEARCH_REFRESH_SECONDS))
     
-    print(f"ZIAS API Server started on {settings.API_HOST}:{settings.API_PORT}")
+    startup.ready()
+    log.info("ZIAS API Server started on %s:%s", settings.API_HOST, settings.API_PORT)
     
     yield
     
     # Shutdown
+    search_task.cancel()
     close_db()
-    mqtt_client.stop()
-    await redis_pool.disconnect()
-    print("ZIAS API Server shutdown")
+    if mqtt_started:
+        await mqtt_started
+        from mqtt.client import mqtt_client
+        mqtt_client.stop()
+    await close_redis()
+    log.info("ZIAS API Server shutdown")
 
 
 app = FastAPI(
@@ -53,6 +80,8 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(FirstRequestTimer, timer=startup)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -67,6 +96,12 @@ app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(devices.router, prefix="/api/v1/devices", tags=["Devices"])
 app.include_router(attendance.router, prefix="/api/v1/attendance", tags=["Attendance"])
 app.include_router(students.router, prefix="/api/v1/students", tags=["Students"])
+app.include_router(reports.router, prefix="/api/v1/reports", tags=["Reports"])
+app.include_router(fleet.router, prefix="/api/v1/fleet", tags=["Fleet"])
+app.include_router(edge.router, prefix="/api/v1/edge", tags=["Edge"])
+app.include_router(presence.router, prefix="/api/v1/presence", tags=["Presence"])
+app.include_router(timetable.router, prefix="/api/v1/timetable", tags=["Timetable"])
+app.include_router(search.router, prefix="/api/v1/search", tags=["Search"])
 
 
 @app.get("/")
@@ -83,11 +118,17 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    if settings.API_MQTT_ENABLED:
+        from mqtt.client import mqtt_client
+    
     return {
         "status": "healthy",
         "database": "connected",
+        "database_pools": pool_stats(),
         "redis": "connected",
-        "mqtt": mqtt_client.is_connected()
+        "mqtt": mqtt_client.is_connected() if settings.API_MQTT_ENABLED else "disabled",
+        "ingest_lanes": mqtt_client.lanes.stats() if settings.API_MQTT_ENABLED else "disabled",
+        "startup": startup.as_dict()
     }
 
 
@@ -10,10 +10,13 @@ Author: Bishwa Bikash Das (Enhanced)
 
 import os
 import sys
+from types import SimpleNamespace
 import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
-from datetime import datetime
+
+from api.log import get_logger, setup_logging
+from mqtt.topology import DeviceTopology
 
 # Load environment variables from .env file
 load_dotenv()
@@ -29,6 +32,18 @@ DB_CONFIG = {
 
 # Configuration
 TIME_WINDOW = int(os.getenv('TIME_WINDOW_SECONDS', 3))
+LOOKBACK = int(os.getenv('CRON_LOOKBACK_SECONDS', 300))  # Only recent reads; keeps the scan to the newest partitions
+
+# Logging settings (as in api.config), read here so the cron job needs none of the API's secrets
+LOG_CONFIG = SimpleNamespace(
+    LOG_LEVEL=os.getenv('LOG_LEVEL', 'INFO'),
+    LOG_FORMAT=os.getenv('LOG_FORMAT', 'text'),
+    LOG_QUEUE_SIZE=int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+    LOG_SAMPLE_RATES=os.getenv('LOG_SAMPLE_RATES', ''),
+    LOG_RATE_LIMITS=os.getenv('LOG_RATE_LIMITS', 'mqtt=200,cron=200')
+)
+
+log = get_logger("cron")
 
 
 def get_db_connection():
@@ -43,10 +58,25 @@ def get_db_connection():
         if connection.is_connected():
             return connection
     except Error as e:
-        print(f"Error connecting to MySQL: {e}", file=sys.stderr)
+        log.error("Error connecting to MySQL: %s", e)
         return None
 
 
+def load_topology(cursor) -> DeviceTopology:
+    """
+    Build the device topology index from user_devices
+    
+    Returns:
+        DeviceTopology: direction role and room per device
+    """
+    cursor.execute(
+        "SELECT device_id, cluster_ID, room_value, direction, device_type FROM user_devices"
+    )
+    topology = DeviceTopology()
+    topology.load(cursor.fetchall())
+    return topology
+
+
 def process_sensor_data():
     """
     Process sensor data to identify entry/exit pairs
@@ -56,7 +86,7 @@ def process_sensor_data():
     res_con = get_db_connection()
     
     if not con or not res_con:
-        print("Failed to connect to database", file=sys.stderr)
+        log.error("Failed to connect to database")
         return
     
     try:
@@ -64,6 +94,9 @@ def process_sensor_data():
         res_cursor = res_con.cursor()
         res_con.autocommit = True
         
+        # Direction and room per device, resolved in memory
+        topology = load_topology(cursor)
+        
         # Query to find matching entry/exit pairs
         # Uses parameterized query to prevent SQL injection
         query = """
@@ -77,25 +110,27 @@ def process_sensor_data():
                 AND a.device_ID <> b.device_ID
                 AND a.time_stamp < b.time_stamp
                 AND a.cluster_ID = b.cluster_ID
+                AND a.time_stamp >= NOW() - INTERVAL %s SECOND
+                AND b.time_stamp >= NOW() - INTERVAL %s SECOND
         """
         
-        cursor.execute(query, (TIME_WINDOW,))
+        cursor.execute(query, (TIME_WINDOW, LOOKBACK, LOOKBACK))
         
         # Process results
         data_dict = {}
         
         for (dev1, rfid, timestamp, cluster) in cursor:
-            # Determine entry (even device ID) vs exit (odd device ID)
-            device_num = int(dev1[-1]) if dev1[-1].isdigit() else 0
+            # Determine entry vs exit from the device's topology role
+            is_entry, room = topology.resolve(dev1, cluster)
             
-            if device_num % 2 == 0:
+            if is_entry:
                 # Entry
-                data_dict[rfid] = {'cluster': cluster, 'status': 1, 'timestamp': timestamp}
-                print(f"Entry detected: RFID={rfid}, Cluster={cluster}")
+                data_dict[rfid] = {'room': room, 'status': 1, 'timestamp': timestamp}
+                log.debug("Entry detected: RFID=%s, Cluster=%s", rfid, cluster)
             else:
                 # Exit
-                data_dict[rfid] = {'cluster': cluster, 'status': -1, 'timestamp': timestamp}
-                print(f"Exit detected: RFID={rfid}, Cluster={cluster}")
+                data_dict[rfid] = {'room': room, 'status': -1, 'timestamp': timestamp}
+                log.debug("Exit detected: RFID=%s, Cluster=%s", rfid, cluster)
         
         # Insert results into entry_log using prepared statements
         for rfid, data in data_dict.items():
@@ -104,7 +139,7 @@ def process_sensor_data():
                 VALUES (
                     (SELECT stud_name FROM student WHERE student.RFID = %s),
                     %s,
-                    (SELECT DISTINCT room_value FROM user_devices WHERE cluster_ID = %s),
+                    %s,
                     %s,
                     %s
                 )
@@ -114,19 +149,19 @@ def process_sensor_data():
                 res_cursor.execute(insert_query, (
                     rfid,
                     rfid,
-                    data['cluster'],
+                    data['room'],
                     data['status'],
                     data['timestamp']
                 ))
-                print(f"Logged: RFID={rfid}, Status={data['status']}")
+                log.info("Logged: RFID=%s, Status=%s", rfid, data['status'])
                 
             except Error as e:
-                print(f"Error inserting entry for RFID {rfid}: {e}", file=sys.stderr)
+                log.error("Error inserting entry for RFID %s: %s", rfid, e)
         
-        print(f"Processed {len(data_dict)} events at {datetime.now()}")
+        log.info("Processed %d events", len(data_dict))
         
     except Error as e:
-        print(f"Database error: {e}", file=sys.stderr)
+        log.error("Database error: %s", e)
     
     finally:
         if cursor:
@@ -140,6 +175,8 @@ def process_sensor_data():
 
 
 if __name__ == "__main__":
+    setup_logging("cron", LOG_CONFIG)
+    
     # Check if required environment variables are set
     if not DB_CONFIG['password']:
         print("ERROR: DB_PASSWORD environment variable not set!", file=sys.stderr)
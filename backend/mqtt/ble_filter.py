@@ -0,0 +1,178 @@
+"""
+Per-beacon RSSI smoothing
+Turns raw RSSI samples from the mobile app into debounced
+far/near/present state transitions, so only changes and periodic
+summaries need to be persisted
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+STATE_FAR = 0
+STATE_NEAR = 1
+STATE_PRESENT = 2
+STATE_NAMES = ("far", "near", "present")
+
+
+@dataclass
+class BeaconUpdate:
+    """Result of feeding one RSSI sample into the filter"""
+    state: str
+    previous: str
+    rssi: float             # Smoothed RSSI after this sample
+    transition: bool        # Debounced state changed
+    summary_due: bool       # Periodic summary interval elapsed
+    samples: int            # Samples seen for this (student, beacon)
+
+
+class BeaconFilterBank:
+    """
+    EMA filter state for every (student, beacon) pair
+
+    State is kept in parallel NumPy arrays indexed by a slot number, so a
+    lecture hall full of phones costs a few dozen bytes per pair and the
+    stale sweep is a single vectorized comparison.
+    """
+
+    def __init__(
+        self,
+        alpha: float,
+        near_rssi: float,
+        present_rssi: float,
+        hysteresis: float,
+        debounce: int,
+        summary_interval: float,
+        capacity: int = 1024
+    ):
+        self.alpha = alpha
+        self.near_rssi = near_rssi
+        self.present_rssi = present_rssi
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+        self.summary_interval = summary_interval
+
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Optional[Hashable]] = []
+        self._free: List[int] = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        def grow(name, dtype):
+            old = getattr(self, name, None)
+            new = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                new[:len(old)] = old
+            setattr(self, name, new)
+
+        grow("ema", np.float32)
+        grow("state", np.int8)
+        grow("pending", np.int8)
+        grow("pending_count", np.uint8)
+        grow("samples", np.uint32)
+        grow("last_seen", np.float64)
+        grow("last_summary", np.float64)
+        grow("active", np.bool_)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _slot(self, key: Hashable, rssi: float, now: float) -> int:
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot
+
+        if self._free:
+            slot = self._free.pop()
+            self._keys[slot] = key
+        else:
+            slot = len(self._keys)
+            if slot >= len(self.ema):
+                self._allocate(len(self.ema) * 2)
+            self._keys.append(key)
+
+        self._slots[key] = slot
+        self.ema[slot] = rssi
+        self.state[slot] = STATE_FAR
+        self.pending[slot] = STATE_FAR
+        self.pending_count[slot] = 0
+        self.samples[slot] = 0
+        self.last_seen[slot] = now
+        self.last_summary[slot] = now
+        self.active[slot] = True
+        return slot
+
+    def _classify(self, rssi: float, current: int) -> int:
+        target = (
+            STATE_PRESENT if rssi >= self.present_rssi
+            else STATE_NEAR if rssi >= self.near_rssi
+            else STATE_FAR
+        )
+        if target < current:
+            # Moving away needs to clear the threshold by the hysteresis margin
+            margin = self.hysteresis
+            target = (
+                STATE_PRESENT if rssi >= self.present_rssi - margin
+                else STATE_NEAR if rssi >= self.near_rssi - margin
+                else STATE_FAR
+            )
+        return target
+
+    def update(self, key: Hashable, rssi: float, now: float) -> BeaconUpdate:
+        """Feed one raw RSSI sample for (student, beacon)"""
+        slot = self._slot(key, rssi, now)
+
+        ema = self.alpha * rssi + (1.0 - self.alpha) * float(self.ema[slot])
+        self.ema[slot] = ema
+        self.samples[slot] += 1
+        self.last_seen[slot] = now
+
+        current = int(self.state[slot])
+        target = self._classify(ema, current)
+        transition = False
+
+        if target == current:
+            self.pending_count[slot] = 0
+        else:
+            if self.pending[slot] == target:
+                self.pending_count[slot] += 1
+            else:
+                self.pending[slot] = target
+                self.pending_count[slot] = 1
+            if self.pending_count[slot] >= self.debounce:
+                self.state[slot] = target
+                self.pending_count[slot] = 0
+                transition = True
+
+        summary_due = now - self.last_summary[slot] >= self.summary_interval
+        if summary_due or transition:
+            self.last_summary[slot] = now
+
+        return BeaconUpdate(
+            state=STATE_NAMES[self.state[slot]],
+            previous=STATE_NAMES[current],
+            rssi=ema,
+            transition=transition,
+            summary_due=summary_due and not transition,
+            samples=int(self.samples[slot])
+        )
+
+    def expire(self, now: float, timeout: float) -> List[Tuple[Hashable, str, float]]:
+        """
+        Release pairs not heard from within timeout
+
+        Returns (key, previous_state, smoothed_rssi) for every expired
+        pair that was not already far, i.e. an implicit far transition.
+        """
+        stale = np.flatnonzero(self.active & (now - self.last_seen >= timeout))
+        expired = []
+        for slot in stale:
+            key = self._keys[slot]
+            if self.state[slot] != STATE_FAR:
+                expired.append((key, STATE_NAMES[self.state[slot]], float(self.ema[slot])))
+            del self._slots[key]
+            self._keys[slot] = None
+            self.active[slot] = False
+            self._free.append(int(slot))
+        return expired
@@ -6,25 +6,66 @@ Publishes to Redis and processes attendance logic
 import paho.mqtt.client as mqtt
 import json
 import asyncio
+import os
+import socket
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List
 import redis.asyncio as redis
 
 from api.config import settings
+from api.log import get_logger
 from api.models import AttendanceEvent, DeviceType
+from api.redis_client import get_redis
+from mqtt import event_stream
+from mqtt.fleet import FleetCommander, record_ack
+from mqtt.lanes import Lane, LaneScheduler
+from mqtt.spool import EventSpool, SpoolReplayer, claim_spool_dir
+
+log = get_logger("mqtt.client")
 
 
 class MQTTClient:
     """MQTT client for device communication"""
     
     def __init__(self):
-        self.client = mqtt.Client()
+        # Shared subscriptions ($share/<group>/...) need MQTT v5
+        self.shared_group = settings.MQTT_SHARED_GROUP
+        self.client = mqtt.Client(
+            client_id=f"zias-{socket.gethostname()}-{os.getpid()}",
+            protocol=mqtt.MQTTv5 if self.shared_group else mqtt.MQTTv311
+        )
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
         
         self.redis_client = None
         self.connected = False
+        self.loop = None
+        
+        # Local spool for when Redis is down or slow, opened in start()
+        self.spool = None
+        self.replayer = None
+        self._spool_lock = None
+        
+        # Fleet command fan-out, started with the client
+        self.fleet = None
+        
+        # In-process consumer replacing Redis (edge gateway): async fn(events)
+        self.deliver = None
+        
+        # Prioritized ingest lanes, drained on the client's loop from start()
+        self.lanes = LaneScheduler(
+            [
+                Lane('sensor', settings.INGEST_SENSOR_CAPACITY, settings.INGEST_SENSOR_BATCH),
+                Lane('ble', settings.INGEST_BLE_CAPACITY, settings.INGEST_BLE_BATCH),
+                # Status is only a heartbeat; the next one supersedes a dropped one
+                Lane('status', settings.INGEST_STATUS_CAPACITY, settings.INGEST_STATUS_BATCH, spill=False),
+            ],
+            self.publish_events,
+            overflow=self.spill,
+            starvation_rounds=settings.INGEST_STARVATION_ROUNDS,
+            stats_interval=settings.INGEST_LANE_STATS_INTERVAL_SECONDS
+        )
         
         if settings.MQTT_USERNAME:
             self.client.username_pw_set(
@@ -32,10 +73,16 @@ class MQTTClient:
                 settings.MQTT_PASSWORD
             )
     
-    def on_connect(self, client, userdata, flags, rc):
+    def subscription(self, topic: str) -> str:
+        """Topic filter to subscribe with, shared across the ingest group if configured"""
+        if self.shared_group:
+            return f"$share/{self.shared_group}/{topic}"
+        return topic
+    
+    def on_connect(self, client, userdata, flags, rc, properties=None):
         """Callback when connected to MQTT broker"""
         if rc == 0:
-            print(f"Connected to MQTT broker at {settings.MQTT_BROKER}")
+            log.info("Connected to MQTT broker at %s", settings.MQTT_BROKER)
             self.connected = True
             
             # Subscribe to all device topics
@@ -46,15 +93,15 @@ class MQTTClient:
             ]
             
             for topic in topics:
-                client.subscribe(topic)
-                print(f"Subscribed to: {topic}")
+                client.subscribe(self.subscription(topic), qos=settings.MQTT_QOS)
+                log.info("Subscribed to: %s", self.subscription(topic))
         else:
-            print(f"Failed to connect to MQTT broker, code: {rc}")
+            log.error("Failed to connect to MQTT broker, code: %s", rc)
             self.connected = False
     
-    def on_disconnect(self, client, userdata, rc):
+    def on_disconnect(self, client, userdata, rc, properties=None):
         """Callback when disconnected"""
-        print(f"Disconnected from MQTT broker, code: {rc}")
+        log.warning("Disconnected from MQTT broker, code: %s", rc)
         self.connected = False
     
     def on_message(self, client, userdata, msg):
@@ -74,77 +121,170 @@ class MQTTClient:
                 self.handle_device_status(topic_parts[2], payload)
                 
         except json.JSONDecodeError as e:
-            print(f"Invalid JSON in MQTT message: {e}")
+            log.warning("Invalid JSON in MQTT message on %s: %s", msg.topic, e)
         except Exception as e:
-            print(f"Error processing MQTT message: {e}")
+            log.exception("Error processing MQTT message on %s", msg.topic)
     
     def handle_sensor_event(self, device_id: str, payload: Dict[str, Any]):
         """Handle RFID/PIR sensor events"""
-        print(f"Sensor event from {device_id}: {payload}")
+        log.debug("Sensor event from %s: %s", device_id, payload)
         
         # Publish to Redis for real-time processing
-        asyncio.create_task(self.publish_to_redis({
+        self.lanes.offer('sensor', {
             'type': 'sensor',
             'device_id': device_id,
-            'rfid': payload.get('id'),
+            'rfid': payload.get('rfid', payload.get('id')),
             'cluster_id': payload.get('cluster_id'),
             'sensor_active': payload.get('sensor', False),
+            # Event identity for dedup: per-boot sequence number and device clock
+            'boot': payload.get('boot'),
+            'seq': payload.get('seq'),
+            'device_ts': payload.get('timestamp'),
             'timestamp': datetime.utcnow().isoformat()
-        }))
+        })
     
     def handle_beacon_event(self, student_id: str, payload: Dict[str, Any]):
         """Handle BLE beacon events from smartphone app"""
-        print(f"BLE beacon event from {student_id}: {payload}")
+        log.debug("BLE beacon event from %s: %s", student_id, payload)
         
-        asyncio.create_task(self.publish_to_redis({
+        self.lanes.offer('ble', {
             'type': 'ble',
             'student_id': student_id,
             'beacon_uuid': payload.get('beacon_uuid'),
             'rssi': payload.get('rssi'),
             'location': payload.get('location'),
+            'event_type': payload.get('event_type', 'approaching'),
+            'app_version': payload.get('app_version', ''),
+            # Event identity for dedup: app-chosen ID and the phone's clock
+            'event_id': payload.get('event_id'),
+            'device_ts': payload.get('timestamp'),
             'timestamp': datetime.utcnow().isoformat()
-        }))
+        })
     
     def handle_device_status(self, device_id: str, payload: Dict[str, Any]):
         """Handle device status updates"""
-        print(f"Device status from {device_id}: {payload}")
+        log.debug("Device status from %s: %s", device_id, payload)
+        
+        # Command acknowledgement from a fleet job (jobs live in the central Redis)
+        if payload.get('job_id') and not settings.EDGE_MODE:
+            self.submit(self.handle_command_ack(device_id, payload))
         
         # Update device last_seen in database
-        asyncio.create_task(self.update_device_status(device_id, payload))
+        self.update_device_status(device_id, payload)
+    
+    async def handle_command_ack(self, device_id: str, payload: Dict[str, Any]):
+        """Record a device's acknowledgement of a fleet command"""
+        counted = await record_ack(
+            get_redis(),
+            payload['job_id'],
+            device_id,
+            payload.get('result', 'ok'),
+            payload.get('detail', '')
+        )
+        if not counted:
+            log.debug("Ignored ack from %s for job %s", device_id, payload['job_id'])
+    
+    def submit(self, coro):
+        """Schedule a coroutine on the owning event loop from the paho network thread"""
+        if self.loop is None:
+            coro.close()
+            log.error("MQTT client has no event loop, dropping message")
+            return
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(self._report_failure)
+    
+    @staticmethod
+    def _report_failure(future):
+        if not future.cancelled() and future.exception():
+            log.error("Error handling MQTT message: %r", future.exception())
     
     async def publish_to_redis(self, event: Dict[str, Any]):
-        """Publish event to Redis for processing"""
+        """Publish event to Redis for processing, spooling it if Redis is down or slow"""
+        await self.publish_events([event])
+    
+    async def publish_events(self, events: List[Dict[str, Any]]):
+        """Publish a batch of events to Redis, spooling them if Redis is down or slow"""
+        # The edge processor spools on its own when its store is in trouble
+        if self.deliver:
+            await self.deliver(events)
+            return
+        
+        # Keep order: while anything is spooled, new events queue behind it
+        if self.spool and self.spool.has_pending():
+            for event in events:
+                self.spool.append(event)
+            return
+        
+        try:
+            await asyncio.wait_for(
+                self.publish_batch(events),
+                timeout=settings.SPOOL_DOWNSTREAM_TIMEOUT_MS / 1000
+            )
+        except Exception as e:
+            if not self.spool:
+                raise
+            log.warning("Redis unavailable, spooling %d events: %r", len(events), e)
+            for event in events:
+                self.spool.append(event)
+    
+    def spill(self, event: Dict[str, Any]):
+        """Overflow of a full ingest lane: spool the event for replay, or drop it if there is no spool"""
+        if self.spool:
+            self.spool.append(event)
+        else:
+            log.warning("Ingest lane full and no spool, dropping %s event", event.get('type'))
+    
+    async def publish_batch(self, events: List[Dict[str, Any]]):
+        """Publish events to Redis in one pipelined round trip"""
+        if self.deliver:
+            await self.deliver(events)
+            return
+        
         if not self.redis_client:
             self.redis_client = redis.from_url(settings.REDIS_URL)
         
-        # Publish to Redis channel for real-time processing
-        await self.redis_client.publish(
-            'zias:events',
-            json.dumps(event)
-        )
-        
-        # Also store in Redis with TTL for state tracking
-        key = f"zias:state:{event.get('device_id', event.get('student_id'))}"
-        await self.redis_client.setex(
-            key,
-            settings.ATTENDANCE_WINDOW_SECONDS,
-            json.dumps(event)
-        )
+        pipe = self.redis_client.pipeline(transaction=False)
+        for event in events:
+            data = json.dumps(event)
+            
+            # Stream: one processor of the group gets it; channel: every subscriber does
+            if settings.EVENT_FEED == "stream":
+                event_stream.append(pipe, data, settings.EVENT_STREAM_MAXLEN)
+            else:
+                pipe.publish('zias:events', data)
+        await pipe.execute()
     
-    async def update_device_status(self, device_id: str, status: Dict[str, Any]):
-        """Update device status in database"""
-        # TODO: Implement database update
-        pass
+    def update_device_status(self, device_id: str, status: Dict[str, Any]):
+        """Forward a status message to the processor, which tracks liveness and batches the writes"""
+        self.lanes.offer('status', {
+            'type': 'status',
+            'device_id': device_id,
+            'status': status.get('status'),
+            'ip': status.get('ip'),
+            'has_rfid': status.get('has_rfid'),
+            'has_pir': status.get('has_pir'),
+            'has_ble': status.get('has_ble'),
+            'timestamp': datetime.utcnow().isoformat()
+        })
     
-    def publish(self, topic: str, payload: Dict[str, Any]):
+    def publish(self, topic: str, payload: Dict[str, Any], qos: int = 0):
         """Publish message to MQTT topic"""
         self.client.publish(
             f"{settings.MQTT_TOPIC_PREFIX}/{topic}",
-            json.dumps(payload)
+            json.dumps(payload),
+            qos=qos
         )
     
-    def start(self):
-        """Start MQTT client"""
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        """
+        Start MQTT client
+        
+        Args:
+            loop: Event loop that handles messages (defaults to the running loop)
+        """
+        self.loop = loop or asyncio.get_running_loop()
+        self.start_spool()
+        asyncio.run_coroutine_threadsafe(self.lanes.run(), self.loop)
         try:
             self.client.connect(
                 settings.MQTT_BROKER,
@@ -152,15 +292,53 @@ class MQTTClient:
                 keepalive=60
             )
             self.client.loop_start()
-            print("MQTT client started")
+            if not settings.EDGE_MODE:
+                self.start_fleet()
+            log.info("MQTT client started")
         except Exception as e:
-            print(f"Failed to start MQTT client: {e}")
+            log.error("Failed to start MQTT client: %s", e)
+    
+    def start_spool(self):
+        """Open the local spool and start replaying it on the client's loop"""
+        directory, self._spool_lock = claim_spool_dir(settings.SPOOL_DIR, "ingest")
+        self.spool = EventSpool(
+            directory,
+            segment_bytes=settings.SPOOL_SEGMENT_BYTES,
+            fsync_every=settings.SPOOL_FSYNC_EVERY,
+            fsync_interval_ms=settings.SPOOL_FSYNC_INTERVAL_MS
+        )
+        self.replayer = SpoolReplayer(
+            self.spool,
+            self.publish_batch,
+            batch_size=settings.SPOOL_REPLAY_BATCH_SIZE,
+            max_events_per_second=settings.SPOOL_REPLAY_MAX_EVENTS_PER_SECOND,
+            interval_seconds=settings.SPOOL_REPLAY_INTERVAL_SECONDS
+        )
+        asyncio.run_coroutine_threadsafe(self.replayer.run(), self.loop)
+        log.info("Spooling to %s", directory)
+    
+    def start_fleet(self):
+        """Start publishing queued fleet command jobs on the client's loop"""
+        self.fleet = FleetCommander(
+            get_redis(),
+            lambda topic, message: self.publish(topic, message, qos=1),
+            rate_per_second=settings.FLEET_PUBLISH_RATE,
+            burst=settings.FLEET_PUBLISH_BURST
+        )
+        asyncio.run_coroutine_threadsafe(self.fleet.run(), self.loop)
     
     def stop(self):
         """Stop MQTT client"""
+        if self.fleet:
+            self.fleet.stop()
         self.client.loop_stop()
         self.client.disconnect()
-        print("MQTT client stopped")
+        self.lanes.stop()
+        if self.replayer:
+            self.replayer.stop()
+        if self.spool:
+            self.spool.close()
+        log.info("MQTT client stopped")
     
     def is_connected(self) -> bool:
         """Check if connected to broker"""
@@ -0,0 +1,163 @@
+"""
+Event deduplication
+Redelivered events (broker QoS 1, ingest retries, spool replays) carry
+the same identity as the original. The processor checks identities
+against a time-bucketed index of 64-bit digests before any database
+work; whole buckets are dropped as the horizon moves on, so memory is
+bounded by the horizon times the event rate. New digests are written
+through to Redis in batches and reloaded on start, so the check
+survives restarts.
+"""
+
+import hashlib
+import json
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import redis.asyncio as redis
+
+BUCKET_KEY_PREFIX = "zias:dedup"
+CLAIM_KEY_PREFIX = "zias:dedup:claim"
+
+
+def event_identity(event: dict) -> str:
+    """
+    Identity of an event, stable across redeliveries
+
+    An explicit event_id wins, then the device's (boot, seq) counter.
+    Otherwise the content is hashed; the ingest timestamp only takes
+    part when the device sent no timestamp of its own, since a broker
+    redelivery is stamped again on arrival.
+    """
+    if event.get('event_id'):
+        return str(event['event_id'])
+    if event.get('seq') is not None:
+        return f"{event.get('type')}:{event.get('device_id')}:{event.get('boot', '')}:{event['seq']}"
+
+    device_clock = event.get('device_ts') is not None
+    fields = {k: v for k, v in event.items() if not (k == 'timestamp' and device_clock)}
+    return hashlib.blake2b(json.dumps(fields, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+
+def digest(identity: str) -> int:
+    """64-bit digest an identity is stored as"""
+    return int.from_bytes(hashlib.blake2b(identity.encode(), digest_size=8).digest(), "big")
+
+
+class DedupIndex:
+    """
+    Seen event identities for the last horizon_seconds
+
+    Digests are kept in one set per bucket of bucket_seconds; a digest
+    counts as seen while any live bucket holds it. Expiry is by bucket,
+    so an identity is remembered for between horizon - bucket and
+    horizon seconds.
+    """
+
+    def __init__(self, horizon_seconds: float, bucket_seconds: float = 60.0):
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = max(1, int(horizon_seconds // bucket_seconds))
+        self.horizon = self.bucket_count * bucket_seconds
+        self._buckets: Dict[int, Set[int]] = {}
+        self._unflushed: Dict[int, List[int]] = {}
+        self.accepted = 0
+        self.duplicates = 0
+
+    def _bucket(self, now: float) -> int:
+        return int(now // self.bucket_seconds)
+
+    def _expire(self, current: int):
+        oldest = current - self.bucket_count + 1
+        for bucket in [b for b in self._buckets if b < oldest]:
+            del self._buckets[bucket]
+            self._unflushed.pop(bucket, None)
+
+    def check_and_add(self, identity: str, now: Optional[float] = None) -> bool:
+        """
+        Record an identity
+
+        Returns:
+            True if it was already seen within the horizon (a duplicate)
+        """
+        if now is None:
+            now = time.time()
+        current = self._bucket(now)
+        if current not in self._buckets:
+            self._expire(current)
+            self._buckets[current] = set()
+
+        value = digest(identity)
+        if any(value in digests for digests in self._buckets.values()):
+            self.duplicates += 1
+            return True
+
+        self._buckets[current].add(value)
+        self._unflushed.setdefault(current, []).append(value)
+        self.accepted += 1
+        return False
+
+    async def load(self, client: redis.Redis, now: Optional[float] = None):
+        """Seed the index from the buckets persisted in Redis"""
+        if now is None:
+            now = time.time()
+        current = self._bucket(now)
+        buckets = range(current - self.bucket_count + 1, current + 1)
+
+        pipe = client.pipeline(transaction=False)
+        for bucket in buckets:
+            pipe.smembers(f"{BUCKET_KEY_PREFIX}:{bucket}")
+        for bucket, members in zip(buckets, await pipe.execute()):
+            if members:
+                self._buckets.setdefault(bucket, set()).update(int(m, 16) for m in members)
+
+    async def flush(self, client: redis.Redis):
+        """Write digests added since the last flush to Redis"""
+        unflushed, self._unflushed = self._unflushed, {}
+        if not unflushed:
+            return
+
+        pipe = client.pipeline(transaction=False)
+        for bucket, values in unflushed.items():
+            key = f"{BUCKET_KEY_PREFIX}:{bucket}"
+            pipe.sadd(key, *(f"{v:016x}" for v in values))
+            pipe.expireat(key, int((bucket + 1) * self.bucket_seconds + self.horizon))
+        try:
+            await pipe.execute()
+        except Exception:
+            # Retry with the next flush, unless the bucket has expired by then
+            for bucket, values in unflushed.items():
+                if bucket in self._buckets:
+                    self._unflushed.setdefault(bucket, [])[:0] = values
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "tracked_ids": sum(len(digests) for digests in self._buckets.values())
+        }
+
+
+async def claim_event(client: redis.Redis, identity: str, ttl_seconds: int) -> Tuple[bool, Optional[str]]:
+    """
+    Claim an identity for processes without a local index (API workers)
+
+    Returns:
+        (True, None) if this caller claimed it, else (False, value) where
+        value is what the first claimant settled it with, or None if it
+        is still in flight
+    """
+    key = f"{CLAIM_KEY_PREFIX}:{identity}"
+    if await client.set(key, "", nx=True, ex=ttl_seconds):
+        return True, None
+    return False, await client.get(key) or None
+
+
+async def settle_claim(client: redis.Redis, identity: str, value: str):
+    """Store the outcome of a claimed event for later duplicates to return"""
+    await client.set(f"{CLAIM_KEY_PREFIX}:{identity}", value, xx=True, keepttl=True)
+
+
+async def release_claim(client: redis.Redis, identity: str):
+    """Give up a claim whose event failed, so a retry can be processed"""
+    await client.delete(f"{CLAIM_KEY_PREFIX}:{identity}")
@@ -0,0 +1,89 @@
+"""
+Edge gateway entry point
+Runs MQTT ingest and the event processor in one process against the
+embedded SQLite store, so entry/exit decisions are made on site without
+a round trip to the central MySQL or Redis. Events go from the MQTT
+lanes straight to the processor; matching and dedup stay in memory.
+Recorded rows are synced upstream by mqtt.edge_sync.
+
+Usage:
+    EDGE_MODE=true EDGE_SITE_ID=block-a \
+    EDGE_UPSTREAM_URL=https://zias.example.edu/api/v1 python -m mqtt.edge
+"""
+
+import asyncio
+import signal
+import socket
+
+from api.config import settings
+from api.database import init_db
+from api.log import get_logger, setup_logging
+from mqtt.client import mqtt_client
+from mqtt.edge_sync import EdgeSync
+from mqtt.event_processor import EventProcessor
+
+log = get_logger("mqtt.edge")
+
+# Processor index rebuilt when a pulled table changes
+PULLED_INDEXES = {"user_devices": "topology", "beacons": "geofence"}
+
+
+async def main():
+    """Main entry point"""
+    if not settings.EDGE_MODE:
+        log.error("EDGE_MODE is not set; refusing to run the edge gateway against the central database")
+        return
+
+    init_db()
+    processor = EventProcessor()
+
+    def reload_pulled(table: str):
+        if table in PULLED_INDEXES:
+            processor.reload_indexes(PULLED_INDEXES[table])
+
+    sync = None
+    if settings.EDGE_UPSTREAM_URL:
+        sync = EdgeSync(
+            settings.EDGE_UPSTREAM_URL,
+            settings.EDGE_SITE_ID or socket.gethostname(),
+            token=settings.EDGE_UPSTREAM_TOKEN,
+            push_interval=settings.EDGE_PUSH_INTERVAL_SECONDS,
+            push_batch_size=settings.EDGE_PUSH_BATCH_SIZE,
+            pull_interval=settings.EDGE_PULL_INTERVAL_SECONDS,
+            pull_batch_size=settings.EDGE_PULL_BATCH_SIZE,
+            retention_days=settings.EDGE_RETENTION_DAYS,
+            on_pulled=reload_pulled
+        )
+        sync.open()
+        # Students and devices first, so a fresh gateway can match from its first tap
+        try:
+            await asyncio.to_thread(sync.pull_all)
+        except Exception as e:
+            log.warning("Initial pull failed, starting from the local store: %s", e)
+    else:
+        log.warning("EDGE_UPSTREAM_URL not set, events stay in %s", settings.EDGE_DB_PATH)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    processor.start_local()
+    mqtt_client.deliver = processor.process_events
+    mqtt_client.start(loop)
+    sync_task = asyncio.create_task(sync.run()) if sync else None
+    log.info("ZIAS edge gateway started (store: %s)", settings.EDGE_DB_PATH)
+
+    await stop_event.wait()
+
+    log.info("Shutting down")
+    mqtt_client.stop()
+    if sync_task:
+        sync.stop()
+        sync_task.cancel()
+    await processor.stop()
+
+
+if __name__ == "__main__":
+    setup_logging("edge")
+    asyncio.run(main())
@@ -0,0 +1,332 @@
+"""
+Edge gateway sync
+An edge gateway records sensor_data, ble_events and entry_log in its
+local SQLite store. The sync engine ships those rows upstream in gzip'd
+JSON batches in local row ID order, and pulls students, devices and
+beacons down by an (updated_at, key) cursor. The central API keeps each
+edge store's upload position in edge_checkpoints and skips rows at or
+below it, so a batch resent after a crash is applied once.
+"""
+
+import asyncio
+import enum
+import gzip
+import json
+import math
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import DateTime, Enum, and_, insert, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from api.database import get_db_session
+from api.db_models import BLEEvent, Beacon, EdgeCheckpoint, EntryLog, SensorData, Student, UserDevice
+from api.log import get_logger
+
+log = get_logger("mqtt.edge_sync")
+
+# Uploaded tables, with the time column used for local pruning
+UPLOAD_TABLES = {
+    "sensor_data": (SensorData, SensorData.time_stamp),
+    "ble_events": (BLEEvent, BLEEvent.timestamp),
+    "entry_log": (EntryLog, EntryLog.timestamp),
+}
+
+# Pulled tables; columns the gateway maintains itself are never overwritten
+PULL_TABLES = {
+    "student": Student,
+    "user_devices": UserDevice,
+    "beacons": Beacon,
+}
+LOCAL_COLUMNS = {
+    "user_devices": {"last_seen", "status", "ip_address", "has_rfid", "has_pir", "has_ble"},
+}
+
+STORE_MARKER = "store"
+
+
+def encode_value(value):
+    """JSON-safe column value: datetimes as ISO strings, enums by name (as the Enum columns store them)"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.name
+    return value
+
+
+def decode_row(model, row: dict) -> dict:
+    """Inverse of encode_value for one row; columns the model lacks are dropped"""
+    columns = model.__table__.columns
+    decoded = {}
+    for name, value in row.items():
+        column = columns.get(name)
+        if column is None:
+            continue
+        if value is not None:
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, Enum) and column.type.enum_class:
+                value = column.type.enum_class[value]
+        decoded[name] = value
+    return decoded
+
+
+def get_position(db: Session, site_id: str, store_id: str, table_name: str) -> Optional[str]:
+    checkpoint = db.get(EdgeCheckpoint, (site_id, store_id, table_name))
+    return checkpoint.position if checkpoint else None
+
+
+def set_position(db: Session, site_id: str, store_id: str, table_name: str, position: str):
+    db.merge(EdgeCheckpoint(site_id=site_id, store_id=store_id, table_name=table_name, position=position))
+
+
+def local_store_id(db: Session, site_id: str) -> str:
+    """ID of this gateway's store, created with the store"""
+    row = db.query(EdgeCheckpoint.store_id).filter(
+        EdgeCheckpoint.site_id == site_id,
+        EdgeCheckpoint.table_name == STORE_MARKER
+    ).first()
+    if row:
+        return row[0]
+    store_id = uuid.uuid4().hex
+    set_position(db, site_id, store_id, STORE_MARKER, datetime.utcnow().isoformat())
+    db.commit()
+    return store_id
+
+
+def apply_upload(db: Session, batch: dict) -> int:
+    """
+    Insert an uploaded batch (central side)
+
+    Rows at or below the store's recorded position were applied by an
+    earlier upload and are skipped. Local row IDs are not kept.
+
+    Returns:
+        Rows inserted
+    """
+    model, _ = UPLOAD_TABLES[batch["table"]]
+    checkpoint = db.query(EdgeCheckpoint).filter(
+        EdgeCheckpoint.site_id == batch["site_id"],
+        EdgeCheckpoint.store_id == batch["store_id"],
+        EdgeCheckpoint.table_name == batch["table"]
+    ).with_for_update().first()
+    position = int(checkpoint.position) if checkpoint else 0
+
+    rows = []
+    for values in batch["rows"]:
+        row = dict(zip(batch["columns"], values))
+        if row.pop("id") > position:
+            rows.append(decode_row(model, row))
+    if rows:
+        db.execute(insert(model), rows)
+
+    last_id = str(max(position, batch["last_id"]))
+    if checkpoint:
+        checkpoint.position = last_id
+    else:
+        db.add(EdgeCheckpoint(
+            site_id=batch["site_id"],
+            store_id=batch["store_id"],
+            table_name=batch["table"],
+            position=last_id
+        ))
+    db.commit()
+    return len(rows)
+
+
+def changes_since(db: Session, table: str, cursor: Optional[str], limit: int) -> Tuple[List[dict], Optional[str]]:
+    """
+    Rows of a pulled table changed after cursor (central side)
+
+    Returns:
+        (encoded rows, cursor to pass next time)
+    """
+    model = PULL_TABLES[table]
+    key = list(model.__table__.primary_key)[0]
+    query = db.query(model.__table__)
+    if cursor:
+        updated, _, last_key = cursor.partition("|")
+        updated = datetime.fromisoformat(updated)
+        query = query.filter(or_(
+            model.updated_at > updated,
+            and_(model.updated_at == updated, key > last_key)
+        ))
+    rows = query.order_by(model.updated_at, key).limit(limit).all()
+    if not rows:
+        return [], cursor
+
+    encoded = [{name: encode_value(value) for name, value in row._mapping.items()} for row in rows]
+    last = rows[-1]._mapping
+    return encoded, f"{last['updated_at'].isoformat()}|{last[key.name]}"
+
+
+def apply_changes(db: Session, table: str, rows: List[dict]):
+    """Upsert pulled rows into the local store (edge side)"""
+    model = PULL_TABLES[table]
+    rows = [decode_row(model, row) for row in rows]
+    keys = [column.name for column in model.__table__.primary_key]
+    keep = LOCAL_COLUMNS.get(table, set()) | set(keys)
+
+    stmt = sqlite_insert(model.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: stmt.excluded[name] for name in rows[0] if name not in keep}
+    )
+    db.execute(stmt, rows)
+
+
+class EdgeSync:
+    """Background upload of local events and pull of reference tables"""
+
+    def __init__(
+        self,
+        upstream_url: str,
+        site_id: str,
+        token: str = "",
+        push_interval: float = 10.0,
+        push_batch_size: int = 5000,
+        pull_interval: float = 300.0,
+        pull_batch_size: int = 1000,
+        retention_days: int = 7,
+        on_pulled: Optional[Callable[[str], None]] = None
+    ):
+        self.upstream_url = upstream_url.rstrip("/")
+        self.site_id = site_id
+        self.token = token
+        self.push_interval = push_interval
+        self.push_batch_size = push_batch_size
+        self.pull_interval = pull_interval
+        self.pull_batch_size = pull_batch_size
+        self.retention_days = retention_days
+        self.on_pulled = on_pulled
+        self.store_id = None
+        self._running = False
+
+    def open(self):
+        with get_db_session() as db:
+            self.store_id = local_store_id(db, self.site_id)
+        log.info("Edge store %s for site %s", self.store_id, self.site_id)
+
+    def _request(self, method: str, path: str, body: bytes = None, headers: Dict[str, str] = None) -> dict:
+        request = urllib.request.Request(self.upstream_url + path, data=body, method=method)
+        request.add_header("Accept", "application/json")
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        for name, value in (headers or {}).items():
+            request.add_header(name, value)
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+
+    def push(self, table: str) -> int:
+        """Upload the next batch of a table; returns rows sent (0 once caught up)"""
+        model, _ = UPLOAD_TABLES[table]
+        with get_db_session() as db:
+            position = int(get_position(db, self.site_id, self.store_id, table) or 0)
+            rows = db.execute(
+                model.__table__.select().where(model.id > position).order_by(model.id).limit(self.push_batch_size)
+            ).all()
+        if not rows:
+            return 0
+
+        columns = list(rows[0]._fields)
+        batch = {
+            "site_id": self.site_id,
+            "store_id": self.store_id,
+            "table": table,
+            "columns": columns,
+            "rows": [[encode_value(value) for value in row] for row in rows],
+            "first_id": rows[0].id,
+            "last_id": rows[-1].id
+        }
+        self._request(
+            "POST", "/edge/batches",
+            gzip.compress(json.dumps(batch).encode()),
+            {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        )
+
+        # Moved only once upstream has the batch; a crash in between resends it, and upstream skips it
+        with get_db_session() as db:
+            set_position(db, self.site_id, self.store_id, table, str(batch["last_id"]))
+            db.commit()
+        return len(rows)
+
+    def push_all(self) -> int:
+        sent = 0
+        for table in UPLOAD_TABLES:
+            while True:
+                count = self.push(table)
+                sent += count
+                if count < self.push_batch_size:
+                    break
+        if sent:
+            log.info("Uploaded %d rows", sent)
+        return sent
+
+    def pull(self, table: str) -> int:
+        """Fetch and apply a table's changes since the last pull"""
+        name = f"pull:{table}"
+        with get_db_session() as db:
+            cursor = get_position(db, self.site_id, self.store_id, name)
+
+        total = 0
+        while True:
+            params = {"limit": self.pull_batch_size}
+            if cursor:
+                params["after"] = cursor
+            result = self._request("GET", f"/edge/changes/{table}?{urllib.parse.urlencode(params)}")
+            rows = result["rows"]
+            if rows:
+                cursor = result["cursor"]
+                with get_db_session() as db:
+                    apply_changes(db, table, rows)
+                    set_position(db, self.site_id, self.store_id, name, cursor)
+                    db.commit()
+                total += len(rows)
+            if len(rows) < self.pull_batch_size:
+                return total
+
+    def pull_all(self) -> Set[str]:
+        """Pull every reference table; returns the tables that changed"""
+        changed = set()
+        for table in PULL_TABLES:
+            count = self.pull(table)
+            if count:
+                log.info("Pulled %d %s rows", count, table)
+                changed.add(table)
+        return changed
+
+    def prune(self):
+        """Delete uploaded rows past the retention period"""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        with get_db_session() as db:
+            for table, (model, time_column) in UPLOAD_TABLES.items():
+                position = int(get_position(db, self.site_id, self.store_id, table) or 0)
+                # The row at the position stays, so SQLite never reuses its ID for a new row
+                db.query(model).filter(model.id < position, time_column < cutoff).delete(synchronize_session=False)
+            db.commit()
+
+    async def run(self):
+        """Push every push_interval, pull and prune every pull_interval"""
+        self._running = True
+        last_pull = -math.inf
+        while self._running:
+            try:
+                if time.monotonic() - last_pull >= self.pull_interval:
+                    changed = await asyncio.to_thread(self.pull_all)
+                    last_pull = time.monotonic()
+                    if self.on_pulled:
+                        for table in changed:
+                            self.on_pulled(table)
+                    await asyncio.to_thread(self.prune)
+                await asyncio.to_thread(self.push_all)
+            except Exception as e:
+                log.warning("Edge sync failed, will retry: %s", e)
+            await asyncio.sleep(self.push_interval)
+
+    def stop(self):
+        self._running = False
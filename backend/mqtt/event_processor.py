@@ -5,13 +5,37 @@ Runs as separate process/container
 
 import asyncio
 import json
+import os
+import socket
+import time
 import redis.asyncio as redis
 from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from sqlalchemy.exc import InterfaceError, OperationalError
 from sqlalchemy.orm import Session
 
 from api.config import settings
-from api.database import get_db_session
-from api.db_models import SensorData, EntryLog, BLEEvent, Student, UserDevice
+from api.log import get_logger, setup_logging
+from api.database import engine, get_db_session
+from api.db_models import SensorData, EntryLog, BLEEvent, Student, UserDevice, DeviceStatusEnum
+from mqtt.suppression import TTLSuppressor
+from mqtt.dedup import DedupIndex, event_identity
+from mqtt.ble_filter import BeaconFilterBank
+from mqtt.geofence import GeofenceIndex
+from mqtt.topology import DeviceTopology
+from mqtt.spool import EventSpool, SpoolReplayer, claim_spool_dir
+from mqtt.matching import Tap, TapMatcher
+from mqtt.redis_matcher import RedisTapMatcher
+from mqtt.event_stream import EventStreamReader
+from mqtt.liveness import LivenessTracker, parse_timeouts, utc_from_timestamp
+from api.redis_client import RELOAD_CHANNEL
+from api.presence import presence_index
+from api.roster import RosterScheduler
+from api.partitions import partition_manager
+from api.occupancy import OccupancySnapshotter
+from api.occupancy_series import occupancy_series
+
+log = get_logger("mqtt.processor")
 
 
 class EventProcessor:
@@ -20,165 +44,871 @@ class EventProcessor:
     def __init__(self):
         self.redis_client = None
         self.pubsub = None
+        self.reload_task = None  # Reload listener when events come from the stream
+        
+        # Repeat suppression: card held on a reader, app re-sending a report
+        self.rfid_suppressor = TTLSuppressor(settings.ANTI_TAILGATING_DELAY_SECONDS)
+        self.ble_suppressor = TTLSuppressor(settings.BLE_TIMEOUT_SECONDS)
+        self._last_stats_report = time.monotonic()
+        
+        # Exact redeliveries (QoS 1, retries, spool replays), persisted to Redis
+        self.dedup = DedupIndex(settings.DEDUP_HORIZON_SECONDS, settings.DEDUP_BUCKET_SECONDS)
+        self.dedup_task = None
+        
+        # Presence bitmaps follow entry_log (needs Redis, so not on edge gateways)
+        self.presence = None
+        self.presence_task = None
+        
+        # Timetable sessions reconciled against entry_log as they close (central database only)
+        self.roster = RosterScheduler(
+            interval=settings.ROSTER_RECONCILE_SECONDS,
+            settle_seconds=settings.ROSTER_SETTLE_SECONDS,
+            catch_up_days=settings.ROSTER_CATCH_UP_DAYS,
+            early_minutes=settings.ROSTER_EARLY_MINUTES,
+            campus_timezone=settings.CAMPUS_TIMEZONE
+        )
+        self.roster_task = None
+        
+        # Day/month partitions made ahead and purged past retention (MySQL only)
+        self.partitions = partition_manager(engine)
+        self.partitions_task = None
+        
+        # Periodic per-room occupancy snapshots for point-in-time queries
+        self.occupancy = OccupancySnapshotter(
+            interval_minutes=settings.OCCUPANCY_SNAPSHOT_MINUTES,
+            settle_seconds=settings.OCCUPANCY_SETTLE_SECONDS,
+            max_stay_hours=settings.OCCUPANCY_MAX_STAY_HOURS,
+            retention_days=settings.OCCUPANCY_RETENTION_DAYS,
+            check_seconds=settings.OCCUPANCY_CHECK_SECONDS
+        )
+        self.occupancy_task = None
+        
+        # Per-minute occupancy rings in Redis for dashboards
+        self.series = None
+        self.series_task = None
+        
+        # RSSI smoothing per (student, beacon)
+        self.beacon_filters = BeaconFilterBank(
+            alpha=settings.BLE_RSSI_EMA_ALPHA,
+            near_rssi=settings.BLE_RSSI_NEAR_DBM,
+            present_rssi=settings.BLE_RSSI_PRESENT_DBM,
+            hysteresis=settings.BLE_RSSI_HYSTERESIS_DB,
+            debounce=settings.BLE_STATE_DEBOUNCE_SAMPLES,
+            summary_interval=settings.BLE_SUMMARY_INTERVAL_SECONDS
+        )
+        self.beacon_sweep_task = None
+        self._far_pending = []  # Implicit far rows not yet written (database down)
+        
+        # Beacon positions for room resolution and geofence checks
+        self.geofence = GeofenceIndex(settings.BLE_GEOFENCE_RADIUS_METERS)
+        
+        # Cluster -> devices, direction role and room
+        self.topology = DeviceTopology()
+        
+        # Entry/exit pairing of RFID taps; swapped for the Redis matcher
+        # in start() when MATCHER_BACKEND is "redis"
+        self.matcher = TapMatcher(settings.ATTENDANCE_WINDOW_SECONDS)
+        self.redis_matcher = None
+        
+        # Local spool for when MySQL is down or slow
+        self.spool = None
+        self.replayer = None
+        self.replay_task = None
+        self._spool_lock = None
+        self.spooling_until = 0.0
+        
+        # Online/offline per device; DB writes and events are batched
+        self.liveness = LivenessTracker(
+            parse_timeouts(settings.DEVICE_LIVENESS_TIMEOUTS),
+            settings.DEVICE_LIVENESS_DEFAULT_SECONDS,
+            now=time.time()
+        )
+        self.liveness_task = None
+        self._seen_updates = {}
+        self._went_online = []
+        self._went_offline = []
         
     async def start(self):
         """Start event processor"""
-        print("Starting event processor...")
+        log.info("Starting event processor")
+        
+        # Every processor hears every pub/sub event, so replicas would each record every tap
+        if settings.MATCHER_BACKEND == "redis" and settings.EVENT_FEED != "stream":
+            raise RuntimeError("MATCHER_BACKEND=redis needs EVENT_FEED=stream")
+        
+        self.start_local()
         
         # Connect to Redis
         self.redis_client = redis.from_url(settings.REDIS_URL)
         self.pubsub = self.redis_client.pubsub()
         
-        # Subscribe to event channel
-        await self.pubsub.subscribe('zias:events')
+        try:
+            await self.dedup.load(self.redis_client)
+        except Exception as e:
+            log.warning("Could not load dedup index from Redis: %s", e)
+        self.dedup_task = asyncio.create_task(self.run_dedup_flush())
+        
+        self.presence = presence_index(self.redis_client)
+        self.presence_task = asyncio.create_task(self.run_presence_sync())
+        self.roster_task = asyncio.create_task(self.roster.run())
+        self.partitions_task = asyncio.create_task(self.partitions.run())
+        self.occupancy_task = asyncio.create_task(self.occupancy.run())
+        self.series = occupancy_series(self.redis_client)
+        self.series_task = asyncio.create_task(self.run_occupancy_series())
+        
+        if settings.MATCHER_BACKEND == "redis":
+            self.redis_matcher = RedisTapMatcher(self.redis_client, settings.ATTENDANCE_WINDOW_SECONDS)
+            log.info("Matching entry/exit pairs in Redis")
         
-        print(f"Subscribed to Redis channel: zias:events")
-        print("Event processor ready!")
+        if settings.EVENT_FEED == "stream":
+            await self.pubsub.subscribe(RELOAD_CHANNEL)
+            self.reload_task = asyncio.create_task(self.listen_reloads())
+            await self.consume_stream()
+            return
+        
+        # Subscribe to event and index reload channels
+        await self.pubsub.subscribe('zias:events', RELOAD_CHANNEL)
+        
+        log.info("Subscribed to Redis channels: zias:events, %s", RELOAD_CHANNEL)
+        log.info("Event processor ready")
         
         # Process events
         async for message in self.pubsub.listen():
-            if message['type'] == 'message':
+            if message['type'] != 'message':
+                continue
+            if message['channel'] == RELOAD_CHANNEL.encode():
+                await self.handle_reload(message['data'])
+            else:
                 await self.process_event(message['data'])
     
+    async def listen_reloads(self):
+        """Handle index reload notifications (stream feed; events come from the stream)"""
+        async for message in self.pubsub.listen():
+            if message['type'] == 'message':
+                await self.handle_reload(message['data'])
+    
+    async def consume_stream(self):
+        """Process events from the shared stream as one consumer of the processor group"""
+        reader = EventStreamReader(
+            self.redis_client,
+            f"{socket.gethostname()}-{os.getpid()}",
+            batch=settings.EVENT_STREAM_BATCH,
+            claim_idle_seconds=settings.EVENT_STREAM_CLAIM_IDLE_SECONDS
+        )
+        await reader.ensure_group()
+        log.info("Reading events from the Redis stream as %s", reader.consumer)
+        log.info("Event processor ready")
+        
+        while True:
+            try:
+                entries = await reader.read()
+            except redis.RedisError as e:
+                log.warning("Event stream read failed, will retry: %s", e)
+                await asyncio.sleep(1)
+                continue
+            
+            # Handled means stored or spooled, so the entries can be acknowledged
+            for _, data in entries:
+                await self.process_event(data)
+            try:
+                await reader.ack([entry_id for entry_id, _ in entries])
+            except redis.RedisError as e:
+                log.warning("Event stream ack failed, entries will be redelivered: %s", e)
+    
+    def start_local(self):
+        """
+        Load indexes and start the spool and liveness tracking
+        
+        All start() needs besides Redis; the edge gateway calls only this
+        and feeds events through process_events, so matching and dedup stay
+        in memory.
+        """
+        self.reload_indexes()
+        self.start_spool()
+        self.load_liveness()
+        self.liveness_task = asyncio.create_task(self.run_liveness())
+        self.beacon_sweep_task = asyncio.create_task(self.run_beacon_sweep())
+    
+    def reload_indexes(self, target: str = None):
+        """Rebuild in-memory indexes from the database (all if target is None)"""
+        with get_db_session() as db:
+            if target in (None, 'geofence'):
+                self.geofence.reload(db)
+            if target in (None, 'topology'):
+                self.topology.reload(db)
+    
+    def start_spool(self):
+        """Open the local spool and start replaying it in the background"""
+        directory, self._spool_lock = claim_spool_dir(settings.SPOOL_DIR, "processor")
+        self.spool = EventSpool(
+            directory,
+            segment_bytes=settings.SPOOL_SEGMENT_BYTES,
+            fsync_every=settings.SPOOL_FSYNC_EVERY,
+            fsync_interval_ms=settings.SPOOL_FSYNC_INTERVAL_MS
+        )
+        self.replayer = SpoolReplayer(
+            self.spool,
+            self.process_batch,
+            batch_size=settings.SPOOL_REPLAY_BATCH_SIZE,
+            max_events_per_second=settings.SPOOL_REPLAY_MAX_EVENTS_PER_SECOND,
+            interval_seconds=settings.SPOOL_REPLAY_INTERVAL_SECONDS
+        )
+        self.replay_task = asyncio.create_task(self.replayer.run())
+        log.info("Spooling to %s", directory)
+    
+    async def handle_reload(self, data: bytes):
+        """Handle a reload notification published by the API; the queries run off the event loop"""
+        try:
+            await asyncio.to_thread(self.reload_indexes, json.loads(data.decode()).get('target'))
+        except Exception as e:
+            log.error("Error reloading indexes: %s", e)
+    
     async def process_event(self, data: bytes):
         """Process individual event"""
         try:
             event = json.loads(data.decode())
+        except ValueError as e:
+            log.warning("Invalid event JSON: %s", e)
+            return
+        await self.handle_event(event)
+    
+    async def process_events(self, events: list):
+        """Process decoded events in order (in-process delivery from the MQTT client in edge mode)"""
+        for event in events:
+            await self.handle_event(event)
+    
+    async def handle_event(self, event: dict):
+        """Process one decoded event"""
+        try:
             event_type = event.get('type')
             
+            self.maybe_report_stats()
+            
+            # Any message from a device proves it is alive, repeats included
             if event_type == 'sensor':
-                await self.process_sensor_event(event)
-            elif event_type == 'ble':
-                await self.process_ble_event(event)
-            else:
-                print(f"Unknown event type: {event_type}")
+                self.device_seen(event.get('device_id'))
+            elif event_type == 'status':
+                self.handle_device_status(event)
+                return
+            elif event_type == 'device':
+                return  # Our own online/offline notifications
+            
+            if self.dedup.check_and_add(event_identity(event)):
+                log.debug("Duplicate event dropped: %s", event)
+                return
+            
+            if self.is_repeat(event):
+                return
+            
+            if event_type not in ['sensor', 'ble']:
+                log.warning("Unknown event type: %s", event_type)
+                return
+            
+            # Keep order: while anything is spooled, new events queue behind it
+            if self.spool and (self.spool.has_pending() or time.monotonic() < self.spooling_until):
+                self.spool.append(event)
+                return
+            
+            started = time.monotonic()
+            try:
+                if event_type == 'sensor':
+                    await self.process_sensor_event(event)
+                else:
+                    await self.process_ble_event(event)
+            except (OperationalError, InterfaceError) as e:
+                if not self.spool:
+                    raise
+                log.warning("Database unavailable, spooling event: %s", e)
+                self.spool.append(event)
+                self.spooling_until = time.monotonic() + settings.SPOOL_SLOW_BACKOFF_SECONDS
+                return
+            
+            # Too slow: spool for a while and let the replayer write in bulk
+            if self.spool and time.monotonic() - started > settings.SPOOL_DOWNSTREAM_TIMEOUT_MS / 1000:
+                log.warning("Database slow, spooling events for bulk replay")
+                self.spooling_until = time.monotonic() + settings.SPOOL_SLOW_BACKOFF_SECONDS
                 
         except Exception as e:
-            print(f"Error processing event: {e}")
+            log.exception("Error processing event")
+    
+    async def process_batch(self, events: list):
+        """
+        Process a batch of events in one session and one commit
+        
+        Used by the spool replayer. Connection errors propagate so the
+        batch stays spooled; if the batch fails for any other reason it
+        is retried event by event and bad events are dropped.
+        """
+        try:
+            with get_db_session() as db:
+                try:
+                    for event in events:
+                        await self.apply_event(db, event)
+                    db.commit()
+                except Exception:
+                    await self.withdraw_offers(db)
+                    raise
+            return
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception as e:
+            log.warning("Batch of %d failed (%s), retrying individually", len(events), e)
+        
+        for event in events:
+            try:
+                with get_db_session() as db:
+                    try:
+                        await self.apply_event(db, event)
+                        db.commit()
+                    except Exception:
+                        await self.withdraw_offers(db)
+                        raise
+            except (OperationalError, InterfaceError):
+                raise
+            except Exception as e:
+                log.error("Dropping unprocessable spooled event: %s", e)
+                log.debug("Dropped event: %s", event)
+    
+    async def apply_event(self, db: Session, event: dict):
+        """Apply one sensor or BLE event to an open session without committing"""
+        if event.get('type') == 'sensor':
+            await self.apply_sensor_event(db, event)
+        elif event.get('event_type') in ['entry', 'exit']:
+            self.apply_ble_entry_exit(db, event)
+        else:
+            db.add_all(self.filter_ble_sample(event))
+    
+    def is_repeat(self, event: dict) -> bool:
+        """
+        Check an event against the suppression windows
+
+        Sensor events are keyed by (device, RFID) and suppressed for
+        ANTI_TAILGATING_DELAY_SECONDS; BLE entry/exit events are keyed by
+        (student, beacon) and suppressed for BLE_TIMEOUT_SECONDS while
+        the reported event type is unchanged. Raw RSSI samples are left
+        to the beacon filter, which debounces them itself.
+        """
+        try:
+            now = datetime.fromisoformat(event['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return False  # Not placeable on the event clock the windows are kept in
+        
+        event_type = event.get('type')
+        if event_type == 'sensor' and event.get('rfid'):
+            key = (event.get('device_id'), event.get('rfid'))
+            return self.rfid_suppressor.should_suppress(key, now=now)
+        if event_type == 'ble' and event.get('event_type') in ['entry', 'exit']:
+            key = (event.get('student_id'), event.get('beacon_uuid'))
+            return self.ble_suppressor.should_suppress(key, event.get('event_type'), now=now)
+        return False
+    
+    def suppression_stats(self) -> dict:
+        """Counts of accepted and suppressed events per suppressor"""
+        return {
+            'rfid': self.rfid_suppressor.stats(),
+            'ble': self.ble_suppressor.stats(),
+            'dedup': self.dedup.stats()
+        }
+    
+    def maybe_report_stats(self):
+        """Print suppression counters at most once per STATS_REPORT_INTERVAL_SECONDS"""
+        now = time.monotonic()
+        if now - self._last_stats_report >= settings.STATS_REPORT_INTERVAL_SECONDS:
+            self._last_stats_report = now
+            log.info("Suppression stats", extra={"stats": self.suppression_stats()})
     
     async def process_sensor_event(self, event: dict):
         """Process RFID/PIR sensor event"""
-        print(f"Processing sensor event: {event}")
+        log.debug("Processing sensor event: %s", event)
         
         with get_db_session() as db:
-            # Store raw sensor data
-            sensor_data = SensorData(
-                device_ID=event.get('device_id'),
-                cluster_ID=event.get('cluster_id'),
-                RFID=event.get('rfid'),
-                sensor_active=event.get('sensor_active', True),
-                time_stamp=datetime.fromisoformat(event.get('timestamp'))
-            )
-            db.add(sensor_data)
-            
-            # Check for matching entry/exit pair
-            if event.get('rfid'):
-                await self.check_entry_exit_match(db, event)
-            
-            db.commit()
+            try:
+                await self.apply_sensor_event(db, event)
+                db.commit()
+            except Exception:
+                await self.withdraw_offers(db)
+                raise
+    
+    async def apply_sensor_event(self, db: Session, event: dict):
+        """Store raw sensor data and check for an entry/exit pair"""
+        # Older firmware omits cluster_id; the topology knows it
+        if event.get('cluster_id') is None:
+            device = self.topology.device(event.get('device_id'))
+            if device:
+                event['cluster_id'] = device.cluster_id
+        
+        sensor_data = SensorData(
+            device_ID=event.get('device_id'),
+            cluster_ID=event.get('cluster_id'),
+            RFID=event.get('rfid'),
+            sensor_active=event.get('sensor_active', True),
+            time_stamp=datetime.fromisoformat(event.get('timestamp'))
+        )
+        db.add(sensor_data)
+        
+        # Check for matching entry/exit pair
+        if event.get('rfid'):
+            db.flush()
+            await self.check_entry_exit_match(db, event, sensor_data)
     
-    async def check_entry_exit_match(self, db: Session, event: dict):
+    async def check_entry_exit_match(self, db: Session, event: dict, sensor_data: SensorData):
         """
         Check if this event matches with a recent event from different device
         to determine entry vs exit
         """
-        rfid = event.get('rfid')
-        cluster_id = event.get('cluster_id')
-        device_id = event.get('device_id')
+        tap = self.build_tap(event, sensor_data.id)
+        matched = await self.offer_tap(tap, db.info.setdefault('offers', []))
+        if not matched:
+            return
+        decision = self.pair_decision(tap)
         
-        # Get recent events from same cluster but different device
-        window_start = datetime.utcnow() - timedelta(seconds=settings.ATTENDANCE_WINDOW_SECONDS)
-        
-        recent_events = db.query(SensorData).filter(
-            SensorData.cluster_ID == cluster_id,
-            SensorData.RFID == rfid,
-            SensorData.device_ID != device_id,
-            SensorData.time_stamp >= window_start,
-            SensorData.processed == False
-        ).all()
-        
-        if recent_events:
-            # Found matching event - determine entry vs exit
-            # Device ID ending in even number = entry, odd = exit
-            is_entry = int(device_id[-1]) % 2 == 0 if device_id[-1].isdigit() else True
-            
-            # Create entry log
-            status = 1 if is_entry else -1
-            
-            # Get student name
-            student = db.query(Student).filter(Student.RFID == rfid).first()
-            student_name = student.stud_name if student else "Unknown"
-            
-            # Get room value
-            device = db.query(UserDevice).filter(UserDevice.device_id == device_id).first()
-            room = device.room_value if device else f"cluster_{cluster_id}"
-            
-            entry_log = EntryLog(
-                student_name=student_name,
-                RFID=rfid,
-                room_value=room,
-                status=status,
-                confidence=0.95,
-                source="rfid"
-            )
-            db.add(entry_log)
-            
-            # Mark events as processed
-            for event in recent_events:
-                event.processed = True
-            
-            print(f"Logged {'entry' if is_entry else 'exit'} for {student_name}")
+        # Get student name
+        student = db.query(Student).filter(Student.RFID == decision['RFID']).first()
+        student_name = student.stud_name if student else "Unknown"
+        
+        db.add(EntryLog(student_name=student_name, **decision))
+        
+        # Mark both sides of the pair as processed
+        sensor_data.processed = True
+        matched = [tap for tap in matched if tap.row_id is not None]
+        if matched:
+            # Bounded on time_stamp too, so only the partitions holding the taps are touched
+            times = [tap.timestamp for tap in matched]
+            db.query(SensorData).filter(
+                SensorData.id.in_([tap.row_id for tap in matched]),
+                SensorData.time_stamp >= datetime.fromtimestamp(min(times)) - timedelta(seconds=1),
+                SensorData.time_stamp <= datetime.fromtimestamp(max(times)) + timedelta(seconds=1)
+            ).update({SensorData.processed: True}, synchronize_session=False)
+        
+        log.info("Logged %s for %s", 'entry' if decision['status'] == 1 else 'exit', student_name,
+                 extra={"rfid": decision['RFID'], "room": decision['room_value']})
+    
+    def build_tap(self, event: dict, row_id: int = None) -> Tap:
+        """Matcher input for an RFID read"""
+        return Tap(
+            device_id=event.get('device_id'),
+            cluster_id=event.get('cluster_id'),
+            rfid=event.get('rfid'),
+            timestamp=datetime.fromisoformat(event.get('timestamp')).timestamp(),
+            row_id=row_id
+        )
+    
+    async def offer_tap(self, tap: Tap, offers: list = None) -> list:
+        """
+        Offer a tap to the configured matcher
+        
+        If Redis is unreachable the in-memory matcher takes over for this
+        tap, so the read is still stored and can still pair locally.
+        Each offer is recorded in offers as (matcher, tap, matched), for
+        withdraw_offers to undo if the session is not committed.
+        """
+        matcher = self.matcher
+        if self.redis_matcher:
+            try:
+                matched = await self.redis_matcher.offer(tap)
+                matcher = self.redis_matcher
+            except redis.RedisError as e:
+                log.warning("Redis matcher unavailable, matching locally: %s", e)
+        if matcher is self.matcher:
+            matched = self.matcher.offer(tap)
+        if offers is not None:
+            offers.append((matcher, tap, matched))
+        return matched
+    
+    async def withdraw_offers(self, db: Session):
+        """
+        Undo the matcher changes of a session that is not being committed
+        
+        Newest first, so the pending taps are as they were before the
+        session: consumed partners come back and unstored taps leave.
+        A spooled or retried event then pairs as if offered the first time.
+        """
+        for matcher, tap, matched in reversed(db.info.pop('offers', [])):
+            try:
+                if matcher is self.redis_matcher:
+                    await matcher.restore(tap, matched)
+                else:
+                    matcher.restore(tap, matched)
+            except redis.RedisError as e:
+                log.warning("Could not restore pending taps in Redis: %s", e)
+    
+    def pair_decision(self, tap: Tap) -> dict:
+        """
+        entry_log fields for a tap that completed a pair
+        
+        Direction and room come from the topology of the device that
+        completed the pair.
+        """
+        is_entry, room = self.topology.resolve(tap.device_id, tap.cluster_id)
+        return {
+            'RFID': tap.rfid,
+            'room_value': room,
+            'status': 1 if is_entry else -1,
+            'timestamp': datetime.fromtimestamp(tap.timestamp),
+            'confidence': 0.95,
+            'source': 'rfid'
+        }
+    
+    def decide_sensor_pair(self, event: dict, row_id: int = None):
+        """
+        Feed an RFID read to the in-memory pair matcher (used by the replay tool)
+        
+        Returns:
+            (entry_log fields or None, matched earlier taps)
+        """
+        tap = self.build_tap(event, row_id)
+        matched = self.matcher.offer(tap)
+        if not matched:
+            return None, []
+        return self.pair_decision(tap), matched
+    
+    def decide_ble_entry_exit(self, event: dict):
+        """
+        Room and direction for a BLE entry/exit report (shared with the replay tool)
+        
+        Returns:
+            entry_log fields without student columns, or None if rejected
+        """
+        room = self.resolve_ble_room(event)
+        if not room:
+            return None
+        return {
+            'room_value': room,
+            'status': 1 if event.get('event_type') == 'entry' else -1,
+            'timestamp': datetime.fromisoformat(event.get('timestamp')),
+            'confidence': 0.85,  # BLE slightly lower confidence than RFID
+            'source': 'ble'
+        }
     
     async def process_ble_event(self, event: dict):
         """Process BLE beacon event from mobile app"""
-        print(f"Processing BLE event: {event}")
+        log.debug("Processing BLE event: %s", event)
+        
+        # Raw RSSI samples only reach the database on state changes
+        if event.get('event_type') not in ['entry', 'exit']:
+            rows = self.filter_ble_sample(event)
+            if rows:
+                with get_db_session() as db:
+                    db.add_all(rows)
+                    db.commit()
+            return
         
         with get_db_session() as db:
-            # Store BLE event
-            ble_event = BLEEvent(
-                student_id=event.get('student_id'),
-                beacon_uuid=event.get('beacon_uuid'),
-                rssi=event.get('rssi'),
-                latitude=event.get('location', {}).get('latitude'),
-                longitude=event.get('location', {}).get('longitude'),
-                event_type=event.get('event_type', 'unknown'),
-                app_version=event.get('app_version', ''),
-                timestamp=datetime.fromisoformat(event.get('timestamp'))
-            )
-            db.add(ble_event)
-            
-            # If entry/exit event, create attendance log
-            if event.get('event_type') in ['entry', 'exit']:
-                status = 1 if event.get('event_type') == 'entry' else -1
-                
-                student = db.query(Student).filter(Student.student_id == event.get('student_id')).first()
-                
-                if student:
-                    # Extract room from beacon UUID (e.g., "zias-main-101-entry")
-                    beacon_parts = event.get('beacon_uuid', '').split('-')
-                    room = beacon_parts[2] if len(beacon_parts) > 2 else "unknown"
-                    
-                    entry_log = EntryLog(
-                        student_name=student.stud_name,
-                        RFID=student.RFID or '',
-                        room_value=room,
-                        status=status,
-                        confidence=0.85,  # BLE slightly lower confidence than RFID
-                        source="ble"
-                    )
-                    db.add(entry_log)
-                    
-                    print(f"Logged BLE {event.get('event_type')} for {student.stud_name}")
+            self.apply_ble_entry_exit(db, event)
+            db.commit()
+    
+    def apply_ble_entry_exit(self, db: Session, event: dict):
+        """Store a BLE entry/exit report and create the attendance log"""
+        db.add(self.build_ble_event(event, event.get('event_type'), event.get('rssi')))
+        
+        decision = self.decide_ble_entry_exit(event)
+        student = None
+        if decision:
+            student = db.query(Student).filter(Student.student_id == event.get('student_id')).first()
+        
+        if student:
+            db.add(EntryLog(student_name=student.stud_name, RFID=student.RFID or '', **decision))
             
+            log.info("Logged BLE %s for %s", event.get('event_type'), student.stud_name,
+                     extra={"student_id": student.student_id, "room": decision['room_value']})
+    
+    def resolve_ble_room(self, event: dict):
+        """
+        Resolve the room of a BLE entry/exit and check the geofence
+        
+        Registered beacons resolve from the geofence index; a report with
+        a position outside the beacon's fence is rejected (None). Reports
+        for unregistered beacons fall back to the nearest fenced room, then
+        to the legacy UUID naming (e.g. "zias-main-101-entry").
+        """
+        location = event.get('location') or {}
+        latitude = location.get('latitude')
+        longitude = location.get('longitude')
+        beacon_uuid = event.get('beacon_uuid') or ''
+        
+        if settings.BLE_GEOFENCE_REQUIRE_LOCATION and (latitude is None or longitude is None):
+            log.info("Rejected BLE %s from %s: no location", event.get('event_type'), event.get('student_id'))
+            return None
+        
+        check = self.geofence.validate(beacon_uuid, latitude, longitude)
+        if not check.inside:
+            log.info("Rejected BLE %s from %s: %.0fm from %s", event.get('event_type'),
+                     event.get('student_id'), check.distance_meters, beacon_uuid)
+            return None
+        if check.room:
+            return check.room
+        
+        if latitude is not None and longitude is not None:
+            room = self.geofence.nearest_room(latitude, longitude)
+            if room:
+                return room
+        
+        beacon_parts = beacon_uuid.split('-')
+        return beacon_parts[2] if len(beacon_parts) > 2 else "unknown"
+    
+    def build_ble_event(self, event: dict, event_type: str, rssi) -> BLEEvent:
+        """Build a BLEEvent row from a BLE event"""
+        location = event.get('location') or {}
+        return BLEEvent(
+            student_id=event.get('student_id'),
+            beacon_uuid=event.get('beacon_uuid'),
+            rssi=rssi,
+            latitude=location.get('latitude'),
+            longitude=location.get('longitude'),
+            event_type=event_type or 'unknown',
+            app_version=event.get('app_version', ''),
+            timestamp=datetime.fromisoformat(event.get('timestamp'))
+        )
+    
+    def filter_ble_sample(self, event: dict) -> list:
+        """
+        Feed a raw RSSI sample through the per-beacon filter
+        
+        Returns the BLEEvent rows worth persisting: a debounced
+        far/near/present transition, a periodic summary, or the raw
+        sample itself if BLE_RAW_SAMPLE_POLICY keeps it.
+        """
+        rssi = event.get('rssi')
+        if rssi is None:
+            return []
+        
+        key = (event.get('student_id'), event.get('beacon_uuid'))
+        now = datetime.fromisoformat(event.get('timestamp')).timestamp()
+        update = self.beacon_filters.update(key, float(rssi), now)
+        
+        if update.transition:
+            log.debug("BLE %s: %s -> %s", key, update.previous, update.state)
+            return [self.build_ble_event(event, update.state, round(update.rssi))]
+        if update.summary_due:
+            return [self.build_ble_event(event, 'summary', round(update.rssi))]
+        
+        policy = settings.BLE_RAW_SAMPLE_POLICY
+        if policy == 'all' or (policy == 'sampled' and update.samples % settings.BLE_RAW_SAMPLE_EVERY == 0):
+            return [self.build_ble_event(event, event.get('event_type', 'approaching'), rssi)]
+        return []
+    
+    def expire_stale_beacons(self, now: datetime):
+        """Queue an implicit far transition for pairs silent for BLE_TIMEOUT_SECONDS"""
+        expired = self.beacon_filters.expire(now.timestamp(), settings.BLE_TIMEOUT_SECONDS)
+        self._far_pending.extend(
+            {
+                'student_id': student_id,
+                'beacon_uuid': beacon_uuid,
+                'rssi': round(rssi),
+                'event_type': 'far',
+                'timestamp': now
+            }
+            for (student_id, beacon_uuid), _, rssi in expired
+        )
+        return len(expired)
+    
+    def write_far_events(self, rows: list):
+        with get_db_session() as db:
+            db.execute(insert(BLEEvent), rows)
             db.commit()
     
+    async def run_beacon_sweep(self):
+        """
+        Expire silent BLE pairs every BLE_FILTER_SWEEP_SECONDS, off the per-event path
+        
+        The filter sweep runs on the event loop (it shares state with
+        event handling); the write runs in a thread. Rows that fail to
+        write are kept and retried on the next sweep.
+        """
+        while True:
+            await asyncio.sleep(settings.BLE_FILTER_SWEEP_SECONDS)
+            expired = self.expire_stale_beacons(datetime.utcnow())
+            if expired:
+                log.info("Expired %d silent BLE pairs", expired)
+            if not self._far_pending:
+                continue
+            rows, self._far_pending = self._far_pending, []
+            try:
+                await asyncio.to_thread(self.write_far_events, rows)
+            except Exception as e:
+                log.warning("Writing %d implicit BLE far events failed, will retry: %s", len(rows), e)
+                self._far_pending = rows + self._far_pending
+    
+    def load_liveness(self):
+        """Seed the liveness tracker with the devices currently marked active"""
+        with get_db_session() as db:
+            self.liveness.load(db.query(
+                UserDevice.device_id,
+                UserDevice.device_type,
+                UserDevice.last_seen
+            ).filter(UserDevice.status == DeviceStatusEnum.ACTIVE).all(), now=time.time())
+        log.info("Liveness tracking %d active devices", len(self.liveness.online))
+    
+    def device_seen(self, device_id: str, fields: dict = None):
+        """Note a message from a registered device; the write is batched"""
+        device = self.topology.device(device_id)
+        if device is None:
+            return
+        
+        now = time.time()
+        if self.liveness.seen(device_id, device.device_type, now):
+            self._went_online.append(device_id)
+        
+        update_row = self._seen_updates.setdefault(device_id, {'device_id': device_id})
+        update_row['last_seen'] = utc_from_timestamp(now)
+        if fields:
+            update_row.update(fields)
+    
+    def handle_device_status(self, event: dict):
+        """Heartbeat, capability report or last-will from a device"""
+        device_id = event.get('device_id')
+        if event.get('status') == 'offline':
+            if self.liveness.mark_offline(device_id):
+                self._went_offline.append(device_id)
+            return
+        
+        # Capabilities and IP are only applied when present
+        fields = {
+            column: event[key]
+            for key, column in (('ip', 'ip_address'), ('has_rfid', 'has_rfid'),
+                                ('has_pir', 'has_pir'), ('has_ble', 'has_ble'))
+            if event.get(key) is not None
+        }
+        self.device_seen(device_id, fields)
+    
+    async def run_liveness(self):
+        """Turn the liveness wheel every second and flush batched changes"""
+        last_flush = time.monotonic()
+        while True:
+            await asyncio.sleep(1.0)
+            try:
+                self._went_offline.extend(self.liveness.tick(time.time()))
+                if time.monotonic() - last_flush >= settings.DEVICE_LIVENESS_FLUSH_SECONDS:
+                    last_flush = time.monotonic()
+                    await self.flush_liveness()
+            except Exception as e:
+                log.warning("Liveness tick failed, will retry: %s", e)
+    
+    async def flush_liveness(self):
+        """Write last_seen and status changes in bulk, then publish online/offline events"""
+        updates, self._seen_updates = self._seen_updates, {}
+        online, self._went_online = self._went_online, []
+        offline, self._went_offline = self._went_offline, []
+        if not (updates or online or offline):
+            return
+        
+        # A device that flapped within one flush ends in its current state
+        online = [d for d in dict.fromkeys(online) if d in self.liveness.online]
+        offline = [d for d in dict.fromkeys(offline) if d not in self.liveness.online]
+        
+        try:
+            with get_db_session() as db:
+                # Rows with the same keys go in one executemany each
+                groups = {}
+                for row in updates.values():
+                    groups.setdefault(tuple(sorted(row)), []).append(row)
+                for rows in groups.values():
+                    db.execute(update(UserDevice), rows)
+                
+                for devices, status in ((online, DeviceStatusEnum.ACTIVE), (offline, DeviceStatusEnum.INACTIVE)):
+                    if devices:
+                        db.query(UserDevice).filter(
+                            UserDevice.device_id.in_(devices),
+                            UserDevice.status != DeviceStatusEnum.MAINTENANCE
+                        ).update({UserDevice.status: status}, synchronize_session=False)
+                db.commit()
+        except Exception:
+            # Keep the batch for the next flush; newer updates win
+            for device_id, row in updates.items():
+                self._seen_updates.setdefault(device_id, row)
+            self._went_online[:0] = online
+            self._went_offline[:0] = offline
+            raise
+        
+        if (online or offline) and self.redis_client:
+            timestamp = datetime.utcnow().isoformat()
+            pipe = self.redis_client.pipeline(transaction=False)
+            for devices, state in ((online, 'online'), (offline, 'offline')):
+                for device_id in devices:
+                    pipe.publish('zias:events', json.dumps({
+                        'type': 'device',
+                        'event': state,
+                        'device_id': device_id,
+                        'timestamp': timestamp
+                    }))
+            await pipe.execute()
+        
+        if online or offline:
+            log.info("Devices online: %d, offline: %d", len(online), len(offline),
+                     extra={"offline": offline[:20]} if offline else None)
+    
+    async def run_dedup_flush(self):
+        """Persist new dedup identities to Redis every DEDUP_FLUSH_SECONDS"""
+        while True:
+            await asyncio.sleep(settings.DEDUP_FLUSH_SECONDS)
+            try:
+                await self.dedup.flush(self.redis_client)
+            except Exception as e:
+                log.warning("Dedup flush failed, will retry: %s", e)
+    
+    async def run_presence_sync(self):
+        """Apply new entry_log rows to the presence bitmaps every PRESENCE_SYNC_SECONDS"""
+        while True:
+            await asyncio.sleep(settings.PRESENCE_SYNC_SECONDS)
+            try:
+                with get_db_session() as db:
+                    await self.presence.catch_up(db)
+            except Exception as e:
+                log.warning("Presence sync failed, will retry: %s", e)
+    
+    async def run_occupancy_series(self):
+        """Write each minute's per-room occupancy (and completed hours) to the Redis rings"""
+        while True:
+            try:
+                await self.series.update()
+            except Exception as e:
+                log.warning("Occupancy series update failed, will retry: %s", e)
+            # Wake just after the next minute becomes due
+            await asyncio.sleep(60 - (time.time() - settings.OCCUPANCY_SERIES_SETTLE_SECONDS) % 60 + 0.5)
+    
     async def stop(self):
         """Stop event processor"""
+        if self.liveness_task:
+            self.liveness_task.cancel()
+        if self.beacon_sweep_task:
+            self.beacon_sweep_task.cancel()
+            if self._far_pending:
+                try:
+                    self.write_far_events(self._far_pending)
+                except Exception as e:
+                    log.warning("Dropping %d implicit BLE far events: %s", len(self._far_pending), e)
+        if self.presence_task:
+            self.presence_task.cancel()
+        if self.roster_task:
+            self.roster.stop()
+            self.roster_task.cancel()
+        if self.partitions_task:
+            self.partitions.stop()
+            self.partitions_task.cancel()
+        if self.occupancy_task:
+            self.occupancy.stop()
+            self.occupancy_task.cancel()
+        if self.series_task:
+            self.series_task.cancel()
+        if self.dedup_task:
+            self.dedup_task.cancel()
+            try:
+                await self.dedup.flush(self.redis_client)
+            except Exception as e:
+                log.warning("Final dedup flush failed: %s", e)
+        if self.reload_task:
+            self.reload_task.cancel()
         if self.pubsub:
             await self.pubsub.unsubscribe('zias:events')
         if self.redis_client:
             await self.redis_client.close()
-        print("Event processor stopped")
+        if self.replayer:
+            self.replayer.stop()
+            self.replay_task.cancel()
+        if self.spool:
+            self.spool.close()
+        log.info("Suppression stats", extra={"stats": self.suppression_stats()})
+        log.info("Event processor stopped")
 
 
 async def main():
@@ -188,9 +918,10 @@ async def main():
     try:
         await processor.start()
     except KeyboardInterrupt:
-        print("\nShutting down...")
+        log.info("Shutting down")
         await processor.stop()
 
 
 if __name__ == "__main__":
+    setup_logging("processor")
     asyncio.run(main())
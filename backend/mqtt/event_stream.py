@@ -0,0 +1,72 @@
+"""
+Partitioned event feed on a Redis Stream
+With EVENT_FEED=stream the MQTT client appends events to one stream and
+processors read it through a consumer group, so each event is handled by
+exactly one processor. Replicas then share the load instead of each
+recording every event; a card's taps that land on different replicas
+still pair in the Redis matcher.
+
+An entry is acknowledged once handled (stored or spooled). Entries a
+processor read but never acknowledged, because it died, are claimed by
+another processor once idle for claim_idle_seconds.
+"""
+
+import time
+from typing import List, Tuple
+
+import redis.asyncio as redis
+
+STREAM_KEY = "zias:events:stream"
+GROUP = "processors"
+
+
+def append(pipe, data: str, maxlen: int):
+    """Queue one event on a pipeline; the stream is trimmed to about maxlen entries"""
+    pipe.xadd(STREAM_KEY, {"data": data}, maxlen=maxlen, approximate=True)
+
+
+class EventStreamReader:
+    """One processor's consumer in the shared group"""
+
+    def __init__(self, client: redis.Redis, consumer: str, batch: int = 100, block_ms: int = 1000,
+                 claim_idle_seconds: float = 60.0):
+        self.client = client
+        self.consumer = consumer
+        self.batch = batch
+        self.block_ms = block_ms
+        self.claim_idle_ms = int(claim_idle_seconds * 1000)
+        self._next_claim = 0.0
+
+    async def ensure_group(self):
+        """Create the stream and group if missing; new groups start at the oldest entry kept"""
+        try:
+            await self.client.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(self) -> List[Tuple[bytes, bytes]]:
+        """
+        Next batch of (entry ID, event JSON)
+
+        Entries abandoned by other consumers come first, checked at most
+        once per claim interval (sooner while a full batch comes back).
+        """
+        now = time.monotonic()
+        if now >= self._next_claim:
+            _, claimed, *_ = await self.client.xautoclaim(
+                STREAM_KEY, GROUP, self.consumer, self.claim_idle_ms, start_id="0-0", count=self.batch
+            )
+            self._next_claim = now if len(claimed) >= self.batch else now + self.claim_idle_ms / 1000
+            entries = [(entry_id, fields[b"data"]) for entry_id, fields in claimed if fields]
+            if entries:
+                return entries
+
+        result = await self.client.xreadgroup(
+            GROUP, self.consumer, {STREAM_KEY: ">"}, count=self.batch, block=self.block_ms
+        )
+        return [(entry_id, fields[b"data"]) for _, messages in result or () for entry_id, fields in messages]
+
+    async def ack(self, entry_ids: List[bytes]):
+        if entry_ids:
+            await self.client.xack(STREAM_KEY, GROUP, *entry_ids)
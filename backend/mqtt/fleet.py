@@ -0,0 +1,226 @@
+"""
+Fleet command fan-out
+The API creates a job and queues it in Redis. The ingest process that
+owns the MQTT connection publishes it to <prefix>/devices/<id>/cmd for
+every targeted device under a token-bucket rate limit. Devices
+acknowledge on their status topic with the job ID, so a job's progress
+is tracked in Redis whichever ingest replica receives the ack.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import redis.asyncio as redis
+
+from api.log import get_logger
+
+JOB_QUEUE = "zias:fleet:queue"
+JOB_KEY_PREFIX = "zias:fleet:job"
+
+# Job states stored in the meta hash; "complete" and "timed_out" are derived on read
+STATE_QUEUED = "queued"
+STATE_SENDING = "sending"
+STATE_SENT = "sent"
+
+log = get_logger("mqtt.fleet")
+
+
+def job_keys(job_id: str) -> Dict[str, str]:
+    """Redis keys of one job"""
+    base = f"{JOB_KEY_PREFIX}:{job_id}"
+    return {
+        "meta": base,                   # hash: command, params, state, counters, times
+        "targets": f"{base}:targets",   # list: device IDs in send order
+        "pending": f"{base}:pending",   # set: targeted devices that have not acked
+        "results": f"{base}:results",   # hash: device ID -> {"result", "detail"}
+    }
+
+
+async def create_job(
+    client: redis.Redis,
+    command: str,
+    params: dict,
+    device_ids: List[str],
+    ttl_seconds: int
+) -> str:
+    """
+    Store a job and queue it for the commander
+
+    Returns:
+        Job ID
+    """
+    job_id = uuid.uuid4().hex
+    keys = job_keys(job_id)
+
+    pipe = client.pipeline(transaction=True)
+    pipe.hset(keys["meta"], mapping={
+        "command": command,
+        "params": json.dumps(params),
+        "state": STATE_QUEUED,
+        "total": len(device_ids),
+        "sent": 0,
+        "created_at": time.time()
+    })
+    pipe.rpush(keys["targets"], *device_ids)
+    pipe.sadd(keys["pending"], *device_ids)
+    for key in keys.values():
+        pipe.expire(key, ttl_seconds)
+    pipe.lpush(JOB_QUEUE, job_id)
+    await pipe.execute()
+    return job_id
+
+
+async def record_ack(client: redis.Redis, job_id: str, device_id: str, result: str, detail: str = "") -> bool:
+    """
+    Record a device's acknowledgement of a job
+
+    Returns:
+        False if the device was not a pending target of the job (unknown
+        job, duplicate ack, or a device the job did not target)
+    """
+    keys = job_keys(job_id)
+    if not await client.srem(keys["pending"], device_id):
+        return False
+    await client.hset(keys["results"], device_id, json.dumps({"result": result, "detail": detail}))
+    return True
+
+
+async def job_status(
+    client: redis.Redis,
+    job_id: str,
+    ack_timeout_seconds: int,
+    include_devices: bool = False
+) -> Optional[dict]:
+    """
+    Progress of a job, or None if it is unknown or expired
+
+    The state is "complete" once every target has acked and "timed_out"
+    if targets are still pending ack_timeout_seconds after the last
+    command was sent.
+    """
+    keys = job_keys(job_id)
+    pipe = client.pipeline(transaction=False)
+    pipe.hgetall(keys["meta"])
+    pipe.scard(keys["pending"])
+    pipe.hgetall(keys["results"])
+    meta, pending, results = await pipe.execute()
+    if not meta:
+        return None
+
+    results = {device: json.loads(value) for device, value in results.items()}
+    failed = {device: r.get("detail", "") for device, r in results.items() if r.get("result") != "ok"}
+
+    state = meta["state"]
+    sent_at = float(meta["sent_at"]) if meta.get("sent_at") else None
+    if state == STATE_SENT:
+        if pending == 0:
+            state = "complete"
+        elif time.time() - sent_at > ack_timeout_seconds:
+            state = "timed_out"
+
+    status = {
+        "job_id": job_id,
+        "command": meta["command"],
+        "params": json.loads(meta["params"]),
+        "state": state,
+        "total": int(meta["total"]),
+        "sent": int(meta["sent"]),
+        "acked": len(results) - len(failed),
+        "failed": len(failed),
+        "pending": pending,
+        "created_at": float(meta["created_at"]),
+        "sent_at": sent_at
+    }
+    if include_devices:
+        status["pending_devices"] = sorted(await client.smembers(keys["pending"]))
+        status["failed_devices"] = failed
+    return status
+
+
+class TokenBucket:
+    """Async token bucket: rate tokens/second, holding at most burst"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+class FleetCommander:
+    """
+    Publishes queued jobs to devices, one job at a time
+
+    Each ingest replica runs one; BRPOP hands each job to exactly one of
+    them. The rate limit is per replica.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        publish: Callable[[str, dict], None],
+        rate_per_second: float,
+        burst: int,
+        chunk_size: int = 500
+    ):
+        self.client = client
+        self.publish = publish
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.chunk_size = chunk_size
+        self._running = False
+
+    async def run(self):
+        """Background loop: wait for jobs and dispatch them"""
+        self._running = True
+        while self._running:
+            try:
+                item = await self.client.brpop(JOB_QUEUE, timeout=5)
+                if item:
+                    await self.dispatch(item[1])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Fleet commander error: %s", e)
+                await asyncio.sleep(5)
+
+    async def dispatch(self, job_id: str):
+        """Publish one job's command to every target"""
+        keys = job_keys(job_id)
+        meta = await self.client.hgetall(keys["meta"])
+        if not meta:
+            log.warning("Fleet job %s expired before dispatch", job_id)
+            return
+
+        message = {"cmd": meta["command"], "job_id": job_id, "params": json.loads(meta["params"])}
+        await self.client.hset(keys["meta"], "state", STATE_SENDING)
+        log.info("Dispatching fleet job %s (%s) to %s devices", job_id, meta["command"], meta["total"])
+
+        start = 0
+        while True:
+            devices = await self.client.lrange(keys["targets"], start, start + self.chunk_size - 1)
+            if not devices:
+                break
+            for device_id in devices:
+                await self.bucket.acquire()
+                self.publish(f"devices/{device_id}/cmd", message)
+            await self.client.hincrby(keys["meta"], "sent", len(devices))
+            start += len(devices)
+
+        await self.client.hset(keys["meta"], mapping={"state": STATE_SENT, "sent_at": time.time()})
+        log.info("Fleet job %s sent to %d devices", job_id, start)
+
+    def stop(self):
+        self._running = False
@@ -0,0 +1,163 @@
+"""
+Spatial geofence index for BLE location validation
+Preloads beacon positions from the beacons table so room resolution is
+a dict lookup and geofence checks are a single haversine per event
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from api.db_models import Beacon
+from api.log import get_logger
+
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+
+log = get_logger("mqtt.geofence")
+
+
+def haversine_meters(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorized great-circle distance in meters, inputs in degrees"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2.0) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(a))
+
+
+def _haversine_scalar(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2.0) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+@dataclass
+class GeofenceResult:
+    """Outcome of checking one BLE report"""
+    room: Optional[str]                 # None if the beacon is not registered
+    inside: bool                        # False only if a position was given and is outside
+    distance_meters: Optional[float] = None
+
+
+@dataclass
+class _Snapshot:
+    """Immutable index contents, swapped as a whole on reload"""
+    slots: Dict[str, int] = field(default_factory=dict)
+    rooms: List[str] = field(default_factory=list)
+    lat: np.ndarray = field(default_factory=lambda: np.empty(0))
+    lon: np.ndarray = field(default_factory=lambda: np.empty(0))
+    radius: np.ndarray = field(default_factory=lambda: np.empty(0))
+    grid: Dict[Tuple[int, int], np.ndarray] = field(default_factory=dict)
+    cell_lat: float = 1.0
+    cell_lon: float = 1.0
+
+
+class GeofenceIndex:
+    """
+    Beacon UUID -> room lookup plus a uniform grid over beacon positions
+
+    The grid cell is sized to the largest geofence radius, so any beacon
+    whose fence contains a point lies in that point's cell or one of its
+    eight neighbours.
+    """
+
+    def __init__(self, default_radius_meters: float):
+        self.default_radius = default_radius_meters
+        self._snapshot = _Snapshot()
+
+    def __len__(self) -> int:
+        return len(self._snapshot.slots)
+
+    def load(self, beacons: Iterable[Sequence]):
+        """
+        Build a new snapshot and swap it in
+
+        Args:
+            beacons: (beacon_uuid, room_value, latitude, longitude, radius_meters) rows
+        """
+        rows = list(beacons)
+        snap = _Snapshot()
+        snap.slots = {row[0]: i for i, row in enumerate(rows)}
+        snap.rooms = [row[1] for row in rows]
+        snap.lat = np.array([np.nan if row[2] is None else row[2] for row in rows], dtype=np.float64)
+        snap.lon = np.array([np.nan if row[3] is None else row[3] for row in rows], dtype=np.float64)
+        snap.radius = np.array([row[4] or self.default_radius for row in rows], dtype=np.float64)
+
+        positioned = np.flatnonzero(~np.isnan(snap.lat) & ~np.isnan(snap.lon))
+        if len(positioned):
+            max_radius = float(snap.radius[positioned].max())
+            ref_lat = math.radians(float(np.mean(snap.lat[positioned])))
+            snap.cell_lat = max_radius / METERS_PER_DEGREE_LAT
+            snap.cell_lon = snap.cell_lat / max(math.cos(ref_lat), 0.01)
+
+            cells: Dict[Tuple[int, int], List[int]] = {}
+            for slot in positioned:
+                cells.setdefault(self._cell(snap, snap.lat[slot], snap.lon[slot]), []).append(int(slot))
+            snap.grid = {cell: np.array(slots, dtype=np.int64) for cell, slots in cells.items()}
+
+        self._snapshot = snap
+
+    def reload(self, db: Session):
+        """Reload beacon positions from the database"""
+        self.load(db.query(
+            Beacon.beacon_uuid,
+            Beacon.room_value,
+            Beacon.latitude,
+            Beacon.longitude,
+            Beacon.radius_meters
+        ).all())
+        log.info("Geofence index loaded: %d beacons", len(self))
+
+    @staticmethod
+    def _cell(snap: _Snapshot, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / snap.cell_lat), math.floor(lon / snap.cell_lon))
+
+    def room_for(self, beacon_uuid: str) -> Optional[str]:
+        """Room of a registered beacon"""
+        snap = self._snapshot
+        slot = snap.slots.get(beacon_uuid)
+        return snap.rooms[slot] if slot is not None else None
+
+    def validate(self, beacon_uuid: str, latitude: Optional[float], longitude: Optional[float]) -> GeofenceResult:
+        """Resolve the beacon's room and check the phone is inside its fence"""
+        snap = self._snapshot
+        slot = snap.slots.get(beacon_uuid)
+        if slot is None:
+            return GeofenceResult(room=None, inside=True)
+
+        room = snap.rooms[slot]
+        if latitude is None or longitude is None or math.isnan(snap.lat[slot]):
+            return GeofenceResult(room=room, inside=True)
+
+        distance = _haversine_scalar(latitude, longitude, snap.lat[slot], snap.lon[slot])
+        return GeofenceResult(room=room, inside=bool(distance <= snap.radius[slot]), distance_meters=distance)
+
+    def nearest_room(self, latitude: float, longitude: float) -> Optional[str]:
+        """Room of the nearest beacon whose fence contains the point"""
+        snap = self._snapshot
+        if not snap.grid:
+            return None
+
+        ci, cj = self._cell(snap, latitude, longitude)
+        candidates = [
+            snap.grid[cell]
+            for cell in ((ci + di, cj + dj) for di in (-1, 0, 1) for dj in (-1, 0, 1))
+            if cell in snap.grid
+        ]
+        if not candidates:
+            return None
+
+        slots = np.concatenate(candidates)
+        distance = haversine_meters(latitude, longitude, snap.lat[slots], snap.lon[slots])
+        inside = distance <= snap.radius[slots]
+        if not inside.any():
+            return None
+        return snap.rooms[slots[inside][np.argmin(distance[inside])]]
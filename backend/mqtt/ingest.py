@@ -0,0 +1,42 @@
+"""
+Ingest-only entry point
+Runs the MQTT client without the REST API. Start several replicas with
+the same MQTT_SHARED_GROUP and the broker delivers each device message
+to exactly one of them.
+
+Usage:
+    MQTT_SHARED_GROUP=zias-ingest python -m mqtt.ingest
+"""
+
+import asyncio
+import signal
+
+from api.config import settings
+from api.log import get_logger, setup_logging
+from mqtt.client import mqtt_client
+
+log = get_logger("mqtt.ingest")
+
+
+async def main():
+    """Main entry point"""
+    if not settings.MQTT_SHARED_GROUP:
+        log.warning("MQTT_SHARED_GROUP not set, replicas of this process will duplicate ingest")
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    mqtt_client.start(loop)
+    log.info("ZIAS ingest started (group: %s)", settings.MQTT_SHARED_GROUP or 'none')
+    
+    await stop_event.wait()
+    
+    log.info("Shutting down")
+    mqtt_client.stop()
+
+
+if __name__ == "__main__":
+    setup_logging("ingest")
+    asyncio.run(main())
@@ -0,0 +1,176 @@
+"""
+Prioritized ingest lanes
+MQTT messages are queued per lane (sensor > BLE > status) by the paho
+network thread and drained in batches on the event loop, highest
+priority first. A lane skipped too many rounds in a row is served
+anyway, so heartbeats still flow during a burst of taps.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from api.log import get_logger
+
+log = get_logger("mqtt.lanes")
+
+
+@dataclass
+class LaneStats:
+    """Counters since the last stats report"""
+    enqueued: int = 0
+    published: int = 0
+    overflowed: int = 0          # Lane full, handed to the overflow handler (spool)
+    dropped: int = 0             # Lane full and no overflow handler
+    batches: int = 0
+    latency_total: float = 0.0   # Seconds from enqueue to publish, summed
+    latency_max: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "published": self.published,
+            "overflowed": self.overflowed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "latency_avg_ms": round(1000 * self.latency_total / self.published, 2) if self.published else None,
+            "latency_max_ms": round(1000 * self.latency_max, 2)
+        }
+
+
+@dataclass
+class Lane:
+    """One bounded FIFO of events of a single priority"""
+    name: str
+    capacity: int
+    batch_size: int
+    spill: bool = True           # Send overflow to the overflow handler rather than drop it
+    items: deque = field(default_factory=deque)
+    skipped: int = 0             # Consecutive rounds passed over while non-empty
+    stats: LaneStats = field(default_factory=LaneStats)
+
+
+class LaneScheduler:
+    """
+    Bounded priority lanes between the MQTT thread and Redis publishing
+
+    Lanes are given in priority order. Each round serves the highest
+    priority non-empty lane, unless a lower lane has been passed over
+    starvation_rounds times in a row, in which case that lane goes first.
+    """
+
+    def __init__(
+        self,
+        lanes: List[Lane],
+        sink: Callable[[List[dict]], Awaitable[None]],
+        overflow: Optional[Callable[[dict], None]] = None,
+        starvation_rounds: int = 8,
+        stats_interval: float = 60.0
+    ):
+        self.lanes = lanes
+        self.by_name: Dict[str, Lane] = {lane.name: lane for lane in lanes}
+        self.sink = sink
+        self.overflow = overflow
+        self.starvation_rounds = starvation_rounds
+        self.stats_interval = stats_interval
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle = False
+        self._running = False
+
+    def offer(self, lane_name: str, event: dict):
+        """Queue an event (any thread); a full lane spills or drops it"""
+        lane = self.by_name[lane_name]
+        with self._lock:
+            lane.stats.enqueued += 1
+            if len(lane.items) < lane.capacity:
+                lane.items.append((time.monotonic(), event))
+                full = False
+            else:
+                full = True
+
+        if full:
+            if lane.spill and self.overflow:
+                lane.stats.overflowed += 1
+                self.overflow(event)
+            else:
+                lane.stats.dropped += 1
+        elif self._idle and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    def pending(self) -> int:
+        return sum(len(lane.items) for lane in self.lanes)
+
+    def _next_lane(self) -> Optional[Lane]:
+        ready = [lane for lane in self.lanes if lane.items]
+        if not ready:
+            return None
+        chosen = next((lane for lane in ready if lane.skipped >= self.starvation_rounds), ready[0])
+        for lane in ready:
+            lane.skipped = 0 if lane is chosen else lane.skipped + 1
+        return chosen
+
+    def _take(self, lane: Lane) -> list:
+        with self._lock:
+            count = min(lane.batch_size, len(lane.items))
+            return [lane.items.popleft() for _ in range(count)]
+
+    async def run(self):
+        """Drain lanes until stopped"""
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._running = True
+        last_report = time.monotonic()
+
+        while self._running:
+            if time.monotonic() - last_report >= self.stats_interval:
+                last_report = time.monotonic()
+                log.info("Ingest lanes", extra={"lanes": self.stats(reset=True)})
+
+            lane = self._next_lane()
+            if lane is None:
+                self._idle = True
+                if not self.pending():
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.stats_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                self._idle = False
+                continue
+
+            batch = self._take(lane)
+            try:
+                await self.sink([event for _, event in batch])
+            except Exception as e:
+                log.error("Lane %s lost a batch of %d: %s", lane.name, len(batch), e)
+                lane.stats.dropped += len(batch)
+                continue
+
+            now = time.monotonic()
+            stats = lane.stats
+            stats.batches += 1
+            stats.published += len(batch)
+            for queued_at, _ in batch:
+                waited = now - queued_at
+                stats.latency_total += waited
+                if waited > stats.latency_max:
+                    stats.latency_max = waited
+
+    def stop(self):
+        self._running = False
+        if self._wakeup is not None and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    def stats(self, reset: bool = False) -> Dict[str, dict]:
+        """Per-lane counters plus current depth; reset starts a new reporting window"""
+        report = {}
+        for lane in self.lanes:
+            report[lane.name] = dict(lane.stats.as_dict(), depth=len(lane.items), capacity=lane.capacity)
+            if reset:
+                lane.stats = LaneStats()
+        return report
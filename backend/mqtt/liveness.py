@@ -0,0 +1,194 @@
+"""
+Device liveness tracking
+A hierarchical timing wheel holds one timer per device. Heartbeats only
+move the device's deadline in a dict; when its timer fires, it is either
+rescheduled (the device was heard from since) or the device is expired.
+The cost per tick is the number of timers due, not the fleet size.
+"""
+
+import math
+from datetime import datetime, timezone
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set
+
+WHEEL_BITS = 6                    # 64 slots per level
+WHEEL_SLOTS = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SLOTS - 1
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel with integer ticks
+
+    Level L has 64 slots of 64**L ticks each; a timer sits on the lowest
+    level whose span still covers its deadline and is cascaded down as
+    the wheel turns. Four levels cover 64**4 ticks (about 194 days at
+    one-second ticks); later deadlines wait in an overflow list.
+    """
+
+    def __init__(self, start_tick: int, levels: int = 4):
+        self.now = start_tick
+        self.levels = levels
+        self._wheels: List[List[Set[Hashable]]] = [[set() for _ in range(WHEEL_SLOTS)] for _ in range(levels)]
+        self._deadlines: Dict[Hashable, int] = {}
+        self._due: List[Hashable] = []
+        self._overflow: Set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key: Hashable, deadline: int):
+        """Schedule key to fire at deadline (a key may only be scheduled once at a time)"""
+        self._deadlines[key] = deadline
+        self._place(key, deadline)
+
+    def _place(self, key: Hashable, deadline: int):
+        if deadline <= self.now:
+            self._due.append(key)
+            return
+        for level in range(self.levels):
+            shift = WHEEL_BITS * (level + 1)
+            if deadline >> shift == self.now >> shift:
+                self._wheels[level][(deadline >> (WHEEL_BITS * level)) & WHEEL_MASK].add(key)
+                return
+        self._overflow.add(key)
+
+    def _cascade(self, level: int):
+        slot = self._wheels[level][(self.now >> (WHEEL_BITS * level)) & WHEEL_MASK]
+        keys = list(slot)
+        slot.clear()
+        for key in keys:
+            if key in self._deadlines:  # Stale entries of keys that already fired are dropped
+                self._place(key, self._deadlines[key])
+
+    def advance(self, tick: int) -> List[Hashable]:
+        """Turn the wheel up to tick; returns the keys that fired (and unschedules them)"""
+        fired = self._due
+        self._due = []
+
+        while self.now < tick:
+            self.now += 1
+            if self.now & ((1 << (WHEEL_BITS * self.levels)) - 1) == 0 and self._overflow:
+                overflow = list(self._overflow)
+                self._overflow.clear()
+                for key in overflow:
+                    if key in self._deadlines:
+                        self._place(key, self._deadlines[key])
+            # Higher levels first, so their timers can land in the slots cascaded next
+            for level in range(self.levels - 1, 0, -1):
+                if self.now & ((1 << (WHEEL_BITS * level)) - 1) == 0:
+                    self._cascade(level)
+            slot = self._wheels[0][self.now & WHEEL_MASK]
+            fired.extend(slot)
+            slot.clear()
+            fired.extend(self._due)
+            self._due = []
+
+        # A key fires once even if a stale entry of it was still in a slot
+        unscheduled = []
+        for key in fired:
+            if key in self._deadlines:
+                del self._deadlines[key]
+                unscheduled.append(key)
+        return unscheduled
+
+
+class LivenessTracker:
+    """
+    Online/offline state per device, driven by the messages it sends
+
+    Timeouts are per device type; devices of unknown type use the
+    default. Only the caller decides what a device's type is, so this
+    class has no database access.
+    """
+
+    def __init__(self, timeouts: Dict[str, float], default_timeout: float, now: float, tick_seconds: float = 1.0):
+        self.timeouts = timeouts
+        self.default_timeout = default_timeout
+        self.tick_seconds = tick_seconds
+        self.wheel = TimingWheel(self._tick(now))
+        self.online: Set[str] = set()
+        self._deadline: Dict[str, int] = {}
+
+    def _tick(self, when: float) -> int:
+        return int(when // self.tick_seconds)
+
+    def timeout_for(self, device_type: Optional[str]) -> float:
+        return self.timeouts.get(device_type, self.default_timeout)
+
+    def seen(self, device_id: str, device_type: Optional[str], when: float) -> bool:
+        """
+        Record a message from a device
+
+        Returns:
+            True if the device was offline and is now back online
+        """
+        deadline = self._tick(when) + math.ceil(self.timeout_for(device_type) / self.tick_seconds)
+        previous = self._deadline.get(device_id)
+        if device_id not in self.wheel:  # Still scheduled after mark_offline: tick() pushes it back
+            self.wheel.schedule(device_id, deadline)
+        if previous is None or deadline > previous:
+            self._deadline[device_id] = deadline
+
+        if device_id in self.online:
+            return False
+        self.online.add(device_id)
+        return True
+
+    def mark_offline(self, device_id: str) -> bool:
+        """
+        Device announced it is going offline; True if it was online
+
+        Its timer stays in the wheel and is dropped (or pushed back, if
+        the device is heard from again) when it fires.
+        """
+        self._deadline.pop(device_id, None)
+        if device_id in self.online:
+            self.online.discard(device_id)
+            return True
+        return False
+
+    def tick(self, now: float) -> List[str]:
+        """Advance to now; returns devices that just went offline"""
+        expired = []
+        for device_id in self.wheel.advance(self._tick(now)):
+            deadline = self._deadline.get(device_id)
+            if deadline is None:
+                continue  # Marked offline meanwhile
+            if deadline > self.wheel.now:
+                self.wheel.schedule(device_id, deadline)  # Heard from since: push back
+                continue
+            del self._deadline[device_id]
+            if device_id in self.online:
+                self.online.discard(device_id)
+                expired.append(device_id)
+        return expired
+
+    def load(self, devices: Iterable[Sequence], now: float):
+        """
+        Seed from user_devices so devices that never speak again still expire
+
+        Args:
+            devices: (device_id, device_type, last_seen) rows of devices
+                     currently marked active; last_seen is naive UTC or None
+        """
+        for device_id, device_type, last_seen in devices:
+            device_type = getattr(device_type, "value", device_type)
+            when = last_seen.replace(tzinfo=timezone.utc).timestamp() if last_seen else now
+            self.seen(device_id, device_type, min(when, now))
+
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """Parse "rfid=180,ble_beacon=900" into {"rfid": 180.0, "ble_beacon": 900.0}"""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        device_type, _, seconds = item.partition("=")
+        timeouts[device_type.strip()] = float(seconds)
+    return timeouts
+
+
+def utc_from_timestamp(when: float) -> datetime:
+    """Naive UTC datetime, matching how the other timestamp columns are stored"""
+    return datetime.fromtimestamp(when, timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,82 @@
+"""
+Entry/exit pair matching
+Shared by the live event processor and the historical replay tool, so a
+replay produces exactly what live processing would have
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class Tap:
+    """One RFID read on one device"""
+    device_id: str
+    cluster_id: int
+    rfid: str
+    timestamp: float          # Epoch seconds of the read
+    row_id: Optional[int] = None  # sensor_data.id, if stored
+
+
+class TapMatcher:
+    """
+    In-memory matcher of RFID taps per (cluster, RFID)
+
+    A tap pairs with any pending tap of the same card in the same cluster
+    from a different device within the attendance window. A pair consumes
+    every pending tap for that card; otherwise the tap waits for a partner.
+    """
+
+    def __init__(self, window_seconds: float, purge_every: int = 4096):
+        self.window = window_seconds
+        self.purge_every = purge_every
+        self._pending: Dict[Tuple[int, str], List[Tap]] = {}
+        self._offers = 0
+        self._latest = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(taps) for taps in self._pending.values())
+
+    def offer(self, tap: Tap) -> List[Tap]:
+        """
+        Offer a tap
+
+        Returns:
+            The earlier taps it pairs with (empty if it is now pending)
+        """
+        self._offers += 1
+        self._latest = max(self._latest, tap.timestamp)
+        if self._offers % self.purge_every == 0:
+            self.purge(self._latest)
+
+        key = (tap.cluster_id, tap.rfid)
+        cutoff = tap.timestamp - self.window
+        pending = [p for p in self._pending.get(key, ()) if cutoff <= p.timestamp <= tap.timestamp]
+
+        matched = [p for p in pending if p.device_id != tap.device_id]
+        if matched:
+            self._pending.pop(key, None)
+            return matched
+
+        pending.append(tap)
+        self._pending[key] = pending
+        return []
+
+    def restore(self, tap: Tap, matched: List[Tap]):
+        """Undo an offer whose outcome was not stored: withdraw the tap, put back the taps it consumed"""
+        key = (tap.cluster_id, tap.rfid)
+        pending = sorted([p for p in self._pending.get(key, ()) if p is not tap] + matched,
+                         key=lambda p: p.timestamp)
+        if pending:
+            self._pending[key] = pending
+        else:
+            self._pending.pop(key, None)
+
+    def purge(self, now: float):
+        """Drop taps that can no longer pair"""
+        cutoff = now - self.window
+        self._pending = {
+            key: taps for key, taps in
+            ((key, [t for t in taps if t.timestamp >= cutoff]) for key, taps in self._pending.items())
+            if taps
+        }
@@ -0,0 +1,129 @@
+"""
+Redis-side entry/exit pair matching
+Same semantics as mqtt.matching.TapMatcher, but the pending taps live in
+Redis and each decision is one atomic Lua call, so processors sharing the
+event feed match consistently without touching MySQL.
+
+The zias:events channel is pub/sub: every subscribed processor receives
+every event, so replicas subscribed to it would each record every tap.
+Replicas read the partitioned feed in mqtt.event_stream instead
+(EVENT_FEED=stream), and this matcher pairs taps of one card that landed
+on different replicas; the processor refuses to start with this matcher
+on the pub/sub feed.
+"""
+
+import math
+from typing import List
+
+import redis.asyncio as redis
+
+from mqtt.matching import Tap
+
+PENDING_KEY_PREFIX = "zias:pending"
+
+# KEYS[1]  pending sorted set for one (cluster, RFID), scored by tap time
+# ARGV[1]  tap timestamp (epoch seconds)
+# ARGV[2]  attendance window in seconds
+# ARGV[3]  device ID of the tap
+# ARGV[4]  member encoding the tap: "<row_id>|<timestamp>|<device_id>"
+# ARGV[5]  key TTL in seconds
+# Returns the members of the earlier taps it pairs with, or {} if it is now pending
+OFFER_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local cutoff = now - tonumber(ARGV[2])
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', '(' .. cutoff)
+local pending = redis.call('ZRANGEBYSCORE', key, cutoff, now)
+
+local matched = {}
+for _, member in ipairs(pending) do
+    local device = string.match(member, '^[^|]*|[^|]*|(.*)$')
+    if device ~= ARGV[3] then
+        table.insert(matched, member)
+    end
+end
+
+if #matched > 0 then
+    redis.call('DEL', key)
+    return matched
+end
+
+redis.call('ZREMRANGEBYSCORE', key, '(' .. now, '+inf')
+redis.call('ZADD', key, now, ARGV[4])
+redis.call('EXPIRE', key, ARGV[5])
+return {}
+"""
+
+# KEYS[1]  pending sorted set for one (cluster, RFID)
+# ARGV[1]  key TTL in seconds
+# ARGV[2]  member of the tap to withdraw
+# ARGV[3..] score, member pairs of the taps to put back
+RESTORE_SCRIPT = """
+local key = KEYS[1]
+redis.call('ZREM', key, ARGV[2])
+for i = 3, #ARGV, 2 do
+    redis.call('ZADD', key, ARGV[i], ARGV[i + 1])
+end
+if #ARGV > 2 then
+    redis.call('EXPIRE', key, ARGV[1])
+end
+return 0
+"""
+
+
+class RedisTapMatcher:
+    """
+    Matcher of RFID taps per (cluster, RFID) backed by Redis sorted sets
+
+    Keys expire a little after the attendance window, so taps that never
+    pair need no purge pass.
+    """
+
+    def __init__(self, client: redis.Redis, window_seconds: float):
+        self.window = window_seconds
+        self.ttl = int(math.ceil(window_seconds)) + 1
+        self._offer = client.register_script(OFFER_SCRIPT)
+        self._restore = client.register_script(RESTORE_SCRIPT)
+
+    @staticmethod
+    def key(tap: Tap) -> str:
+        return f"{PENDING_KEY_PREFIX}:{tap.cluster_id}:{tap.rfid}"
+
+    @staticmethod
+    def encode(tap: Tap) -> str:
+        row_id = "" if tap.row_id is None else str(tap.row_id)
+        return f"{row_id}|{tap.timestamp!r}|{tap.device_id}"
+
+    @staticmethod
+    def decode(member, cluster_id: int, rfid: str) -> Tap:
+        if isinstance(member, bytes):
+            member = member.decode()
+        row_id, timestamp, device_id = member.split("|", 2)
+        return Tap(
+            device_id=device_id,
+            cluster_id=cluster_id,
+            rfid=rfid,
+            timestamp=float(timestamp),
+            row_id=int(row_id) if row_id else None
+        )
+
+    async def offer(self, tap: Tap) -> List[Tap]:
+        """
+        Offer a tap
+
+        Returns:
+            The earlier taps it pairs with (empty if it is now pending)
+        """
+        members = await self._offer(
+            keys=[self.key(tap)],
+            args=[repr(tap.timestamp), self.window, tap.device_id, self.encode(tap), self.ttl]
+        )
+        return [self.decode(m, tap.cluster_id, tap.rfid) for m in members]
+
+    async def restore(self, tap: Tap, matched: List[Tap]):
+        """Undo an offer whose outcome was not stored: withdraw the tap, put back the taps it consumed"""
+        args = [self.ttl, self.encode(tap)]
+        for partner in matched:
+            args += [repr(partner.timestamp), self.encode(partner)]
+        await self._restore(keys=[self.key(tap)], args=args)
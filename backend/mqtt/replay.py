@@ -0,0 +1,299 @@
+"""
+Historical replay and reprocessing
+Streams sensor_data and ble_events for a time range through the same
+suppression and matching code the live EventProcessor uses, and rebuilds
+the entry_log rows for that range.
+
+Usage:
+    python -m mqtt.replay --from 2026-03-02T00:00 --to 2026-03-03T00:00 --dry-run
+    python -m mqtt.replay --from 2026-03-02T00:00 --to 2026-03-03T00:00 --swap
+"""
+
+import argparse
+import heapq
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import (
+    Column, DateTime, Float, Integer, MetaData, String, Table, delete, insert, select
+)
+from sqlalchemy.orm import Session
+
+from api.config import settings
+from api.database import engine, get_db_session
+from api.log import setup_logging
+from api.db_models import BLEEvent, EntryLog, SensorData, Student
+from mqtt.event_processor import EventProcessor
+
+# Replayed sources; rows from other sources (API, face) are left alone on swap
+REPLAYED_SOURCES = ("rfid", "ble")
+ENTRY_LOG_COLUMNS = ("student_name", "RFID", "room_value", "status", "timestamp", "confidence", "source")
+
+shadow_metadata = MetaData()
+entry_log_replay = Table(
+    "entry_log_replay",
+    shadow_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("student_name", String(100)),
+    Column("RFID", String(50), nullable=False, index=True),
+    Column("room_value", String(50)),
+    Column("status", Integer, nullable=False),
+    Column("timestamp", DateTime, index=True),
+    Column("confidence", Float),
+    Column("source", String(20)),
+    mysql_engine="InnoDB",
+    mysql_charset="utf8mb4"
+)
+
+
+def stream_sensor_events(db: Session, start: datetime, end: datetime) -> Iterator[Tuple]:
+    """
+    RFID reads in (time_stamp, id) order from a server-side cursor
+
+    Time order, not id order: spool replays and edge uploads insert rows
+    late with older timestamps, and the merge below needs each stream
+    sorted by time. The time_stamp index (which carries id) serves it.
+    """
+    query = select(
+        SensorData.id,
+        SensorData.device_ID,
+        SensorData.cluster_ID,
+        SensorData.RFID,
+        SensorData.time_stamp
+    ).where(
+        SensorData.time_stamp >= start,
+        SensorData.time_stamp < end,
+        SensorData.RFID.isnot(None),
+        SensorData.RFID != ''
+    ).order_by(SensorData.time_stamp, SensorData.id).execution_options(yield_per=settings.REPLAY_BATCH_SIZE)
+
+    for row_id, device_id, cluster_id, rfid, ts in db.execute(query):
+        yield ts, 0, row_id, {
+            'type': 'sensor',
+            'device_id': device_id,
+            'cluster_id': cluster_id,
+            'rfid': rfid,
+            'timestamp': ts.isoformat()
+        }
+
+
+def stream_ble_events(db: Session, start: datetime, end: datetime) -> Iterator[Tuple]:
+    """BLE entry/exit reports in (timestamp, id) order from a server-side cursor"""
+    query = select(
+        BLEEvent.id,
+        BLEEvent.student_id,
+        BLEEvent.beacon_uuid,
+        BLEEvent.event_type,
+        BLEEvent.latitude,
+        BLEEvent.longitude,
+        BLEEvent.timestamp
+    ).where(
+        BLEEvent.timestamp >= start,
+        BLEEvent.timestamp < end,
+        BLEEvent.event_type.in_(['entry', 'exit'])
+    ).order_by(BLEEvent.timestamp, BLEEvent.id).execution_options(yield_per=settings.REPLAY_BATCH_SIZE)
+
+    for row_id, student_id, beacon_uuid, event_type, lat, lon, ts in db.execute(query):
+        yield ts, 1, row_id, {
+            'type': 'ble',
+            'student_id': student_id,
+            'beacon_uuid': beacon_uuid,
+            'event_type': event_type,
+            'location': {'latitude': lat, 'longitude': lon},
+            'timestamp': ts.isoformat()
+        }
+
+
+def replay_events(processor: EventProcessor, events: Iterator[Tuple], students: Dict) -> Iterator[dict]:
+    """
+    Turn merged sensor/BLE events into entry_log rows
+
+    Args:
+        processor: EventProcessor with indexes loaded (no Redis or spool)
+        events: (timestamp, kind, id, event) tuples in time order
+        students: {'rfid': {RFID: name}, 'id': {student_id: (RFID, name)}}
+    """
+    for _, _, row_id, event in events:
+        if processor.is_repeat(event):
+            continue
+
+        if event['type'] == 'sensor':
+            decision, _ = processor.decide_sensor_pair(event, row_id)
+            if decision:
+                yield dict(student_name=students['rfid'].get(decision['RFID'], "Unknown"), **decision)
+        else:
+            decision = processor.decide_ble_entry_exit(event)
+            student = students['id'].get(event['student_id'])
+            if decision and student:
+                yield dict(RFID=student[0] or '', student_name=student[1], **decision)
+
+
+def load_students(db: Session) -> Dict:
+    rows = db.execute(select(Student.student_id, Student.RFID, Student.stud_name)).all()
+    return {
+        'rfid': {rfid: name for _, rfid, name in rows if rfid},
+        'id': {student_id: (rfid, name) for student_id, rfid, name in rows}
+    }
+
+
+def diff_entry_logs(replayed: List[dict], existing: List[Tuple], tolerance: float) -> Dict:
+    """
+    Compare replayed rows with existing entry_log rows
+
+    Rows match on (RFID, room, status, source) with timestamps within
+    tolerance seconds; live rows written before replay support carry the
+    processing time rather than the read time, hence the tolerance.
+    """
+    def group(rows):
+        grouped = defaultdict(list)
+        for rfid, room, status, source, ts in rows:
+            grouped[(rfid, room, status, source)].append(ts.timestamp())
+        return grouped
+
+    new = group((r['RFID'], r['room_value'], r['status'], r['source'], r['timestamp']) for r in replayed)
+    old = group(existing)
+
+    matched = added = removed = 0
+    samples = []
+    for key in new.keys() | old.keys():
+        a, b = sorted(new.get(key, ())), sorted(old.get(key, ()))
+        i = j = 0
+        while i < len(a) and j < len(b):
+            if abs(a[i] - b[j]) <= tolerance:
+                matched += 1
+                i += 1
+                j += 1
+            elif a[i] < b[j]:
+                added += 1
+                if len(samples) < 20:
+                    samples.append(("+",) + key + (datetime.fromtimestamp(a[i]).isoformat(),))
+                i += 1
+            else:
+                removed += 1
+                if len(samples) < 20:
+                    samples.append(("-",) + key + (datetime.fromtimestamp(b[j]).isoformat(),))
+                j += 1
+        added += len(a) - i
+        removed += len(b) - j
+        samples.extend(("+",) + key + (datetime.fromtimestamp(t).isoformat(),) for t in a[i:][:max(0, 20 - len(samples))])
+        samples.extend(("-",) + key + (datetime.fromtimestamp(t).isoformat(),) for t in b[j:][:max(0, 20 - len(samples))])
+
+    return {"unchanged": matched, "added": added, "removed": removed, "samples": samples}
+
+
+def swap_in(db: Session, start: datetime, end: datetime) -> int:
+    """Atomically replace replayed-source rows in the range with the shadow table"""
+    with db.begin():
+        db.execute(delete(EntryLog).where(
+            EntryLog.timestamp >= start,
+            EntryLog.timestamp < end,
+            EntryLog.source.in_(REPLAYED_SOURCES)
+        ))
+        columns = [getattr(EntryLog, c) for c in ENTRY_LOG_COLUMNS]
+        result = db.execute(insert(EntryLog).from_select(
+            columns,
+            select(*[entry_log_replay.c[c] for c in ENTRY_LOG_COLUMNS])
+        ))
+    return result.rowcount
+
+
+def run_replay(start: datetime, end: datetime, dry_run: bool, swap: bool, tolerance: float) -> Dict:
+    """Replay a time range; returns run statistics"""
+    started = time.monotonic()
+    processor = EventProcessor()
+    processor.reload_indexes()
+
+    with get_db_session() as db:
+        students = load_students(db)
+
+    if not dry_run:
+        entry_log_replay.drop(engine, checkfirst=True)
+        entry_log_replay.create(engine)
+
+    replayed: List[dict] = []
+    written = 0
+    batch: List[dict] = []
+
+    with get_db_session() as sensor_db, get_db_session() as ble_db, get_db_session() as write_db:
+        merged = heapq.merge(
+            stream_sensor_events(sensor_db, start, end),
+            stream_ble_events(ble_db, start, end),
+            key=lambda item: item[:3]
+        )
+        for row in replay_events(processor, merged, students):
+            if dry_run:
+                replayed.append(row)
+                continue
+            batch.append(row)
+            if len(batch) >= settings.REPLAY_BATCH_SIZE:
+                write_db.execute(insert(entry_log_replay), batch)
+                write_db.commit()
+                written += len(batch)
+                batch = []
+
+        if batch:
+            write_db.execute(insert(entry_log_replay), batch)
+            write_db.commit()
+            written += len(batch)
+
+    stats = {
+        "range": [start.isoformat(), end.isoformat()],
+        "sensor_reads_suppressed": processor.rfid_suppressor.suppressed,
+        "ble_reports_suppressed": processor.ble_suppressor.suppressed,
+        "entry_log_rows": len(replayed) if dry_run else written,
+    }
+
+    if dry_run:
+        with get_db_session() as db:
+            existing = db.execute(select(
+                EntryLog.RFID, EntryLog.room_value, EntryLog.status, EntryLog.source, EntryLog.timestamp
+            ).where(
+                EntryLog.timestamp >= start,
+                EntryLog.timestamp < end,
+                EntryLog.source.in_(REPLAYED_SOURCES)
+            )).all()
+        stats["diff"] = diff_entry_logs(replayed, existing, tolerance)
+    elif swap:
+        with get_db_session() as db:
+            stats["swapped_in"] = swap_in(db, start, end)
+
+    stats["elapsed_seconds"] = round(time.monotonic() - started, 2)
+    return stats
+
+
+def main():
+    """CLI entry point"""
+    parser = argparse.ArgumentParser(description="Replay sensor/BLE history into entry_log")
+    parser.add_argument("--from", dest="start", required=True, type=datetime.fromisoformat)
+    parser.add_argument("--to", dest="end", required=True, type=datetime.fromisoformat)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="Diff against entry_log, write nothing")
+    mode.add_argument("--swap", action="store_true", help="Replace the range in entry_log atomically")
+    parser.add_argument("--tolerance", type=float, default=settings.ATTENDANCE_WINDOW_SECONDS,
+                        help="Seconds of timestamp drift tolerated when diffing")
+    args = parser.parse_args()
+    setup_logging("replay")
+
+    if args.end <= args.start:
+        parser.error("--to must be after --from")
+
+    stats = run_replay(args.start, args.end, args.dry_run, args.swap, args.tolerance)
+
+    print(f"Replayed {stats['range'][0]} .. {stats['range'][1]} in {stats['elapsed_seconds']}s")
+    print(f"  entry_log rows: {stats['entry_log_rows']}")
+    print(f"  suppressed: {stats['sensor_reads_suppressed']} sensor, {stats['ble_reports_suppressed']} BLE")
+    if "diff" in stats:
+        diff = stats["diff"]
+        print(f"  diff: {diff['unchanged']} unchanged, {diff['added']} added, {diff['removed']} removed")
+        for sample in diff["samples"]:
+            print("    " + " ".join(str(v) for v in sample))
+    elif "swapped_in" in stats:
+        print(f"  swapped {stats['swapped_in']} rows into entry_log")
+    else:
+        print(f"  written to {entry_log_replay.name}; rerun with --swap to apply")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Local durable spool
+Append-only, segment-rotated event log used by the ingest path when
+MySQL or Redis is unreachable or too slow. A replayer drains it in bulk
+batches once the store recovers.
+
+Record format: <length:uint32><crc32:uint32><json bytes>
+"""
+
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from api.log import get_logger
+
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_FILE = "checkpoint"
+LOCK_FILE = ".lock"
+
+log = get_logger("mqtt.spool")
+
+
+def claim_spool_dir(base_dir: str, name: str, max_instances: int = 64) -> Tuple[str, int]:
+    """
+    Claim a spool directory for this process
+
+    Several processes on one host get name, name-1, name-2, ... A
+    restarted process claims the lowest free directory, so it also
+    drains whatever a previous instance left behind.
+
+    Returns:
+        (directory, lock_fd)
+    """
+    for i in range(max_instances):
+        directory = os.path.join(base_dir, name if i == 0 else f"{name}-{i}")
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return directory, fd
+        except BlockingIOError:
+            os.close(fd)
+    raise RuntimeError(f"No free spool directory for {name} under {base_dir}")
+
+
+class EventSpool:
+    """
+    Append-only spool of JSON events split into fixed-size segments
+
+    Writes go through a buffered file and are fsynced every fsync_every
+    records or fsync_interval_ms, whichever comes first. Readers only
+    see sealed segments; the active one is sealed on demand.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int,
+        fsync_every: int,
+        fsync_interval_ms: int
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval_ms / 1000.0
+
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_seq = self._segments()[-1] + 1 if self._segments() else 0
+        self._active_size = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._pending = bool(self._segments())
+        self.appended = 0
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{seq:012d}{SEGMENT_SUFFIX}")
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _sync(self):
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _seal(self):
+        """Close the active segment; the next append opens a new one"""
+        if self._active is not None:
+            self._sync()
+            self._active.close()
+            self._active = None
+            self._active_seq += 1
+            self._active_size = 0
+
+    def append(self, event: dict):
+        """Append one event"""
+        data = json.dumps(event, separators=(",", ":")).encode()
+        record = RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+        with self._lock:
+            if self._active is None:
+                self._active = open(self._path(self._active_seq), "ab", buffering=1 << 20)
+                self._active_size = self._active.tell()
+
+            self._active.write(record)
+            self._pending = True
+            self._active_size += len(record)
+            self._unsynced += 1
+            self.appended += 1
+
+            if self._active_size >= self.segment_bytes:
+                self._seal()
+            elif (
+                (self.fsync_every and self._unsynced >= self.fsync_every)
+                or time.monotonic() - self._last_sync >= self.fsync_interval
+            ):
+                self._sync()
+
+    def flush(self):
+        """Force buffered records to disk"""
+        with self._lock:
+            if self._active is not None and self._unsynced:
+                self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._active is not None:
+                self._sync()
+                self._active.close()
+                self._active = None
+
+    def _checkpoint(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as f:
+                seq, offset = f.read().split()
+                return int(seq), int(offset)
+        except (FileNotFoundError, ValueError):
+            return -1, 0
+
+    def _write_checkpoint(self, seq: int, offset: int):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{seq} {offset}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def has_pending(self) -> bool:
+        """True if any spooled event has not been replayed yet (cheap, no I/O)"""
+        return self._pending
+
+    def read_batch(self, max_records: int) -> Tuple[List[dict], Optional[Tuple[int, int]]]:
+        """
+        Read up to max_records from the oldest sealed segment
+
+        Returns (events, cursor); pass the cursor to commit() once the
+        events are safely stored downstream.
+        """
+        with self._lock:
+            sealed = [seq for seq in self._segments() if self._active is None or seq != self._active_seq]
+            if not sealed and self._active is not None:
+                self._seal()
+                sealed = self._segments()
+        if not sealed:
+            return [], None
+
+        seq = sealed[0]
+        checkpoint_seq, offset = self._checkpoint()
+        if checkpoint_seq != seq:
+            offset = 0
+
+        events = []
+        with open(self._path(seq), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= offset:
+                return [], (seq, -1)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                while len(events) < max_records and offset + RECORD_HEADER.size <= size:
+                    length, crc = RECORD_HEADER.unpack_from(buf, offset)
+                    start = offset + RECORD_HEADER.size
+                    data = buf[start:start + length]
+                    if len(data) < length or zlib.crc32(data) != crc:
+                        log.warning("Spool segment %d truncated at offset %d, skipping remainder", seq, offset)
+                        offset = size
+                        break
+                    events.append(json.loads(data))
+                    offset = start + length
+                if len(events) < max_records:
+                    # Anything left is a torn partial header from a crash
+                    offset = size
+
+        return events, (seq, -1 if offset >= size else offset)
+
+    def commit(self, cursor: Tuple[int, int]):
+        """Advance past a replayed batch; fully drained segments are deleted"""
+        seq, offset = cursor
+        if offset < 0:
+            os.remove(self._path(seq))
+            self._write_checkpoint(seq + 1, 0)
+            with self._lock:
+                # Segments are created on first append and deleted once drained
+                self._pending = bool(self._segments())
+        else:
+            self._write_checkpoint(seq, offset)
+
+
+class SpoolReplayer:
+    """Drains a spool into a sink in bulk batches, rate limited"""
+
+    def __init__(
+        self,
+        spool: EventSpool,
+        sink: Callable[[List[dict]], Awaitable[None]],
+        batch_size: int,
+        max_events_per_second: int,
+        interval_seconds: float
+    ):
+        self.spool = spool
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_rate = max_events_per_second
+        self.interval = interval_seconds
+        self.replayed = 0
+        self._running = False
+
+    async def drain(self) -> int:
+        """Replay until the spool is empty or the sink fails; returns events replayed"""
+        replayed = 0
+        while True:
+            events, cursor = self.spool.read_batch(self.batch_size)
+            if cursor is None:
+                return replayed
+            if events:
+                started = time.monotonic()
+                await self.sink(events)
+                replayed += len(events)
+                self.replayed += len(events)
+                # Stay under the configured replay throughput
+                min_duration = len(events) / self.max_rate if self.max_rate else 0
+                elapsed = time.monotonic() - started
+                if elapsed < min_duration:
+                    await asyncio.sleep(min_duration - elapsed)
+            self.spool.commit(cursor)
+
+    async def run(self):
+        """Background loop: wait for spooled events, then drain them"""
+        self._running = True
+        while self._running:
+            await asyncio.sleep(self.interval)
+            if not self.spool.has_pending():
+                continue
+            try:
+                count = await self.drain()
+                if count:
+                    log.info("Replayed %d spooled events from %s", count, self.spool.directory)
+            except Exception as e:
+                log.warning("Spool replay paused, downstream still failing: %s", e)
+
+    def stop(self):
+        self._running = False
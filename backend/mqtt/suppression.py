@@ -0,0 +1,61 @@
+"""
+In-memory TTL suppression for repeated device events
+Drops card-held-on-reader bursts and repeated app reports before any
+database work happens
+"""
+
+from typing import Any, Dict, Hashable, Tuple
+
+
+class TTLSuppressor:
+    """
+    Remembers recently seen keys for a fixed window
+
+    A key is suppressed while it is live and was last seen with the same
+    value. The window is measured from the first accepted event, so a
+    card held on the reader produces one event per window, not one event
+    per burst. All times are event times in epoch seconds, so one
+    instance never mixes clocks.
+    """
+
+    def __init__(self, window_seconds: float, purge_every: int = 1024):
+        self.window = window_seconds
+        self.purge_every = purge_every
+        self._seen: Dict[Hashable, Tuple[float, Any]] = {}
+        self._checks = 0
+        self.accepted = 0
+        self.suppressed = 0
+
+    def should_suppress(self, key: Hashable, value: Any = None, *, now: float) -> bool:
+        """
+        Check a key and record it if accepted
+
+        Args:
+            key: Event identity, e.g. (device_id, rfid)
+            value: Extra state that must also match to count as a repeat
+            now: Event time in epoch seconds
+        """
+        self._checks += 1
+        if self._checks % self.purge_every == 0:
+            self.purge(now)
+
+        seen = self._seen.get(key)
+        if seen is not None and now - seen[0] < self.window and seen[1] == value:
+            self.suppressed += 1
+            return True
+
+        self._seen[key] = (now, value)
+        self.accepted += 1
+        return False
+
+    def purge(self, now: float):
+        """Drop expired keys so memory stays bounded by the event rate"""
+        cutoff = now - self.window
+        self._seen = {k: v for k, v in self._seen.items() if v[0] >= cutoff}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "accepted": self.accepted,
+            "suppressed": self.suppressed,
+            "tracked_keys": len(self._seen)
+        }
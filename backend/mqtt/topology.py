@@ -0,0 +1,111 @@
+"""
+Device topology index
+Precomputed cluster -> devices, direction role and room, built from
+user_devices so the processor and cron resolve entry/exit and room
+without string heuristics or per-event queries
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from api.db_models import UserDevice
+from api.log import get_logger
+
+log = get_logger("mqtt.topology")
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    """Resolved role of one device"""
+    device_id: str
+    cluster_id: int
+    room: str
+    is_entry: bool
+    device_type: str
+
+
+def _legacy_is_entry(device_id: str) -> bool:
+    """Pre-topology rule: device ID ending in even digit = entry, odd = exit"""
+    return int(device_id[-1]) % 2 == 0 if device_id and device_id[-1].isdigit() else True
+
+
+class DeviceTopology:
+    """
+    In-memory view of user_devices
+
+    Devices without an explicit direction get the legacy device-ID
+    parity rule applied once here, at load time, so existing
+    installations keep their behaviour.
+    """
+
+    def __init__(self):
+        self._devices: Dict[str, DeviceInfo] = {}
+        self._clusters: Dict[int, Tuple[str, ...]] = {}
+        self._cluster_rooms: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def load(self, rows: Iterable[Sequence]):
+        """
+        Build a new index and swap it in
+
+        Args:
+            rows: (device_id, cluster_ID, room_value, direction, device_type) rows;
+                  direction and device_type may be enums or plain strings
+        """
+        devices: Dict[str, DeviceInfo] = {}
+        clusters: Dict[int, list] = {}
+        cluster_rooms: Dict[int, str] = {}
+
+        for device_id, cluster_id, room, direction, device_type in rows:
+            direction = getattr(direction, "value", direction)
+            is_entry = direction == "entry" if direction else _legacy_is_entry(device_id)
+            devices[device_id] = DeviceInfo(
+                device_id=device_id,
+                cluster_id=cluster_id,
+                room=room,
+                is_entry=is_entry,
+                device_type=getattr(device_type, "value", device_type)
+            )
+            clusters.setdefault(cluster_id, []).append(device_id)
+            cluster_rooms.setdefault(cluster_id, room)
+
+        self._devices = devices
+        self._clusters = {cluster: tuple(sorted(ids)) for cluster, ids in clusters.items()}
+        self._cluster_rooms = cluster_rooms
+
+    def reload(self, db: Session):
+        """Reload the index from user_devices"""
+        self.load(db.query(
+            UserDevice.device_id,
+            UserDevice.cluster_ID,
+            UserDevice.room_value,
+            UserDevice.direction,
+            UserDevice.device_type
+        ).all())
+        log.info("Device topology loaded: %d devices in %d clusters", len(self), len(self._clusters))
+
+    def device(self, device_id: str) -> Optional[DeviceInfo]:
+        return self._devices.get(device_id)
+
+    def cluster_devices(self, cluster_id: int) -> Tuple[str, ...]:
+        return self._clusters.get(cluster_id, ())
+
+    def cluster_room(self, cluster_id: int) -> Optional[str]:
+        return self._cluster_rooms.get(cluster_id)
+
+    def resolve(self, device_id: str, cluster_id: int) -> Tuple[bool, str]:
+        """
+        Direction and room for an event from device_id
+
+        Returns (is_entry, room). Unregistered devices count as entry and
+        take their cluster's room, or "cluster_<id>" if the cluster is
+        unknown too.
+        """
+        info = self._devices.get(device_id)
+        if info is not None:
+            return info.is_entry, info.room
+        return True, self._cluster_rooms.get(cluster_id, f"cluster_{cluster_id}")
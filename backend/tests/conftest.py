@@ -0,0 +1,7 @@
+"""Run from backend/ (python -m pytest tests); settings need these to import"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_PASSWORD", "test")
+os.environ.setdefault("JWT_SECRET_KEY", "test")
@@ -0,0 +1,34 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import orjson
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from api.db_models import Base, EntryLog, Student
+from api.routes.attendance import get_attendance_records
+
+
+def test_date_to_only_request_windows_back_from_date_to():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.add(Student(student_id="S1", stud_name="Ann", RFID="AA"))
+    last_month = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=40)
+    db.add_all([EntryLog(RFID="AA", student_name="Ann", room_value="room_101", status=1,
+                         timestamp=last_month - timedelta(minutes=n)) for n in range(5)])
+    db.commit()
+
+    selects = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, *args):
+        if statement.startswith("SELECT"):
+            selects.append(statement)
+
+    response = asyncio.run(get_attendance_records(
+        student_id=None, room=None, date_from=None, date_to=last_month.date(), limit=5,
+        current_user={}, db=db
+    ))
+    assert len(orjson.loads(response.body)) == 5
+    assert len(selects) == 1
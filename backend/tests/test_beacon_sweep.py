@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+from api.config import settings
+from mqtt.event_processor import EventProcessor
+
+
+def test_far_rows_are_kept_until_written(monkeypatch):
+    monkeypatch.setattr(settings, "BLE_FILTER_SWEEP_SECONDS", 0)
+    processor = EventProcessor()
+    for _ in range(10):
+        processor.beacon_filters.update(("S1", "beacon-1"), -50.0, time.time() - 3600)
+
+    written = []
+    attempts = []
+
+    def write(rows):
+        attempts.append(len(rows))
+        if len(attempts) == 1:
+            raise ConnectionError("database down")
+        written.extend(rows)
+
+    monkeypatch.setattr(processor, "write_far_events", write)
+
+    async def sweep():
+        task = asyncio.create_task(processor.run_beacon_sweep())
+        while not written:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(sweep(), 5))
+    assert attempts[:2] == [1, 1]
+    assert [(r["student_id"], r["beacon_uuid"], r["event_type"]) for r in written] == [("S1", "beacon-1", "far")]
+    assert processor._far_pending == []
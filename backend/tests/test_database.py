@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+
+from api import database
+from api.database import migrate
+from api.db_models import Base
+
+
+def test_migrate_adds_missing_columns_and_indexes_once():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE user_devices (device_id VARCHAR(50) PRIMARY KEY, cluster_ID INT, "
+                          "device_type VARCHAR(10), room_value VARCHAR(50))"))
+        conn.execute(text("CREATE INDEX idx_updated_elsewhere ON user_devices (room_value)"))
+        conn.execute(text("CREATE TABLE entry_log (id INTEGER PRIMARY KEY, RFID VARCHAR(50), "
+                          "room_value VARCHAR(50), status INT, timestamp DATETIME)"))
+
+    assert migrate(engine) == [
+        "user_devices.direction",
+        "user_devices.updated_at",
+        "user_devices.ix_user_devices_updated_at",
+        "entry_log.idx_entry_log_room_time",
+    ]
+    assert migrate(engine) == []
+
+    inspector = inspect(engine)
+    assert {"direction", "updated_at"} <= {c["name"] for c in inspector.get_columns("user_devices")}
+    assert ["room_value", "timestamp"] in [i["column_names"] for i in inspector.get_indexes("entry_log")]
+
+
+def test_migrate_skips_index_present_under_another_name():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE entry_log (id INTEGER PRIMARY KEY, RFID VARCHAR(50), "
+                          "room_value VARCHAR(50), status INT, timestamp DATETIME)"))
+        conn.execute(text("CREATE INDEX idx_room_ts ON entry_log (room_value, timestamp)"))
+
+    assert migrate(engine) == []
+
+
+def use_engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    monkeypatch.setattr(database, "engine", engine)
+    return engine
+
+
+def test_init_db_replaces_a_stale_fingerprint(monkeypatch):
+    engine = use_engine(monkeypatch)
+    Base.metadata.tables["schema_fingerprint"].create(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO schema_fingerprint (id, fingerprint) VALUES (1, 'stale')"))
+
+    database.init_db()
+    with engine.connect() as conn:
+        assert database.stored_fingerprint(conn) == database.schema_fingerprint(engine)
+        assert conn.execute(text("SELECT COUNT(*) FROM schema_fingerprint")).scalar() == 1
+
+
+def test_init_db_skips_schema_updated_while_waiting_for_the_lock(monkeypatch):
+    engine = use_engine(monkeypatch)
+    fingerprint = database.schema_fingerprint(engine)
+    lock = database.schema_lock
+
+    @contextmanager
+    def slow_lock(conn):
+        # Another worker updates the schema while this one waits
+        Base.metadata.tables["schema_fingerprint"].create(engine)
+        database.store_fingerprint(conn, fingerprint)
+        with lock(conn):
+            yield
+
+    monkeypatch.setattr(database, "schema_lock", slow_lock)
+    monkeypatch.setattr(Base.metadata, "create_all", lambda **kwargs: pytest.fail("schema updated twice"))
+    database.init_db()
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+from mqtt import client as mqtt_client
+from mqtt.client import MQTTClient
+from mqtt.dedup import DedupIndex, event_identity
+
+
+class Clock:
+    """Stands in for datetime in mqtt.client; each utcnow() is a second later"""
+
+    now = datetime(2026, 6, 1, 9)
+
+    @classmethod
+    def utcnow(cls):
+        cls.now += timedelta(seconds=1)
+        return cls.now
+
+
+def test_redelivered_ble_event_is_a_duplicate(monkeypatch):
+    monkeypatch.setattr(mqtt_client, "datetime", Clock)
+    client = MQTTClient()
+    offered = []
+    monkeypatch.setattr(client.lanes, "offer", lambda lane, event: offered.append(event))
+
+    payload = {"beacon_uuid": "B1", "rssi": -61, "event_type": "entry", "app_version": "2.1",
+               "timestamp": "2026-06-01T08:59:58"}
+    client.handle_beacon_event("S1", payload)
+    client.handle_beacon_event("S1", dict(payload))  # QoS 1 redelivery, stamped again on arrival
+    client.handle_beacon_event("S1", dict(payload, timestamp="2026-06-01T09:04:10"))  # A later report
+
+    assert offered[0]["timestamp"] != offered[1]["timestamp"]
+    dedup = DedupIndex(3600)
+    assert [dedup.check_and_add(event_identity(event), now=0) for event in offered] == [False, True, False]
@@ -0,0 +1,52 @@
+import asyncio
+
+import fakeredis.aioredis
+
+from mqtt import event_stream
+from mqtt.event_stream import EventStreamReader
+
+
+async def publish(client, count):
+    pipe = client.pipeline(transaction=False)
+    for n in range(count):
+        event_stream.append(pipe, f'{{"n": {n}}}', maxlen=1000)
+    await pipe.execute()
+
+
+def test_each_event_goes_to_one_consumer():
+    async def run():
+        client = fakeredis.aioredis.FakeRedis()
+        readers = [EventStreamReader(client, name, batch=3, block_ms=10) for name in ("p1", "p2")]
+        await readers[0].ensure_group()
+        await readers[1].ensure_group()  # Second replica finds the group already there
+        await publish(client, 10)
+
+        seen = {"p1": [], "p2": []}
+        for _ in range(4):
+            for reader in readers:
+                entries = await reader.read()
+                seen[reader.consumer] += [data for _, data in entries]
+                await reader.ack([entry_id for entry_id, _ in entries])
+        return seen
+
+    seen = asyncio.run(run())
+    assert seen["p1"] and seen["p2"]
+    assert sorted(seen["p1"] + seen["p2"]) == sorted(f'{{"n": {n}}}'.encode() for n in range(10))
+
+
+def test_unacknowledged_events_are_claimed_by_another_consumer():
+    async def run():
+        client = fakeredis.aioredis.FakeRedis()
+        dead = EventStreamReader(client, "dead", block_ms=10)
+        await dead.ensure_group()
+        await publish(client, 2)
+        assert len(await dead.read()) == 2  # Read, never acknowledged
+
+        alive = EventStreamReader(client, "alive", block_ms=10, claim_idle_seconds=0)
+        claimed = await alive.read()
+        await alive.ack([entry_id for entry_id, _ in claimed])
+        return claimed, await alive.read()
+
+    claimed, after = asyncio.run(run())
+    assert [data for _, data in claimed] == [b'{"n": 0}', b'{"n": 1}']
+    assert after == []
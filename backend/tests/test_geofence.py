@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from mqtt.event_processor import EventProcessor
+from mqtt.geofence import GeofenceIndex
+
+BEACONS = [
+    ("beacon-101", "room_101", 52.52000, 13.40500, 30.0),
+    ("beacon-102", "room_102", 52.52060, 13.40500, None),  # Default radius
+    ("beacon-lab", "lab", None, None, None),  # Registered without a position
+]
+
+
+def index():
+    geofence = GeofenceIndex(default_radius_meters=50.0)
+    geofence.load(BEACONS)
+    return geofence
+
+
+def test_inside_fence():
+    check = index().validate("beacon-101", 52.52010, 13.40500)  # About 11 m north
+    assert check.room == "room_101" and check.inside
+    assert 10 < check.distance_meters < 12
+
+
+def test_outside_fence():
+    check = index().validate("beacon-101", 52.52050, 13.40500)  # About 56 m north, fence is 30 m
+    assert check.room == "room_101" and not check.inside
+
+
+def test_missing_location_or_position_is_not_checked():
+    geofence = index()
+    assert geofence.validate("beacon-101", None, None).inside
+    assert geofence.validate("beacon-lab", 0.0, 0.0).room == "lab"
+    assert geofence.validate("beacon-lab", 0.0, 0.0).inside
+    check = geofence.validate("unregistered", 52.52, 13.405)
+    assert check.room is None and check.inside
+
+
+def test_nearest_room():
+    geofence = index()
+    assert geofence.nearest_room(52.52025, 13.40500) == "room_101"  # Inside both fences, nearer 101
+    assert geofence.nearest_room(52.52045, 13.40500) == "room_102"  # Outside 101's 30 m fence
+    assert geofence.nearest_room(52.53000, 13.40500) is None
+    assert GeofenceIndex(50.0).nearest_room(52.52, 13.405) is None
+
+
+def test_reload_queries_off_the_event_loop():
+    processor = EventProcessor()
+    threads = []
+    processor.reload_indexes = lambda target=None: threads.append((target, threading.current_thread()))
+
+    asyncio.run(processor.handle_reload(b'{"target": "geofence"}'))
+    assert threads and threads[0][0] == "geofence"
+    assert threads[0][1] is not threading.main_thread()
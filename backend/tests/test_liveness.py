@@ -0,0 +1,79 @@
+import random
+
+from mqtt.liveness import LivenessTracker, TimingWheel
+
+
+def tracker(now=0.0):
+    return LivenessTracker({"rfid": 60}, 120, now=now)
+
+
+def test_expires_after_timeout():
+    t = tracker()
+    assert t.seen("d1", "rfid", 0)
+    assert t.tick(59) == []
+    assert t.tick(61) == ["d1"]
+    assert "d1" not in t.online
+
+
+def test_heartbeat_pushes_deadline_back():
+    t = tracker()
+    t.seen("d1", "rfid", 0)
+    assert not t.seen("d1", "rfid", 50)
+    assert t.tick(70) == []
+    assert t.tick(111) == ["d1"]
+
+
+def test_offline_then_seen_then_tick():
+    t = tracker()
+    t.seen("d1", "rfid", 0)
+    assert t.mark_offline("d1")
+    assert t.seen("d1", "rfid", 5)  # Reconnect heartbeat
+    assert t.tick(10) == []
+    assert t.tick(70) == ["d1"]  # Old and new deadlines both pass in one tick
+    assert len(t.wheel) == 0
+
+
+def test_offline_then_seen_pushes_old_timer_back():
+    t = tracker()
+    t.seen("d1", "rfid", 0)
+    t.mark_offline("d1")
+    t.seen("d1", "rfid", 5)
+    assert t.tick(64) == []
+    assert t.tick(66) == ["d1"]
+
+
+def test_offline_without_reconnect_does_not_expire_again():
+    t = tracker()
+    t.seen("d1", "rfid", 0)
+    t.mark_offline("d1")
+    assert t.tick(100) == []
+    assert len(t.wheel) == 0
+
+
+def test_wheel_fires_each_key_once():
+    wheel = TimingWheel(0)
+    wheel.schedule("a", 5)
+    wheel._place("a", 7)  # Stale second entry
+    assert wheel.advance(10) == ["a"]
+    assert wheel.advance(20) == []
+
+
+def test_fuzz_matches_reference():
+    rng = random.Random(7)
+    t = tracker()
+    last_seen = {}
+    now = 0.0
+    for _ in range(5000):
+        now += rng.random() * 3
+        device = f"d{rng.randrange(20)}"
+        action = rng.random()
+        if action < 0.6:
+            t.seen(device, "rfid", now)
+            last_seen[device] = now
+        elif action < 0.7:
+            t.mark_offline(device)
+            last_seen.pop(device, None)
+        for expired in t.tick(now):
+            assert now - last_seen.pop(expired) >= 59
+        for device in t.online:
+            assert now - last_seen[device] <= 61
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_cron(cwd, *args, **env):
+    """Run Python in a directory without a .env, with only the given settings"""
+    clean = {k: v for k, v in os.environ.items() if k not in ("DB_PASSWORD", "JWT_SECRET_KEY")}
+    clean.update(env, PYTHONPATH=BACKEND)
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=clean, capture_output=True, text=True)
+
+
+def test_cron_needs_no_api_settings(tmp_path):
+    assert run_cron(tmp_path, "-c", "import master_cron", DB_PASSWORD="x").returncode == 0
+
+
+def test_cron_reports_missing_db_password(tmp_path):
+    result = run_cron(tmp_path, os.path.join(BACKEND, "master_cron.py"))
+    assert result.returncode == 1
+    assert "DB_PASSWORD environment variable not set" in result.stderr
@@ -0,0 +1,27 @@
+import asyncio
+from datetime import datetime
+
+import fakeredis.aioredis
+
+from api.occupancy_series import OccupancySeries
+
+
+class FixedSeries(OccupancySeries):
+    """Two people in R1 every minute, without a database"""
+
+    def counts(self, minutes):
+        return ["R1"], [{"R1": 2} for _ in minutes]
+
+
+def test_partly_covered_hour_is_not_rolled_up():
+    async def run():
+        series = FixedSeries(fakeredis.aioredis.FakeRedis(), settle_seconds=0, min_coverage=45)
+        await series.update(datetime(2026, 10, 18, 10, 20))  # Processor starts 20 minutes into the hour
+        await series.update(datetime(2026, 10, 18, 11, 0))
+        await series.update(datetime(2026, 10, 18, 12, 0))
+        return await series.series(["R1"], "hour", points=2, end=datetime(2026, 10, 18, 11))
+
+    response = asyncio.run(run())
+    assert response["start"] == datetime(2026, 10, 18, 10)
+    assert response["rooms"]["R1"] == [None, 2.0]
+    assert response["peak"]["R1"] == [None, 2]
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+from datetime import date, datetime
+
+import fakeredis.aioredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from api.db_models import Base, EntryLog, Student
+from api.presence import PresenceIndex
+
+
+def test_catch_up_queries_off_the_event_loop():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.add_all([Student(student_id="S1", stud_name="Ann", RFID="AA"),
+                Student(student_id="S2", stud_name="Bea", RFID="BB")])
+    db.add_all([EntryLog(RFID="AA", room_value="room_101", status=1, timestamp=datetime(2026, 6, 1, 9)),
+                EntryLog(RFID="BB", room_value="room_102", status=1, timestamp=datetime(2026, 6, 2, 9))])
+    db.commit()
+
+    async def run():
+        index = PresenceIndex(fakeredis.aioredis.FakeRedis(), batch_size=1)
+        threads = []
+        fetch = index._fetch
+
+        def recording_fetch(*args):
+            threads.append(threading.current_thread())
+            return fetch(*args)
+
+        index._fetch = recording_fetch
+        applied = await index.catch_up(db)
+        present = await index.student_ids(await index.students([date(2026, 6, 1)], room="room_101"))
+        return applied, present, threads
+
+    applied, present, threads = asyncio.run(run())
+    assert applied == 2
+    assert present == ["S1"]
+    assert threads and all(t is not threading.main_thread() for t in threads)
@@ -0,0 +1,54 @@
+import asyncio
+
+import fakeredis.aioredis
+
+from mqtt.matching import Tap
+from mqtt.redis_matcher import RedisTapMatcher
+
+
+def offers(*taps, window=10):
+    async def run():
+        matcher = RedisTapMatcher(fakeredis.aioredis.FakeRedis(), window)
+        return [await matcher.offer(tap) for tap in taps]
+
+    return asyncio.run(run())
+
+
+def test_taps_on_two_devices_pair():
+    first = Tap("entry-1", 1, "CARD", 1000.0, row_id=7)
+    results = offers(first, Tap("exit-1", 1, "CARD", 1004.5, row_id=8))
+    assert results == [[], [first]]
+
+
+def test_repeat_on_same_device_stays_pending():
+    first = Tap("entry-1", 1, "CARD", 1000.0, row_id=7)
+    results = offers(
+        first,
+        Tap("entry-1", 1, "CARD", 1002.0, row_id=8),
+        Tap("exit-1", 1, "CARD", 1003.0, row_id=9)
+    )
+    assert results[:2] == [[], []]
+    assert [tap.row_id for tap in results[2]] == [7, 8]
+
+
+def test_taps_outside_window_do_not_pair():
+    results = offers(
+        Tap("entry-1", 1, "CARD", 1000.0),
+        Tap("exit-1", 1, "CARD", 1011.0),
+        Tap("exit-1", 2, "CARD", 1012.0)  # Other cluster
+    )
+    assert results == [[], [], []]
+
+
+def test_restore_undoes_an_offer():
+    async def run():
+        matcher = RedisTapMatcher(fakeredis.aioredis.FakeRedis(), 10)
+        first = Tap("entry-1", 1, "CARD", 1000.0, row_id=7)
+        second = Tap("exit-1", 1, "CARD", 1004.0, row_id=8)
+        await matcher.offer(first)
+        matched = await matcher.offer(second)
+        await matcher.restore(second, matched)
+        return first, await matcher.offer(second)
+
+    first, rematched = asyncio.run(run())
+    assert rematched == [first]
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from api.db_models import Base, BLEEvent, SensorData
+from mqtt.replay import stream_ble_events, stream_sensor_events
+
+
+def test_streams_are_time_ordered_when_rows_arrive_late():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[SensorData.__table__, BLEEvent.__table__])
+    t0 = datetime(2026, 3, 2, 9)
+    with Session(engine) as db:
+        # Row 3 is a late insert (spool replay) carrying an older read time
+        for offset in (10, 20, 5):
+            db.add(SensorData(device_ID="d1", cluster_ID=1, RFID="AA", time_stamp=t0 + timedelta(seconds=offset)))
+            db.add(BLEEvent(student_id="S1", beacon_uuid="b1", event_type="entry",
+                            timestamp=t0 + timedelta(seconds=offset)))
+        db.commit()
+
+        start, end = t0, t0 + timedelta(minutes=1)
+        sensor = [row[:3] for row in stream_sensor_events(db, start, end)]
+        ble = [row[:3] for row in stream_ble_events(db, start, end)]
+
+    assert sensor == sorted(sensor) and [row[2] for row in sensor] == [3, 1, 2]
+    assert ble == sorted(ble) and [row[2] for row in ble] == [3, 1, 2]
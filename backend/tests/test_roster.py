@@ -0,0 +1,55 @@
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from api.db_models import (
+    Base, EntryLog, RosterEntry, SessionAttendance, SessionAttendanceEnum, SessionOccurrence, Student,
+    TimetableSession
+)
+from api.roster import reconcile_due
+
+BERLIN = ZoneInfo("Europe/Berlin")
+MONDAY = date(2026, 6, 1)  # CEST, UTC+2
+
+
+def setup():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.add_all([
+        Student(student_id="S1", stud_name="Ann", RFID="AA"),
+        Student(student_id="S2", stud_name="Bea", RFID="BB"),
+        Student(student_id="S3", stud_name="Cy", RFID="CC"),
+    ])
+    db.add(TimetableSession(id=1, course_code="C1", room_value="room_101", weekday=0,
+                            starts_at=time(9), ends_at=time(10), late_after_minutes=10))
+    db.add_all(RosterEntry(session_id=1, student_id=s) for s in ("S1", "S2", "S3"))
+    # entry_log is naive UTC: 09:05 and 09:30 Berlin time
+    db.add(EntryLog(RFID="AA", room_value="room_101", status=1, timestamp=datetime(2026, 6, 1, 7, 5)))
+    db.add(EntryLog(RFID="BB", room_value="room_101", status=1, timestamp=datetime(2026, 6, 1, 7, 30)))
+    db.commit()
+    return db
+
+
+def test_session_closes_by_campus_time():
+    db = setup()
+    # 09:59 Berlin: still running
+    assert reconcile_due(db, now=datetime(2026, 6, 1, 7, 59), settle_seconds=0, campus=BERLIN) == 0
+    assert reconcile_due(db, now=datetime(2026, 6, 1, 8, 1), settle_seconds=0, campus=BERLIN) == 1
+
+
+def test_windows_are_converted_to_utc():
+    db = setup()
+    reconcile_due(db, now=datetime(2026, 6, 1, 8, 1), settle_seconds=0, campus=BERLIN)
+
+    occurrence = db.get(SessionOccurrence, (1, MONDAY))
+    assert occurrence.starts_at == datetime(2026, 6, 1, 7, 0)
+    assert occurrence.ends_at == datetime(2026, 6, 1, 8, 0)
+    statuses = dict(db.query(SessionAttendance.student_id, SessionAttendance.status))
+    assert statuses == {
+        "S1": SessionAttendanceEnum.PRESENT,
+        "S2": SessionAttendanceEnum.LATE,
+        "S3": SessionAttendanceEnum.ABSENT,
+    }
@@ -0,0 +1,32 @@
+from api.search import SearchIndex, device_entity, student_entity
+
+
+def index(*entities):
+    idx = SearchIndex(max_candidates=256)
+    idx.replace_all(entities)
+    return idx
+
+
+def ids(results):
+    return [r["id"] for r in results]
+
+
+def test_match_beyond_candidate_cap_of_longest_word():
+    idx = index(*[student_entity(f"A{i}", f"Alan Smia{i}", None) for i in range(400)],
+                student_entity("J1", "John Smith", None))
+    assert ids(idx.search("jo smi")) == ["J1"]
+    assert ids(idx.search("john smi")) == ["J1"]
+
+
+def test_exact_identifier_ranks_first():
+    idx = index(student_entity("S1", "Ann Lee", "04 AB CD"), student_entity("S12", "Ann Li", None))
+    assert ids(idx.search("s1")) == ["S1", "S12"]
+    assert ids(idx.search("04 ab cd")) == ["S1"]
+
+
+def test_put_replaces_and_filters_by_type():
+    idx = index(student_entity("S1", "Ann Lee", None), device_entity("room1_RFID_1", "room_101"))
+    idx.put(student_entity("S1", "Bea Lee", None))
+    assert ids(idx.search("ann")) == []
+    assert ids(idx.search("bea")) == ["S1"]
+    assert ids(idx.search("room", entity_type="device")) == ["room1_RFID_1"]
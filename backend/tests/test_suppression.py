@@ -0,0 +1,27 @@
+from mqtt.event_processor import EventProcessor
+from mqtt.suppression import TTLSuppressor
+
+
+def test_repeats_within_window_are_suppressed():
+    suppressor = TTLSuppressor(3)
+    assert not suppressor.should_suppress(("reader-a", "CARD"), now=1000.0)
+    assert suppressor.should_suppress(("reader-a", "CARD"), now=1002.9)
+    assert not suppressor.should_suppress(("reader-a", "CARD"), now=1003.0)
+    assert not suppressor.should_suppress(("reader-b", "CARD"), now=1003.0)
+
+
+def test_purge_uses_event_time():
+    suppressor = TTLSuppressor(3, purge_every=3)
+    suppressor.should_suppress("old", now=1000.0)
+    suppressor.should_suppress("live", now=1_700_000_000.0)
+    suppressor.should_suppress("live", now=1_700_000_001.0)  # Third check purges
+    assert suppressor.stats()["tracked_keys"] == 1
+    assert suppressor.should_suppress("live", now=1_700_000_002.0)
+
+
+def test_event_without_timestamp_is_not_suppressed():
+    processor = EventProcessor()
+    event = {"type": "sensor", "device_id": "reader-a", "rfid": "CARD"}
+    assert not processor.is_repeat(event)
+    assert not processor.is_repeat(event)
+    assert processor.rfid_suppressor.stats()["tracked_keys"] == 0
@@ -0,0 +1,78 @@
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from api.db_models import Base, EntryLog, SensorData
+from mqtt import event_processor
+from mqtt.event_processor import EventProcessor
+
+
+def tap(device_id, second):
+    return {"type": "sensor", "device_id": device_id, "cluster_id": 1, "rfid": "CARD",
+            "timestamp": f"2026-06-01T09:00:{second:02d}"}
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+
+    @contextmanager
+    def session():
+        db = Session(engine)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(event_processor, "get_db_session", session)
+    return engine
+
+
+def fail_next_commit(monkeypatch, error):
+    commit = Session.commit
+    calls = []
+
+    def failing(self):
+        calls.append(self)
+        if len(calls) == 1:
+            raise error
+        return commit(self)
+
+    monkeypatch.setattr(Session, "commit", failing)
+
+
+def test_pair_survives_failed_commit_and_spool_replay(engine, monkeypatch):
+    processor = EventProcessor()
+
+    async def run():
+        await processor.process_sensor_event(tap("reader-a", 0))
+        fail_next_commit(monkeypatch, OperationalError("COMMIT", {}, ConnectionError("database down")))
+        with pytest.raises(OperationalError):
+            await processor.process_sensor_event(tap("reader-b", 3))
+        await processor.process_batch([tap("reader-b", 3)])  # Spool replay
+
+    asyncio.run(run())
+    with Session(engine) as db:
+        assert [row.RFID for row in db.scalars(select(EntryLog))] == ["CARD"]
+        assert all(row.processed for row in db.scalars(select(SensorData)))
+    assert len(processor.matcher) == 0
+
+
+def test_failed_batch_restores_pending_taps_for_the_retry(engine, monkeypatch):
+    processor = EventProcessor()
+
+    async def run():
+        await processor.process_sensor_event(tap("reader-a", 0))
+        fail_next_commit(monkeypatch, ValueError("bad row"))  # Not a connection error: retried per event
+        await processor.process_batch([tap("reader-b", 3), tap("reader-a", 20)])
+
+    asyncio.run(run())
+    with Session(engine) as db:
+        assert len(db.scalars(select(EntryLog)).all()) == 1
+    assert len(processor.matcher) == 1  # reader-a at :20 waits for a partner
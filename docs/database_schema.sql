@@ -2,6 +2,7 @@
 -- MySQL 5.7+ compatible schema
 
 -- Drop existing tables if they exist (careful in production!)
+DROP TABLE IF EXISTS beacons;
 DROP TABLE IF EXISTS entry_log;
 DROP TABLE IF EXISTS sensor_data;
 DROP TABLE IF EXISTS student;
@@ -24,11 +25,14 @@ CREATE TABLE user_devices (
     cluster_ID INT NOT NULL,
     device_type ENUM('rfid', 'pir') NOT NULL,
     room_value VARCHAR(50) NOT NULL,
+    direction ENUM('entry', 'exit') NULL COMMENT 'NULL = legacy device ID parity',
     location_description VARCHAR(200),
     last_seen TIMESTAMP NULL,
     status ENUM('active', 'inactive', 'maintenance') DEFAULT 'active',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    INDEX idx_cluster (cluster_ID)
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT 'Registration changes only, not heartbeats',
+    INDEX idx_cluster (cluster_ID),
+    INDEX idx_updated (updated_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Raw sensor data table
@@ -59,9 +63,22 @@ CREATE TABLE entry_log (
     INDEX idx_rfid (RFID),
     INDEX idx_timestamp (timestamp),
     INDEX idx_room (room_value),
+    INDEX idx_entry_log_room_time (room_value, timestamp),
     FOREIGN KEY (RFID) REFERENCES student(RFID) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- BLE beacon positions (geofence index)
+CREATE TABLE beacons (
+    beacon_uuid VARCHAR(100) PRIMARY KEY,
+    room_value VARCHAR(50) NOT NULL,
+    latitude DOUBLE,
+    longitude DOUBLE,
+    radius_meters DOUBLE COMMENT 'Defaults to BLE_GEOFENCE_RADIUS_METERS',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_room (room_value)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- Attendance summary table (for quick reporting)
 CREATE TABLE attendance_summary (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -76,6 +93,117 @@ CREATE TABLE attendance_summary (
     FOREIGN KEY (student_id) REFERENCES student(student_id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Sync positions of edge gateways (uploads and incremental pulls)
+CREATE TABLE edge_checkpoints (
+    site_id VARCHAR(50) NOT NULL,
+    store_id VARCHAR(32) NOT NULL COMMENT 'One per edge database',
+    table_name VARCHAR(50) NOT NULL COMMENT 'Uploaded table, or pull:<table>',
+    position VARCHAR(64) NOT NULL COMMENT 'Last uploaded row ID, or pull cursor',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (site_id, store_id, table_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Fingerprint of the models' DDL; API workers skip create_all when it matches
+CREATE TABLE schema_fingerprint (
+    id INT PRIMARY KEY,
+    fingerprint CHAR(64) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Weekly timetable: a course's slot in a room (campus wall times, CAMPUS_TIMEZONE)
+CREATE TABLE timetable_sessions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    course_code VARCHAR(50) NOT NULL,
+    room_value VARCHAR(50) NOT NULL,
+    weekday INT NOT NULL COMMENT '0=Monday',
+    starts_at TIME NOT NULL,
+    ends_at TIME NOT NULL,
+    late_after_minutes INT NOT NULL DEFAULT 10,
+    valid_from DATE COMMENT 'NULL = open-ended',
+    valid_to DATE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_course (course_code),
+    INDEX idx_room (room_value),
+    INDEX idx_timetable_weekday_end (weekday, ends_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Students expected at each timetable session
+CREATE TABLE roster (
+    session_id INT NOT NULL,
+    student_id VARCHAR(20) NOT NULL,
+    PRIMARY KEY (session_id, student_id),
+    INDEX idx_student (student_id),
+    FOREIGN KEY (session_id) REFERENCES timetable_sessions(id) ON DELETE CASCADE,
+    FOREIGN KEY (student_id) REFERENCES student(student_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Session occurrences claimed by the reconciler, with their windows and outcome counts
+CREATE TABLE session_occurrences (
+    session_id INT NOT NULL,
+    session_date DATE NOT NULL,
+    room_value VARCHAR(50) NOT NULL,
+    window_start DATETIME NOT NULL COMMENT 'UTC like entry_log; entries from here count (early arrivals)',
+    starts_at DATETIME NOT NULL,
+    late_at DATETIME NOT NULL COMMENT 'First entries after this are late',
+    ends_at DATETIME NOT NULL,
+    reconciled_at DATETIME COMMENT 'NULL while claimed but not yet reconciled',
+    present INT DEFAULT 0,
+    late INT DEFAULT 0,
+    absent INT DEFAULT 0,
+    PRIMARY KEY (session_id, session_date),
+    INDEX idx_reconciled (reconciled_at),
+    FOREIGN KEY (session_id) REFERENCES timetable_sessions(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Present/late/absent per rostered student per session occurrence
+CREATE TABLE session_attendance (
+    session_id INT NOT NULL,
+    session_date DATE NOT NULL,
+    student_id VARCHAR(20) NOT NULL,
+    status ENUM('PRESENT', 'LATE', 'ABSENT') NOT NULL,
+    first_entry DATETIME COMMENT 'NULL when absent, or already in the room at the start',
+    PRIMARY KEY (session_id, session_date, student_id),
+    INDEX idx_student (student_id),
+    FOREIGN KEY (student_id) REFERENCES student(student_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Occupancy snapshot rounds, taken every OCCUPANCY_SNAPSHOT_MINUTES
+CREATE TABLE occupancy_rounds (
+    taken_at DATETIME PRIMARY KEY,
+    last_log_id INT NOT NULL COMMENT 'entry_log rows above this arrived after the round',
+    rooms INT DEFAULT 0 COMMENT 'Occupied rooms (empty rooms get no snapshot row)',
+    occupants INT DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Occupants of each occupied room per round, for point-in-time occupancy
+CREATE TABLE occupancy_snapshots (
+    taken_at DATETIME NOT NULL,
+    room_value VARCHAR(50) NOT NULL,
+    occupants INT NOT NULL,
+    data BLOB NOT NULL COMMENT 'zlib of sorted "RFID<TAB>microseconds inside" lines',
+    PRIMARY KEY (taken_at, room_value)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Time-range partitioning of sensor_data, ble_events and entry_log
+-- `python -m api.partitions --convert` converts each table once. It drops the table's
+-- foreign keys, makes (id, <time column>) the primary key, and partitions by day or month
+-- (PARTITION_GRANULARITY), e.g. for entry_log:
+--   ALTER TABLE entry_log PARTITION BY RANGE (TO_DAYS(timestamp)) (
+--       PARTITION p_history VALUES LESS THAN (TO_DAYS('2026-10-01')),
+--       PARTITION p202610 VALUES LESS THAN (TO_DAYS('2026-11-01')),
+--       PARTITION p_future VALUES LESS THAN MAXVALUE
+--   );
+-- The event processor then splits p_future ahead of time and drops (or archives) partitions
+-- past PARTITION_RETENTION_DAYS.
+
+-- Upgrading an existing database
+-- The API applies these at startup (api.database.migrate) when they are missing:
+--   ALTER TABLE user_devices ADD COLUMN direction ENUM('entry', 'exit') NULL;
+--   ALTER TABLE user_devices ADD COLUMN updated_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP;
+--   CREATE INDEX idx_updated ON user_devices (updated_at);
+--   CREATE INDEX idx_entry_log_room_time ON entry_log (room_value, timestamp);
+
 -- Insert sample data for testing
 
 -- Sample students
@@ -28,6 +28,11 @@
 
 #include "config.h"
 
+// Older config.h files predate heartbeats
+#ifndef HEARTBEAT_INTERVAL
+#define HEARTBEAT_INTERVAL 60000
+#endif
+
 // Hardware detection flags - set during boot
 bool hasRFID = false;
 bool hasPIR = false;
@@ -50,19 +55,34 @@ PubSubClient mqttClient(wifiClient);
 // State management
 unsigned long lastMotionTime = 0;
 unsigned long lastReconnectAttempt = 0;
+unsigned long lastHeartbeat = 0;
 int motionFlag = 0;
 
+// Runtime settings changed by fleet commands
+unsigned long debounceDelay = DEBOUNCE_DELAY;
+bool sensorsPaused = false;         // "maintenance" mode
+unsigned long restartAt = 0;        // Set by a reboot command, after its ack is sent
+String lastJobId = "";              // QoS 1 may redeliver; run each job once
+
+// Event identity: the backend drops redelivered (boot, seq) pairs
+uint32_t bootId = 0;                // Random per boot, so seq may restart at 0
+uint32_t eventSeq = 0;
+
 // Function declarations
 void detectHardware();
 void connectWiFi();
 void connectMQTT();
 void publishSensorEvent(String eventType, String rfidUid = "");
+void publishDeviceStatus(String status);
+void publishCommandAck(String jobId, String cmd, bool ok, String detail = "");
+void handleCommand(String message);
 String readRFID();
 void setupBLEBeacon();
 
 void setup() {
   Serial.begin(115200);
   delay(1000);
+  bootId = esp_random();
   
   Serial.println("\n=== ZIAS ESP32 Universal Node ===");
   Serial.print("Device ID: ");
@@ -266,15 +286,20 @@ void connectMQTT() {
   
   String clientId = String(DEVICE_NAME) + "_" + String(ESP.getEfuseMac());
   
-  if (mqttClient.connect(clientId.c_str())) {
+  // Last will: the broker reports us offline if the connection drops
+  String statusTopic = String(MQTT_TOPIC_PREFIX) + "/devices/" + String(DEVICE_NAME) + "/status";
+  String willMessage = String("{\"device_id\":\"") + DEVICE_NAME + "\",\"status\":\"offline\"}";
+  
+  if (mqttClient.connect(clientId.c_str(), statusTopic.c_str(), 1, false, willMessage.c_str())) {
     Serial.println("MQTT connected!");
     
     // Subscribe to command topic
     String cmdTopic = String(MQTT_TOPIC_PREFIX) + "/devices/" + String(DEVICE_NAME) + "/cmd";
-    mqttClient.subscribe(cmdTopic.c_str());
+    mqttClient.subscribe(cmdTopic.c_str(), 1);
     
     // Publish online status
     publishDeviceStatus("online");
+    lastHeartbeat = millis();
   } else {
     Serial.print("MQTT connection failed, rc=");
     Serial.println(mqttClient.state());
@@ -295,8 +320,54 @@ void mqttCallback(char* topic, byte* payload, unsigned int length) {
   }
   Serial.println(message);
   
-  // Handle commands (OTA update, config change, etc.)
-  // TODO: Implement command handling
+  handleCommand(message);
+}
+
+/**
+ * Run a fleet command: {"cmd": "...", "job_id": "...", "params": {...}}
+ * Every command is acknowledged on the status topic with its job_id
+ */
+void handleCommand(String message) {
+  StaticJsonDocument<384> doc;
+  if (deserializeJson(doc, message)) {
+    Serial.println("Ignoring malformed command");
+    return;
+  }
+  
+  String cmd = doc["cmd"] | "";
+  String jobId = doc["job_id"] | "";
+  JsonObject params = doc["params"];
+  
+  // Redelivered job: acknowledge again without re-running it
+  if (jobId.length() > 0 && jobId == lastJobId) {
+    publishCommandAck(jobId, cmd, true, "duplicate");
+    return;
+  }
+  lastJobId = jobId;
+  
+  if (cmd == "ping") {
+    publishCommandAck(jobId, cmd, true);
+  } else if (cmd == "reboot") {
+    publishCommandAck(jobId, cmd, true);
+    restartAt = millis() + 1000;  // Give the ack time to leave
+  } else if (cmd == "mode") {
+    String mode = params["mode"] | "";
+    if (mode == "maintenance" || mode == "normal") {
+      sensorsPaused = (mode == "maintenance");
+      publishCommandAck(jobId, cmd, true, mode);
+    } else {
+      publishCommandAck(jobId, cmd, false, "unknown mode");
+    }
+  } else if (cmd == "config") {
+    if (params.containsKey("debounce_ms")) {
+      debounceDelay = params["debounce_ms"].as<unsigned long>();
+      publishCommandAck(jobId, cmd, true);
+    } else {
+      publishCommandAck(jobId, cmd, false, "no supported keys");
+    }
+  } else {
+    publishCommandAck(jobId, cmd, false, "unknown command");
+  }
 }
 
 /**
@@ -312,6 +383,8 @@ void publishSensorEvent(String eventType, String rfidUid) {
   doc["cluster_id"] = CLUSTER_ID;
   doc["event_type"] = eventType;
   doc["timestamp"] = millis();
+  doc["boot"] = bootId;
+  doc["seq"] = ++eventSeq;
   
   if (rfidUid.length() > 0) {
     doc["rfid"] = rfidUid;
@@ -356,6 +429,25 @@ void publishDeviceStatus(String status) {
   Serial.println(payload);
 }
 
+/**
+ * Acknowledge a fleet command on the status topic
+ */
+void publishCommandAck(String jobId, String cmd, bool ok, String detail) {
+  StaticJsonDocument<256> doc;
+  doc["device_id"] = DEVICE_NAME;
+  doc["status"] = "ack";
+  doc["job_id"] = jobId;
+  doc["cmd"] = cmd;
+  doc["result"] = ok ? "ok" : "error";
+  doc["detail"] = detail;
+  
+  String payload;
+  serializeJson(doc, payload);
+  
+  String topic = String(MQTT_TOPIC_PREFIX) + "/devices/" + String(DEVICE_NAME) + "/status";
+  mqttClient.publish(topic.c_str(), payload.c_str());
+}
+
 /**
  * Read RFID card
  */
@@ -430,15 +522,26 @@ void loop() {
   }
   mqttClient.loop();
   
+  // Heartbeat so the server can tell a silent device from an idle one
+  if (mqttClient.connected() && millis() - lastHeartbeat > HEARTBEAT_INTERVAL) {
+    publishDeviceStatus("online");
+    lastHeartbeat = millis();
+  }
+  
+  // Pending reboot from a fleet command
+  if (restartAt && millis() > restartAt) {
+    ESP.restart();
+  }
+  
   // Check PIR sensor
-  if (hasPIR) {
+  if (hasPIR && !sensorsPaused) {
     int pirState = digitalRead(PIR_SENSOR_PIN);
     
     if (pirState == HIGH) {
       unsigned long currentTime = millis();
       
       // Debounce check
-      if (currentTime - lastMotionTime < DEBOUNCE_DELAY) {
+      if (currentTime - lastMotionTime < debounceDelay) {
         return;
       }
       
@@ -468,7 +571,7 @@ void loop() {
         }
       }
       
-      delay(DEBOUNCE_DELAY);
+      delay(debounceDelay);
       motionFlag = 0;
       digitalWrite(LED_PIN, HIGH);  // LED off
     }